@@ -0,0 +1,313 @@
+'''
+Single-pass assembler of the input code, with an on-disk cache of assembled
+programs
+
+    python assembler.py path/to/input/code [--cache-dir DIR] [--no-cache]
+
+Every line is tokenized once: memory contents, labels (on their own line or
+in front of an instruction) and instructions. Label operands of control-flow
+instructions (LABEL_OPERANDS) that are already defined are resolved right
+away; forward references go to a fixup list patched at the end. Well-formed
+instructions are decoded straight from their tokens; anything else falls back
+to DecodedInstruction, with its checks and warnings.
+
+The assembled program (instruction strings, memory image, decoded fields) can
+be cached under a hash of the source file's contents, so a file that was
+assembled before loads without parsing. The cache is opt-in: programs are
+only cached when $OOO_ASM_CACHE names the cache directory (or a cache_dir is
+passed), and entries are never evicted. The command line caches into
+$OOO_ASM_CACHE, or ~/.cache/ooo-sim/asm when it is not set. An unwritable
+directory only disables the cache.
+
+File layout: header magic (8s), version (u32), marshal version (u32), then
+the marshalled (mem_code, instrs, rows) tuple.
+'''
+
+import copy
+import gc
+import hashlib
+import marshal
+import os, sys
+import re
+import struct
+
+from instruction import *
+
+
+MAGIC = b'OOOASM\x00\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sII')
+
+DEFAULT_CACHE_DIR = os.environ.get('OOO_ASM_CACHE') or None             # no cache unless set
+USER_CACHE_DIR = DEFAULT_CACHE_DIR or os.path.join(os.path.expanduser('~'), '.cache', 'ooo-sim', 'asm')
+
+# control-flow operators and the operand that may name a label
+LABEL_OPERANDS = {'bne': 2}
+
+LABEL = re.compile(r'\w+$')
+REG = re.compile(r'[FR$]\d+$')
+MEM = re.compile(r'(\d+)\(([FR$]\d+)\)$')
+IMM = re.compile(r'-?\d+$')
+
+
+def decode_fields(operator, operands):
+    '''
+    (opcode, src_regs, dest_regs, rd, rs1, rs2, imm) of a well-formed
+    instruction, or None to leave it to DecodedInstruction
+    '''
+    opcode = OPCODE_IDS.get(operator)
+    if opcode is None or len(operands) != len(OPERAND_TYPES[opcode]): return None
+    intern = sys.intern
+    if opcode in (OP_FLD, OP_FSD):
+        m = MEM.match(operands[1])
+        if not (REG.match(operands[0]) and m): return None
+        reg, base = intern(operands[0]), intern(m.group(2))
+        if opcode == OP_FLD: return opcode, [base], [reg], reg, base, None, int(m.group(1))
+        return opcode, [reg], [], None, base, reg, int(m.group(1))
+
+    a, b, c = operands
+    if not (REG.match(a) and REG.match(b)): return None
+    a, b = intern(a), intern(b)
+    if opcode in (OP_ADDI, OP_BNE):
+        if not IMM.match(c): return None
+        if opcode == OP_ADDI: return opcode, [b], [a], a, b, None, int(c)
+        return opcode, [a, b], [], None, a, b, int(c)
+    if not REG.match(c): return None
+    c = intern(c)
+    return opcode, [b, c], [a], a, b, c, 0
+
+
+def decode(pc, instr, operator, operands):
+    fields = decode_fields(operator, operands)
+    if fields is None: return DecodedInstruction(pc, instr)
+    return DecodedInstruction.from_fields(pc, instr, fields[0], operands, *fields[1:])
+
+
+def assemble(text):
+    '''
+    Assembles the input code; returns (mem_code, instrs, decoded) with the
+    memory contents as (address, value) pairs, the instruction strings with
+    labels replaced by their pc and the decoded instruction table
+    '''
+    mem_code = []
+    instrs = []
+    decoded = []
+    labels = {}
+    fixups = []                     # (instruction index, operand index, label)
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] == '%': continue                 # empty line, comment
+
+        if line[0].isdigit():                                   # memory content
+            addr, sep, val = line.partition(',')
+            val = val.strip()
+            assert sep and addr.isdigit() and val.isdigit(), f'Unexpected line in the input file: {line}'
+            mem_code.append((int(addr), float(val)))
+            continue
+
+        label, sep, rest = line.partition(':')
+        if sep:                                                 # label
+            label = label.strip()
+            assert LABEL.match(label), f'Unexpected line in the input file: {line}'
+            assert label not in labels, f'Label {label} defined twice'
+            labels[label] = 4 * len(instrs)
+            line = rest.strip()
+            if not line or line[0] == '%': continue
+
+        tokens = line.split(None, 1)
+        assert len(tokens) == 2 and ',' in tokens[1], f'Unexpected line in the input file: {line}'
+        operator = tokens[0]
+        operands = [x.strip() for x in ' '.join(tokens[1].split()).split(',')]
+        target = LABEL_OPERANDS.get(operator)
+        if target is not None and target < len(operands) and LABEL.match(operands[target]) \
+                and not IMM.match(operands[target]):
+            label = operands[target]
+            if label not in labels:
+                fixups.append((len(instrs), target, label))
+                instrs.append(line)
+                decoded.append(None)
+                continue
+            line, operands = resolve(line, operands, target, labels[label])
+
+        decoded.append(decode(4 * len(instrs), line, operator, operands))
+        instrs.append(line)
+
+    for i, target, label in fixups:
+        assert label in labels, f'Undefined label: {label}'
+        line = instrs[i]
+        operator, rest = line.split(None, 1)
+        operands = [x.strip() for x in ' '.join(rest.split()).split(',')]
+        instrs[i], operands = resolve(line, operands, target, labels[label])
+        decoded[i] = decode(4 * i, instrs[i], operator, operands)
+    return mem_code, instrs, decoded
+
+
+def source_lines(text):
+    '''
+    (line, pc of its instruction or None, label it defines or None) for every
+    line of the input code, with the line rules of assemble
+    '''
+    lines = []
+    pc = 0
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped[0] == '%' or stripped[0].isdigit():
+            lines.append((line, None, None))
+            continue
+        label, sep, rest = stripped.partition(':')
+        if sep:
+            rest = rest.strip()
+            lines.append((line, pc if rest and rest[0] != '%' else None, label.strip()))
+            if rest and rest[0] != '%': pc += 4
+            continue
+        lines.append((line, pc, None))
+        pc += 4
+    return lines
+
+
+def resolve(line, operands, target, pc):
+    '''
+    Replaces the label operand at index `target` with `pc` in the operands
+    and the instruction string
+    '''
+    operands = operands[:target] + [str(pc)] + operands[target + 1:]
+    if target == len(operands) - 1:         # keep the spacing of the line
+        head, _, tail = line.rpartition(',')
+        return f'{head},{tail[:len(tail) - len(tail.lstrip())]}{pc}', operands
+    operator = line.split(None, 1)[0]
+    return f'{operator} {", ".join(operands)}', operands
+
+
+class Program:
+    '''
+    An assembled program: memory contents, instruction strings, decoded
+    instruction table and register names by id (see number_registers).
+    Nothing changes it once built, so one program serves any number of runs
+    and configs
+    '''
+    def __init__(self, mem_code, instrs, decoded):
+        self.mem_code = mem_code
+        self.instrs = instrs
+        self.decoded = decoded
+        self.registers = number_registers(decoded)
+
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(*assemble(text))
+
+
+    @classmethod
+    def from_file(cls, path, cache_dir=DEFAULT_CACHE_DIR):
+        return cls(*assemble_file(path, cache_dir))
+
+
+    @classmethod
+    def from_decoded(cls, decoded, mem_code=()):
+        '''
+        Program of an already decoded instruction table and (address, value)
+        memory contents. The instructions are copied, since numbering the
+        registers of this program rewrites their `*_id` fields
+        '''
+        for i, d in enumerate(decoded):
+            assert d.pc == 4 * i, f'Instruction {d.instr} at pc {d.pc} is not at index {i}'
+        return cls(list(mem_code), [d.instr for d in decoded], [copy.copy(d) for d in decoded])
+
+
+    def get_mem_initialization(self):
+        return self.mem_code
+
+
+    def get_instructions(self):
+        return self.instrs
+
+
+    def get_decoded(self):
+        '''
+        The decoded instruction table, indexed by pc // 4
+        '''
+        return self.decoded
+
+
+    def get_register_names(self):
+        '''
+        The register names indexed by register id; index 0 (REG_SINK) is None
+        '''
+        return self.registers
+
+
+def source_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def save(path, mem_code, instrs, decoded):
+    rows = [(d.opcode, d.operands, d.src_regs, d.dest_regs, d.rd, d.rs1, d.rs2, d.imm) for d in decoded]
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, marshal.version))
+        f.write(marshal.dumps((mem_code, instrs, rows)))
+    os.replace(tmp, path)                   # readers never see a partial file
+
+
+def load(path):
+    '''
+    (mem_code, instrs, decoded) of a cached program, or None when the file
+    is missing or was written by another version
+    '''
+    try:
+        with open(path, 'rb') as f: data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size or HEADER.unpack_from(data) != (MAGIC, VERSION, marshal.version): return None
+    try:
+        mem_code, instrs, rows = marshal.loads(data[HEADER.size:])
+    except (EOFError, ValueError, TypeError):
+        return None
+    # marshal keeps the register names interned
+    from_fields = DecodedInstruction.from_fields
+    decoded = [from_fields(4 * i, instrs[i], *row) for i, row in enumerate(rows)]
+    return mem_code, instrs, decoded
+
+
+def assemble_file(path, cache_dir=DEFAULT_CACHE_DIR):
+    '''
+    Assembled program of the input file, from the cache when the same
+    contents were assembled before; `cache_dir=None` disables the cache
+    '''
+    with open(path, 'rb') as f: data = f.read()
+    # the program is many small acyclic objects: collections while building it only cost time
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        cached = None
+        if cache_dir is not None:
+            cached = os.path.join(cache_dir, f'{source_digest(data)}.asm')
+            program = load(cached)
+            if program is not None: return program
+
+        program = assemble(data.decode())
+        if cached is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                save(cached, *program)
+            except OSError:
+                pass
+        return program
+    finally:
+        if gc_enabled: gc.enable()
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    ap = argparse.ArgumentParser(description='Assemble the input code and cache the result')
+    ap.add_argument('input_file', help='path/to/input/code')
+    ap.add_argument('--cache-dir', default=USER_CACHE_DIR, help='directory of the cache of assembled programs')
+    ap.add_argument('--no-cache', action='store_true', help='always assemble, without reading or writing the cache')
+    args = ap.parse_args()
+
+    assert os.path.exists(args.input_file)
+    begin = time.perf_counter()
+    mem_code, instrs, decoded = assemble_file(args.input_file, None if args.no_cache else args.cache_dir)
+    print(f'{len(instrs)} instructions, {len(mem_code)} memory words in {(time.perf_counter() - begin) * 1e3:.2f} ms')
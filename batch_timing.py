@@ -0,0 +1,260 @@
+'''
+Lockstep timing engine: times one program under many configs at once, with
+one NumPy lane per config
+
+    python batch_timing.py path/to/input/code cfg1.json [cfg2.json ...]
+
+The instructions the timing model walks through and the branch predictions
+only depend on the fetch width (min of NF/NI/NW/NR/NB), btb_entries and the
+branch predictor parameters. Configs are grouped by those, by the layout
+of their functional-unit pools and by the geometry of their data cache
+(which accesses hit in which level); each group follows the control flow once
+while the cycles of every component, the scoreboard (by register id) and the
+fetch cycle are int64 arrays with one entry per config, so each instruction
+of `Processor.run_instruction` becomes a handful of vectorised steps. The
+results are identical to the scalar timing model as long as no cycle count exceeds
+MAX_CYCLE; otherwise OverflowError is raised.
+'''
+
+import os, sys
+import numpy as np
+
+from branch_unit import BranchUnit, predictor_params
+from data_cache import DataCache, dcache_params
+from functional_units import pool_specs, unit_names
+from instruction import *
+from parser import Parser
+from processor import Processor, load_config
+
+
+MAX_CYCLE = 2 ** 60
+NEVER = 2 ** 62     # availability of the input buffer entries a lane does not have
+
+
+class BatchComponent:
+    '''
+    PComponent with one row of input buffer entries per lane. With `count`
+    units (a functional-unit pool), a row holds the entries of every unit one
+    after the other: the earliest free entry of the row is that of the unit
+    UnitPool.pick chooses, and the wait cycles are kept per unit
+    '''
+    def __init__(self, name, latencies, sizes, count=1):
+        self.name = name
+        self.names = unit_names(name, count)
+        self.latency = np.asarray(latencies, dtype=np.int64)
+        self.width = max(sizes)
+        self.available_cycles = np.full((len(sizes), count * self.width), NEVER, dtype=np.int64)
+        for lane, size in enumerate(sizes):
+            for unit in range(count):
+                self.available_cycles[lane, unit * self.width:unit * self.width + size] = 0
+        self.lanes = np.arange(len(sizes))
+        self.total_input_reqs = 0
+        self.total_wait_cycles = np.zeros((count, len(sizes)), dtype=np.int64)     # [unit, lane]
+
+
+    def get_name(self):
+        return self.name
+
+
+    def allocate(self, curr_cycle):
+        self.total_input_reqs += 1
+        idx = self.available_cycles.argmin(axis=1)
+        start = np.maximum(self.available_cycles[self.lanes, idx], curr_cycle)
+        self.total_wait_cycles[idx // self.width, self.lanes] += start - curr_cycle
+        done = start + self.latency
+        self.available_cycles[self.lanes, idx] = done
+        return done
+
+
+    def get_wait_cycles(self, curr_cycle):
+        return np.maximum(self.available_cycles.min(axis=1) - curr_cycle, 0)
+
+
+    def allocate_timed(self, curr_cycle, lat):
+        idx = self.available_cycles.argmin(axis=1)
+        self.available_cycles[self.lanes, idx] = np.maximum(self.available_cycles[self.lanes, idx], curr_cycle) + lat
+
+
+class BatchProcessor:
+    '''
+    The timing model of Processor for a group of configs sharing the fetch
+    width, branch unit, functional-unit pool layout (names, unit counts,
+    opcodes) and data cache geometry (line size, sets and ways of every
+    level)
+    '''
+    def __init__(self, cfgs, parser):
+        self.parser = parser
+        width = {min(c['NF'], c['NI'], c['NW'], c['NR'], c['NB']) for c in cfgs}
+        branch = {(c['btb_entries'],) + predictor_params(c) for c in cfgs}
+        layout = {pool_layout(c) for c in cfgs}
+        geometry = {dcache_geometry(c) for c in cfgs}
+        assert len(width) == 1 and len(branch) == 1 and len(layout) == 1 and len(geometry) == 1, \
+            'A batch must share the fetch width, branch unit parameters, functional-unit pools and data cache geometry'
+        self.fetch_width = width.pop()
+        self.branch_unit = BranchUnit(*branch.pop())
+
+        def component(name, latency_key, size_key, latency=None):
+            latencies = [latency if latency is not None else c[latency_key] for c in cfgs]
+            return BatchComponent(name, latencies, [c[size_key] for c in cfgs])
+
+        self.decoder = component('Decoder', None, 'NI', latency=1)
+        specs = [pool_specs(c) for c in cfgs]
+        self.pools = []
+        self.units = [None] * len(OPCODES)      # dispatch table: the pool of every opcode
+        for i, (name, count, _, _, opcodes) in enumerate(specs[0]):
+            pool = BatchComponent(name, [s[i][2] for s in specs], [s[i][3] for s in specs], count)
+            self.pools.append(pool)
+            for op in opcodes: self.units[op] = pool
+        self.rob = component('ROB', 'ROB_latency', 'ROB_RS')
+        self.reg_rename = component('RegRename', None, 'num_physical_regs', latency=0)
+        self.cache_latency = np.array([c['cache_latency'] for c in cfgs], dtype=np.int64)
+        # the hits and misses are those of one cache; the latency of an access
+        # served by level i is latencies[i] in every lane
+        caches = [DataCache.from_config(c) for c in cfgs]
+        self.dcache = caches[0]
+        if self.dcache is not None:
+            self.latencies = np.array([cache.latencies for cache in caches], dtype=np.int64).T.copy()
+        self.mispred_stall = self.decoder.latency + self.units[OP_BNE].latency
+        self.scoreboard = {}
+        self.num_lanes = len(cfgs)
+
+
+    def get_components(self):
+        return [self.decoder] + self.pools + [self.rob, self.reg_rename]
+
+
+    def simulate_timing(self, branch_outcomes, mem_addresses=()):
+        code = self.parser.get_decoded()
+        num_code_lines = len(code)
+        self.branch_iter = iter(branch_outcomes)
+        self.addr_iter = iter(mem_addresses)
+
+        pc = 0
+        curr_cycle = np.zeros(self.num_lanes, dtype=np.int64)
+        self.total_exec_cycles = np.zeros(self.num_lanes, dtype=np.int64)
+        while True:
+            curr_cycle += self.cache_latency
+            l_begin = pc // 4
+            fetched_instrs = code[l_begin:min(l_begin + self.fetch_width, num_code_lines)]
+            if len(fetched_instrs) == 0: break
+
+            next_pc = pc + 4 * len(fetched_instrs)
+            self.on_path = True
+            for decoded in fetched_instrs:
+                npc, mispredict = self.run_instruction(decoded, curr_cycle)
+                if npc != decoded.pc + 4:
+                    next_pc = npc
+                    self.on_path = False
+
+            pc = next_pc
+            if mispredict: curr_cycle += self.mispred_stall     # only the last instruction's stall applies
+            if self.total_exec_cycles.max() > MAX_CYCLE or curr_cycle.max() > MAX_CYCLE:
+                raise OverflowError('Cycle counts exceed the int64 lanes; use the scalar timing model')
+
+        self.branch_iter = self.addr_iter = None
+        return self.total_exec_cycles
+
+
+    def run_instruction(self, decoded, fetch_cycle):
+        '''
+        Vectorised Processor.run_instruction; returns the next pc and whether
+        the instruction is a mispredicted branch
+        '''
+        num_regs = len(decoded.src_ids) + len(decoded.dest_ids)
+        ccycle = fetch_cycle + num_regs * self.reg_rename.get_wait_cycles(fetch_cycle)
+
+        wait_time = 0
+        for reg in decoded.src_ids:
+            ready = self.scoreboard.get(reg)
+            if ready is not None: wait_time = np.maximum(wait_time, ready - ccycle)
+        ccycle = ccycle + wait_time
+
+        decode_cycle = self.decoder.allocate(ccycle)
+        opcode = decoded.opcode
+        exec_cycle = self.units[opcode].allocate(decode_cycle)
+        if opcode in (OP_FLD, OP_FSD):
+            if self.dcache is None: exec_cycle += self.cache_latency
+            elif not self.on_path: exec_cycle += self.latencies[0]
+            else:
+                addr = next(self.addr_iter, None)
+                assert addr is not None, 'Ran out of memory addresses'
+                exec_cycle += self.latencies[self.dcache.lookup(addr)]
+
+        pc = decoded.pc
+        next_pc = pc + 4
+        mispredict = False
+        if opcode == OP_BNE:
+            taken = next(self.branch_iter, None)
+            assert taken is not None, 'Ran out of branch outcomes'
+            if taken: next_pc = decoded.imm
+            predicted_taken = self.branch_unit.is_taken(pc)
+            mispredict = predicted_taken ^ taken
+            if taken and predicted_taken and self.branch_unit.get_target(pc) != next_pc:
+                mispredict = True
+            self.branch_unit.update_btb(pc, next_pc, taken)
+
+        for reg in decoded.dest_ids:
+            ready = self.scoreboard.get(reg)
+            self.scoreboard[reg] = exec_cycle if ready is None else np.maximum(ready, exec_cycle)
+
+        for i in range(num_regs):
+            self.reg_rename.allocate_timed(decode_cycle, exec_cycle - decode_cycle)
+
+        retire_cycle = self.rob.allocate(exec_cycle)
+        np.maximum(self.total_exec_cycles, retire_cycle, out=self.total_exec_cycles)
+        return next_pc, mispredict
+
+
+def pool_layout(cfg):
+    return tuple((name, count, opcodes) for name, count, _, _, opcodes in pool_specs(cfg))
+
+
+def dcache_geometry(cfg):
+    params = dcache_params(cfg)
+    if params is None: return None
+    line, levels, _ = params
+    return (line,) + tuple((name, sets, assoc) for name, sets, assoc, _ in levels)
+
+
+def simulate_batch(parser, cfgs, branch_record, mem_record=()):
+    '''
+    Times `parser`'s program under every config of `cfgs` given the branch
+    outcomes of its functional run: a list, or a function returning a new
+    iterator over them (e.g. TraceReader.branch_outcomes). Configs with a data
+    cache take the load/store addresses from `mem_record` (Processor.mem_record,
+    or such a function). Returns one dict per config, in order, with the total
+    execution cycles and the wait cycles of every component
+    '''
+    groups = {}
+    for i, cfg in enumerate(cfgs):
+        key = (min(cfg['NF'], cfg['NI'], cfg['NW'], cfg['NR'], cfg['NB']), cfg['btb_entries']) + predictor_params(cfg) \
+            + (pool_layout(cfg), dcache_geometry(cfg))
+        groups.setdefault(key, []).append(i)
+
+    results = [None] * len(cfgs)
+    for lanes in groups.values():
+        batch = BatchProcessor([cfgs[i] for i in lanes], parser)
+        addresses = (mem_record() if callable(mem_record) else mem_record) if batch.dcache is not None else ()
+        total_exec_cycles = batch.simulate_timing(branch_record() if callable(branch_record) else branch_record, addresses)
+        for lane, i in enumerate(lanes):
+            results[i] = {'total_exec_cycles': int(total_exec_cycles[lane])}
+            for component in batch.get_components():
+                for unit, name in enumerate(component.names):
+                    results[i][f'{name}_wait_cycles'] = int(component.total_wait_cycles[unit, lane])
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv[1:]) < 2:
+        print(f'Usage: {sys.argv[0]} path/to/input/code cfg1.json [cfg2.json ...]')
+        exit(1)
+
+    assert os.path.exists(sys.argv[1])
+    parser = Parser(sys.argv[1])
+    func = Processor.from_config(None, parser)
+    func.mem_record = []
+    func.simulate_func(verbose=False)
+    cfg_files = sys.argv[2:]
+    results = simulate_batch(parser, [load_config(f) for f in cfg_files], func.branch_record, func.mem_record)
+    for cfg_file, result in zip(cfg_files, results):
+        print(f'{cfg_file}: total_exec_cycles={result["total_exec_cycles"]}')
@@ -0,0 +1,54 @@
+'''
+Times loading a program three ways: the per-instruction DecodedInstruction
+parse of every line, the single-pass assembler and a hit in the cache of
+assembled programs
+
+    python benchmarks/bench_assembler.py [path/to/input/code] [--repeat N]
+
+Without an input file, a generated branchy program with ~100k instructions
+and as many labels is used.
+'''
+
+import argparse
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from assembler import assemble_file
+from instruction import DecodedInstruction
+from workloads import generate
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - begin)
+    return best
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Compare uncached and cached program loading')
+    ap.add_argument('input_file', nargs='?', default=None)
+    ap.add_argument('--repeat', type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.input_file
+        if path is None:
+            path = os.path.join(tmp, 'branchy.txt')
+            with open(path, 'w') as f: f.write(generate('branchy', trips=10, branches=10000))
+
+        instrs = assemble_file(path, None)[1]
+        decode = best_time(lambda: [DecodedInstruction(4 * i, s) for i, s in enumerate(instrs)], args.repeat)
+        assemble = best_time(lambda: assemble_file(path, None), args.repeat)
+        cache_dir = os.path.join(tmp, 'cache')
+        assemble_file(path, cache_dir)
+        cached = best_time(lambda: assemble_file(path, cache_dir), args.repeat)
+
+    print(f'static instructions: {len(instrs)}')
+    print(f'decode every line:   {decode * 1e3:9.2f} ms (labels already resolved)')
+    print(f'assemble:            {assemble * 1e3:9.2f} ms ({decode / assemble:5.1f}x)')
+    print(f'cache hit:           {cached * 1e3:9.2f} ms ({decode / cached:5.1f}x)')
@@ -0,0 +1,51 @@
+'''
+Times one program under N configs that differ in latencies and RS sizes, with
+the lockstep NumPy engine and with N scalar timing runs, and checks that both
+give the same cycles
+'''
+
+import os, sys
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from batch_timing import simulate_batch
+from parser import Parser
+from processor import Processor, load_config
+
+
+def random_configs(base, num_cfgs, seed=0):
+    rnd = random.Random(seed)
+    cfgs = []
+    for _ in range(num_cfgs):
+        cfg = dict(base)
+        for key in cfg:
+            if key.endswith('_latency'): cfg[key] = rnd.randint(1, 8)
+            elif key.endswith('_RS'): cfg[key] = rnd.randint(1, 16)
+        cfgs.append(cfg)
+    return cfgs
+
+
+if __name__ == '__main__':
+    if len(sys.argv[1:]) not in [2, 3]:
+        print(f'Usage: {sys.argv[0]} path/to/config/file path/to/input/code [num_configs]')
+        exit(1)
+
+    parser = Parser(sys.argv[2])
+    cfgs = random_configs(load_config(sys.argv[1]), int(sys.argv[3]) if len(sys.argv) > 3 else 1000)
+    func = Processor.from_config(None, parser)
+    func.simulate_func(verbose=False)
+
+    begin = time.perf_counter()
+    results = simulate_batch(parser, cfgs, func.branch_record)
+    t_batch = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    for cfg, result in zip(cfgs, results):
+        proc = Processor.from_config(cfg, parser, func.branch_record)
+        assert proc.simulate_timing(verbose=False) == result['total_exec_cycles'], 'lockstep and scalar cycles differ'
+    t_scalar = time.perf_counter() - begin
+
+    print(f'configs: {len(cfgs)}, committed instructions: {func.num_committed}')
+    print(f'scalar:   {t_scalar:8.3f}s')
+    print(f'lockstep: {t_batch:8.3f}s ({t_scalar / t_batch:.1f}x)')
@@ -0,0 +1,136 @@
+'''
+Replays a branch stream through the branch unit: the previous BTB (a list of
+BtbEntry objects, kept below as the reference) against the array-backed
+BranchUnit with every predictor of predictors.py. The bimodal predictor must
+predict exactly as the reference does
+
+    python benchmarks/bench_branch.py [--branches N] [--sites N] [--btb-entries N] [--repeat N]
+
+The stream mixes loop branches (taken n - 1 times out of n), biased branches
+and branches following a short repeating pattern, as the timing model calls
+the unit: is_taken, get_target when predicted taken, then update_btb.
+'''
+
+import argparse
+import os, sys
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from branch_unit import BranchUnit
+from predictors import PREDICTORS
+
+
+class BtbEntry:
+    def __init__(self):
+        self.valid = False
+        self.pc = 0
+        self.target = 0
+        self.cnt = 2
+
+
+class ReferenceBranchUnit:
+    '''
+    The BTB before predictors.py, asserts removed
+    '''
+    def __init__(self, num_entries):
+        self.num_entries = num_entries
+        self.btb = [BtbEntry()] * self.num_entries
+
+    def get_index(self, pc):
+        return (pc >> 4) % self.num_entries
+
+    def is_in_btb(self, pc):
+        idx = self.get_index(pc)
+        return self.btb[idx].valid and self.btb[idx].pc == pc
+
+    def is_taken(self, pc):
+        if not self.is_in_btb(pc): return False
+        return self.btb[self.get_index(pc)].cnt >= 2
+
+    def get_target(self, pc):
+        return self.btb[self.get_index(pc)].target
+
+    def update_btb(self, pc, target, is_taken):
+        idx = self.get_index(pc)
+        if self.is_in_btb(pc):
+            if is_taken:
+                self.btb[idx].target = target
+                self.btb[idx].cnt = min(self.btb[idx].cnt + 1, 3)
+            else:
+                self.btb[idx].cnt = max(self.btb[idx].cnt - 1, 0)
+        else:
+            self.btb[idx] = entry = BtbEntry()
+            entry.valid, entry.pc, entry.target = True, pc, target
+
+
+def branch_stream(num_branches, num_sites, seed=0):
+    '''
+    [(pc, target of the taken branch, taken)]
+    '''
+    rnd = random.Random(seed)
+    sites = []
+    for s in range(num_sites):
+        pc = 4 * rnd.randrange(1 << 16)
+        kind = s % 3
+        if kind == 0: pattern = [1] * rnd.randint(2, 12) + [0]
+        elif kind == 1: pattern = None                  # taken 80% of the time
+        else: pattern = [rnd.randint(0, 1) for _ in range(rnd.randint(2, 6))]
+        sites.append((pc, pc - 4 * rnd.randint(1, 64), pattern))
+    stream, visits = [], [0] * num_sites
+    while len(stream) < num_branches:
+        s = rnd.randrange(num_sites)
+        pc, target, pattern = sites[s]
+        for _ in range(rnd.randint(1, 20)):
+            taken = pattern[visits[s] % len(pattern)] if pattern else int(rnd.random() < 0.8)
+            visits[s] += 1
+            stream.append((pc, target, taken))
+    return stream[:num_branches]
+
+
+def replay(unit, stream):
+    '''
+    Predictions of the unit for every branch, as simulate_timing makes them
+    '''
+    predictions = []
+    for pc, target, taken in stream:
+        predicted = unit.is_taken(pc)
+        if predicted and unit.get_target(pc) != target: predicted = -1   # wrong target
+        predictions.append(predicted)
+        unit.update_btb(pc, target if taken else pc + 4, taken)
+    return predictions
+
+
+def best_time(make, stream, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        unit = make()
+        begin = time.perf_counter()
+        predictions = replay(unit, stream)
+        best = min(best, time.perf_counter() - begin)
+    return best, predictions
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Compare the branch unit implementations and predictors')
+    ap.add_argument('--branches', type=int, default=200000)
+    ap.add_argument('--sites', type=int, default=64)
+    ap.add_argument('--btb-entries', type=int, default=16)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    stream = branch_stream(args.branches, args.sites)
+    ref_time, ref_pred = best_time(lambda: ReferenceBranchUnit(args.btb_entries), stream, args.repeat)
+
+    def mispredicts(predictions):
+        return sum(p == -1 or p != bool(taken) for p, (_, _, taken) in zip(predictions, stream))
+
+    print(f'branches: {len(stream)}, sites: {args.sites}, BTB entries: {args.btb_entries}')
+    print(f'{"reference":>10}: {ref_time / len(stream) * 1e9:7.1f} ns/branch, mispredicts {mispredicts(ref_pred) / len(stream):6.2%}')
+    for name in PREDICTORS:
+        t, pred = best_time(lambda: BranchUnit(args.btb_entries, name), stream, args.repeat)
+        same = ' identical to the reference' if pred == ref_pred else ''
+        print(f'{name:>10}: {t / len(stream) * 1e9:7.1f} ns/branch, mispredicts {mispredicts(pred) / len(stream):6.2%}'
+              f' ({ref_time / t:4.2f}x){same}')
+    # the bimodal predictor stands in for the old BTB, it must not drift
+    assert replay(BranchUnit(args.btb_entries), stream) == ref_pred
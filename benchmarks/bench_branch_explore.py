@@ -0,0 +1,71 @@
+'''
+Compares a branch predictor sweep done the usual way, one timing run per
+configuration, with the one-pass exploration of branch_explore.py, checking
+that both give the same mispredicts and penalty cycles
+
+    python benchmarks/bench_branch_explore.py [config] [--kind branchy] [--trips N] [--btb-entries 4 16 ...]
+
+Every configuration of the grid btb_entries x branch_predictor x
+bp_table_bits x bp_history_bits is timed once; the functional run is shared.
+'''
+
+import argparse
+import itertools
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from branch_explore import explore
+from parser import Parser
+from predictors import PREDICTORS
+from processor import Processor, load_config
+from workloads import generate
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description='Compare per-configuration timing runs with one-pass branch exploration')
+    ap.add_argument('config', nargs='?', default=os.path.join(here, '..', 'config1.json'))
+    ap.add_argument('--kind', default='branchy', help='workload of workloads.py')
+    ap.add_argument('--trips', type=int, default=200)
+    ap.add_argument('--btb-entries', type=int, nargs='+', default=[4, 8, 16, 64, 256, 1024])
+    ap.add_argument('--predictors', nargs='+', default=list(PREDICTORS))
+    ap.add_argument('--table-bits', type=int, nargs='+', default=[8, 12])
+    ap.add_argument('--history-bits', type=int, nargs='+', default=[8, 16])
+    args = ap.parse_args()
+
+    # many physical registers keep the rename stalls, and the cycle counts, small
+    base = dict(load_config(args.config), num_physical_regs=1024)
+    ranges = [('btb_entries', args.btb_entries), ('branch_predictor', args.predictors),
+              ('bp_table_bits', args.table_bits), ('bp_history_bits', args.history_bits)]
+    names = [name for name, _ in ranges]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'{args.kind}.txt')
+        with open(path, 'w') as f: f.write(generate(args.kind, trips=args.trips))
+        parser = Parser(path, cache_dir=None)        # a temporary program: keep it out of the cache
+    func = Processor.from_config(None, parser)
+    func.simulate_func(verbose=False)
+
+    begin = time.perf_counter()
+    rows = explore(parser, base, ranges, func.branch_record)
+    one_pass = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    proc = None
+    for values, row in zip(itertools.product(*[v for _, v in ranges]), rows):
+        cfg = dict(base, **dict(zip(names, values)))
+        if proc is None: proc = Processor.from_config(cfg, parser)
+        else: proc.reset(cfg)
+        proc.branch_record = func.branch_record
+        proc.simulate_timing(verbose=False)
+        report = proc.metrics.report(proc)
+        assert all(report[k] == row[k] for k in ('branches', 'mispredicts', 'mispredict_penalty_cycles')), values
+    per_config = time.perf_counter() - begin
+
+    best = min(rows, key=lambda r: r['mispredict_penalty_cycles'])
+    print(f'{len(rows)} configurations, {rows[0]["branches"]} branches, identical results')
+    print(f'timing run per configuration: {per_config:8.2f} s')
+    print(f'one pass:                     {one_pass:8.2f} s ({per_config / one_pass:.0f}x)')
+    print('fewest penalty cycles: ' + ', '.join(f'{name}={best[name]}' for name in names) +
+          f' ({best["mispredicts"]} mispredicts, {best["mispredict_penalty_cycles"]} cycles)')
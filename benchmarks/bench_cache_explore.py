@@ -0,0 +1,92 @@
+'''
+Measures one-pass data cache exploration (cache_explore.py) against replaying
+the address stream through a DataCache per geometry and against full timing
+runs, and checks that all three agree on the misses
+
+    python benchmarks/bench_cache_explore.py [config] [--kind footprint] [--words N] [--passes N] [--timed N]
+
+The grid is dcache_line 32/64 x l1d_size 1K..64K x l1d_assoc 1/2/4/8 x l2_size
+0/256K. Every point is replayed; only the first --timed points are timed in
+full, and the time of timing the whole grid is extrapolated from them. The
+default workload makes 8 passes over 24KB, so the 32K and 64K L1Ds keep it
+while the smaller ones only hit within a line.
+'''
+
+import argparse
+import itertools
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from cache_explore import explore
+from data_cache import DataCache
+from parser import Parser
+from processor import Processor, load_config
+from workloads import generate
+
+
+RANGES = [('dcache_line', [32, 64]), ('l1d_size', [1024 << i for i in range(7)]), ('l1d_assoc', [1, 2, 4, 8]),
+          ('l2_size', [0, 262144])]
+
+
+def replay(cfg, addresses):
+    # the reference: every access through a DataCache of the geometry
+    cache = DataCache.from_config(cfg)
+    cycles = sum(cache.access(a) for a in addresses)
+    return cache.stats(), cycles
+
+
+def misses(stats):
+    return stats['L1D']['misses'], stats['L2']['misses'] if 'L2' in stats else 0
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description='Compare one-pass data cache exploration with replays and timing runs')
+    ap.add_argument('config', nargs='?', default=os.path.join(here, '..', 'config1.json'))
+    ap.add_argument('--kind', default='footprint', help='workload of workloads.py')
+    ap.add_argument('--words', type=int, default=3072, help='footprint words (trips of the other workloads)')
+    ap.add_argument('--passes', type=int, default=8, help='passes over the footprint')
+    ap.add_argument('--timed', type=int, default=2, help='grid points timed in full')
+    args = ap.parse_args()
+
+    base = dict(load_config(args.config), num_physical_regs=100000, l1d_size=1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'{args.kind}.txt')
+        with open(path, 'w') as f:
+            f.write(generate(args.kind, **({'words': args.words, 'passes': args.passes} if args.kind == 'footprint'
+                                           else {'trips': args.words})))
+        parser = Parser(path, cache_dir=None)        # a temporary program: keep it out of the cache
+    func = Processor.from_config(None, parser)
+    func.mem_record = []
+    func.simulate_func(verbose=False)
+    addresses = func.mem_record
+
+    begin = time.perf_counter()
+    rows = explore(base, RANGES, addresses)
+    one_pass = time.perf_counter() - begin
+    names = [name for name, _ in RANGES]
+    cfgs = [dict(base, **dict(zip(names, values))) for values in itertools.product(*[v for _, v in RANGES])]
+
+    begin = time.perf_counter()
+    for cfg, row in zip(cfgs, rows):
+        stats, cycles = replay(cfg, addresses)
+        assert misses(stats) == (row['l1d_misses'], row['l2_misses']) and cycles == row['memory_cycles'], f'Mismatch at {cfg}'
+    replayed = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    for cfg, row in zip(cfgs[:args.timed], rows):
+        proc = Processor.from_config(cfg, parser, func.branch_record, addresses)
+        proc.simulate_timing(verbose=False)
+        assert misses(proc.dcache.stats()) == (row['l1d_misses'], row['l2_misses']), f'Timing mismatch at {cfg}'
+    timed = (time.perf_counter() - begin) / max(min(args.timed, len(cfgs)), 1) * len(cfgs)
+
+    print(f'{func.num_committed} committed instructions, {len(addresses)} loads and stores, {len(cfgs)} geometries')
+    print(f'one pass {one_pass:.3f}s, replay per geometry {replayed:.3f}s ({replayed / one_pass:.1f}x), '
+          f'timing per geometry ~{timed:.1f}s ({timed / one_pass:.0f}x)')
+    print(f'{"line":>5} {"l1d_size":>9} {"assoc":>6} {"l2_size":>8} {"l1d hits":>9} {"l2 hits":>8} {"amat":>7}')
+    for row in rows:
+        if row['l1d_assoc'] != 4: continue
+        print(f'{row["dcache_line"]:5d} {row["l1d_size"]:9d} {row["l1d_assoc"]:6d} {row["l2_size"]:8d} '
+              f'{row["l1d_hit_rate"]:9.2%} {row["l2_hit_rate"]:8.2%} {row["amat"]:7.3f}')
@@ -0,0 +1,39 @@
+'''
+Compares parsing every dynamic instruction from its string against looking it
+up in the pre-decoded table built once by the Parser
+'''
+
+import os, sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parser import Parser
+from instruction import Instruction
+
+
+def time_per_instr(fn, pcs):
+    begin = time.perf_counter()
+    for pc in pcs:
+        fn(pc)
+    return (time.perf_counter() - begin) / len(pcs)
+
+
+if __name__ == '__main__':
+    if len(sys.argv[1:]) not in [1, 2]:
+        print(f'Usage: {sys.argv[0]} path/to/input/code [num_dynamic_instrs]')
+        exit(1)
+
+    p = Parser(sys.argv[1])
+    num_dynamic = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    instrs = p.get_instructions()
+    decoded = p.get_decoded()
+    pcs = [4 * (i % len(instrs)) for i in range(num_dynamic)]
+
+    parse = time_per_instr(lambda pc: Instruction(pc, instrs[pc // 4]), pcs)
+    lookup = time_per_instr(lambda pc: decoded[pc // 4], pcs)
+    wrap = time_per_instr(lambda pc: Instruction.from_decoded(decoded[pc // 4]), pcs)
+
+    print(f'static instructions: {len(instrs)}, dynamic instructions: {num_dynamic}')
+    print(f'parse per instruction:         {parse * 1e9:10.1f} ns')
+    print(f'table lookup:                  {lookup * 1e9:10.1f} ns  ({parse / lookup:6.1f}x)')
+    print(f'table lookup + Instruction:    {wrap * 1e9:10.1f} ns  ({parse / wrap:6.1f}x)')
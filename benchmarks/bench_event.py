@@ -0,0 +1,91 @@
+'''
+Measures the event-driven timing engine: the same program timed with idle
+cycles skipped and with every cycle visited, for growing fdiv and cache
+latencies, checking identical cycles and counters; the analytic engine is
+timed alongside for reference
+
+    python benchmarks/bench_event.py [config] [--kind fpchain] [--trips N] [--latencies 8 64 512]
+
+Each latency L sets FPdiv_latency = L and cache_latency = L // 8 (at least 1).
+The default config is config1.json with 100000 physical registers, which
+keeps the rename stalls of the analytic engine from growing.
+
+It then cross-validates the engines (see event_engine.cross_validate) at
+every latency: the cycles have to agree exactly on fpchain and the branch
+and mispredict counts on fpchain and branchy. It exits with status 1 if any
+of that, or stepping against skipping, does not hold.
+'''
+
+import argparse
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from event_engine import EventEngine, cross_validate
+from metrics import Metrics
+from parser import Parser
+from processor import Processor, load_config
+from workloads import generate
+
+
+def time_event(cfg, parser, branch_record, skip_idle):
+    proc = Processor.from_config(cfg, parser, branch_record)
+    proc.branch_idx = 0
+    engine = EventEngine(proc)
+    engine.skip_idle = skip_idle
+    stats = Metrics().counters
+    begin = time.perf_counter()
+    cycles = engine.run(0, 0, iter(branch_record), stats)
+    return time.perf_counter() - begin, cycles, stats
+
+
+def workload(kind, trips):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'{kind}.txt')
+        with open(path, 'w') as f: f.write(generate(kind, trips=trips))
+        return Parser(path, cache_dir=None)        # a temporary program: keep it out of the cache
+
+
+def time_analytic(cfg, parser, branch_record):
+    proc = Processor.from_config(cfg, parser, branch_record)
+    begin = time.perf_counter()
+    proc.simulate_timing(verbose=False)
+    return time.perf_counter() - begin
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description='Compare the event-driven engine with and without idle-cycle skipping')
+    ap.add_argument('config', nargs='?', default=os.path.join(here, '..', 'config1.json'))
+    ap.add_argument('--kind', default='fpchain', help='workload of workloads.py')
+    ap.add_argument('--trips', type=int, default=2000)
+    ap.add_argument('--latencies', type=int, nargs='+', default=[8, 64, 512])
+    args = ap.parse_args()
+
+    base = dict(load_config(args.config), num_physical_regs=100000)
+    parser = workload(args.kind, args.trips)
+    func = Processor.from_config(None, parser)
+    func.simulate_func(verbose=False)
+
+    print(f'{func.num_committed} committed instructions')
+    print(f'{"latency":>8} {"cycles":>10} {"stepping s":>11} {"skipping s":>11} {"speedup":>8} {"analytic s":>11} {"same":>5}')
+    ok = True
+    for latency in args.latencies:
+        cfg = dict(base, FPdiv_latency=latency, cache_latency=max(1, latency // 8))
+        step, step_cycles, step_stats = time_event(cfg, parser, func.branch_record, False)
+        skip, cycles, stats = time_event(cfg, parser, func.branch_record, True)
+        analytic = time_analytic(cfg, parser, func.branch_record)
+        same = cycles == step_cycles and stats == step_stats
+        ok &= same
+        print(f'{latency:8d} {cycles:10d} {step:11.3f} {skip:11.3f} {step / skip:7.1f}x {analytic:11.3f} {str(same):>5}')
+
+    print(f'{"kernel":>8} {"latency":>8} {"analytic":>10} {"event":>10} {"cycles":>7} {"branches":>9}')
+    cfgs = [dict(base, FPdiv_latency=latency, cache_latency=max(1, latency // 8)) for latency in args.latencies]
+    for kind, exact in [('fpchain', True), ('branchy', False)]:
+        for latency, row in zip(args.latencies, cross_validate(workload(kind, args.trips), cfgs)):
+            ok &= row['branches_match'] and (row['cycles_match'] or not exact)
+            print(f'{kind:>8} {latency:8d} {row["analytic"]["total_cycles"]:10d} {row["event"]["total_cycles"]:10d} '
+                  f'{"same" if row["cycles_match"] else "differ" if not exact else "DIFFER":>7} '
+                  f'{"same" if row["branches_match"] else "DIFFER":>9}')
+    if not ok: exit(1)
@@ -0,0 +1,40 @@
+'''
+Compares the functional engines (interpreted decoded table, compiled
+per-instruction closures, compiled basic blocks, and the default 'auto' mode
+interpreting short runs): simulated instructions per second, and identical branch outcomes and final mem/rf state
+'''
+
+import os, sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parser import Parser
+from processor import Processor
+
+
+def run(parser, mode):
+    proc = Processor.from_config(None, parser)
+    begin = time.perf_counter()
+    proc.simulate_func(verbose=False, mode=mode)
+    return time.perf_counter() - begin, proc
+
+
+def state(proc, regs):
+    return proc.branch_record, sorted(proc.mem.items()), [proc.rf.read(r) for r in regs]
+
+
+if __name__ == '__main__':
+    if len(sys.argv[1:]) != 1:
+        print(f'Usage: {sys.argv[0]} path/to/input/code')
+        exit(1)
+
+    parser = Parser(sys.argv[1])
+    regs = sorted({r for d in parser.get_decoded() for r in (d.rd, d.rs1, d.rs2) if r is not None})
+    elapsed, ref = run(parser, 'interp')
+    print(f'{"mode":>8} {"instrs/s":>12} {"speedup":>8}')
+    print(f'{"interp":>8} {ref.num_committed / elapsed:>12.0f} {1:>7.1f}x')
+    for mode in ['closure', 'block', 'auto']:
+        t, proc = run(parser, mode)
+        assert proc.num_committed == ref.num_committed, f'{mode}: committed instruction count differs'
+        assert state(proc, regs) == state(ref, regs), f'{mode}: final state differs from the interpreter'
+        print(f'{mode:>8} {proc.num_committed / t:>12.0f} {elapsed / t:>7.1f}x')
@@ -0,0 +1,39 @@
+'''
+Measures the cost of metrics collection: simulate_timing with and without the
+run counters, best of several alternating repetitions
+'''
+
+import os, sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parser import Parser
+from processor import Processor, load_config
+
+
+def time_timing(cfg, parser, branch_record, collect_metrics):
+    proc = Processor.from_config(cfg, parser, branch_record)
+    proc.collect_metrics = collect_metrics
+    begin = time.perf_counter()
+    proc.simulate_timing(verbose=False)
+    return time.perf_counter() - begin
+
+
+if __name__ == '__main__':
+    if len(sys.argv[1:]) not in [2, 3]:
+        print(f'Usage: {sys.argv[0]} path/to/config/file path/to/input/code [repeat]')
+        exit(1)
+
+    cfg = load_config(sys.argv[1])
+    parser = Parser(sys.argv[2])
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 7
+    func = Processor.from_config(None, parser)
+    func.simulate_func(verbose=False)
+
+    # alternate the two so that both see the same machine noise
+    off = on = float('inf')
+    for _ in range(repeat):
+        off = min(off, time_timing(cfg, parser, func.branch_record, False))
+        on = min(on, time_timing(cfg, parser, func.branch_record, True))
+    print(f'without metrics: {off * 1e3:8.2f} ms')
+    print(f'with metrics:    {on * 1e3:8.2f} ms ({(on / off - 1) * 100:+.1f}%)')
@@ -0,0 +1,58 @@
+'''
+Measures parallel segmented timing (parallel_timing.py) against the serial
+timing run: wall time, speedup, the rounds and re-timed segments it took to
+make every segment exact, and a check that the total matches, for growing
+numbers of segments, one worker process per segment (up to the cores of the
+host)
+
+    python benchmarks/bench_parallel.py [config] [--kind branchy] [--trips N] [--segments 1 2 4 8] [--overlap N]
+
+The default workload has random branch outcomes, so the serial run cannot
+jump over repeating loop iterations; the default config is config1.json with
+100000 physical registers, one instruction fetched per cycle and a 64-entry
+ROB, so that fetch bounds the run and every segment fits its predecessor's
+end state in the first round. With config1.json's fetch width, the backlog
+of branchy keeps growing and later segments are re-timed.
+'''
+
+import argparse
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parallel_timing import simulate_segmented
+from parser import Parser
+from processor import Processor, load_config
+from workloads import generate
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description='Compare parallel segmented timing with the serial run')
+    ap.add_argument('config', nargs='?', default=os.path.join(here, '..', 'config1.json'))
+    ap.add_argument('--kind', default='branchy', help='workload of workloads.py')
+    ap.add_argument('--trips', type=int, default=5000)
+    ap.add_argument('--segments', type=int, nargs='+', default=[1, 2, 4, 8])
+    ap.add_argument('--overlap', type=int, default=5000)
+    args = ap.parse_args()
+
+    cfg = dict(load_config(args.config), num_physical_regs=100000, NF=1, ROB_RS=64)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'{args.kind}.txt')
+        with open(path, 'w') as f: f.write(generate(args.kind, trips=args.trips))
+        parser = Parser(path, cache_dir=None)        # a temporary program: keep it out of the cache
+    func = Processor.from_config(None, parser)
+    func.simulate_func(verbose=False)
+
+    begin = time.perf_counter()
+    serial = Processor.from_config(cfg, parser, func.branch_record).simulate_timing(verbose=False)
+    serial_seconds = time.perf_counter() - begin
+    cores = os.cpu_count() or 1
+    print(f'{func.num_committed} committed instructions, {cores} cores, serial {serial} cycles in {serial_seconds:.3f}s')
+    print(f'{"segments":>9} {"workers":>8} {"seconds":>8} {"speedup":>8} {"cycles":>10} {"rounds":>7} {"retimed":>8} {"same":>5}')
+    for num_segments in args.segments:
+        workers = min(num_segments, cores)
+        r = simulate_segmented(cfg, parser, func.branch_record, func.num_committed, num_segments, args.overlap, workers)
+        print(f'{num_segments:9d} {workers:8d} {r.seconds:8.3f} {serial_seconds / r.seconds:7.2f}x {r.total_cycles:10d} '
+              f'{r.rounds:7d} {r.retimed:8d} {str(r.total_cycles == serial):>5}')
@@ -0,0 +1,83 @@
+'''
+Compares the heap-backed PComponent allocator against the previous linear-scan
+one across input buffer sizes, checking that both return the same cycles
+'''
+
+import os, sys
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pipelined_component import PComponent
+
+
+class LinearPComponent:
+    '''
+    The previous allocator: a linear min()/index() scan over the buffer
+    '''
+    def __init__(self, name, latency, input_buffer_size):
+        self.latency = latency
+        self.available_cycles = [0] * input_buffer_size
+        self.total_input_reqs = 0
+        self.total_wait_cycles = 0
+
+
+    def allocate(self, curr_cycle):
+        self.total_input_reqs += 1
+        min_available_cycle = min(self.available_cycles)
+        min_available_idx = self.available_cycles.index(min_available_cycle)
+        if curr_cycle >= min_available_cycle:
+            self.available_cycles[min_available_idx] = curr_cycle + self.latency
+            return curr_cycle + self.latency
+        self.total_wait_cycles += min_available_cycle - curr_cycle
+        self.available_cycles[min_available_idx] += self.latency
+        return min_available_cycle + self.latency
+
+
+    def get_wait_cycles(self, curr_cycle):
+        return max(min(self.available_cycles) - curr_cycle, 0)
+
+
+    def allocate_timed(self, curr_cycle, lat):
+        min_available_cycle = min(self.available_cycles)
+        min_available_idx = self.available_cycles.index(min_available_cycle)
+        self.available_cycles[min_available_idx] = max(min_available_cycle, curr_cycle) + lat
+
+
+def make_requests(num_reqs, seed=0):
+    # mimics run_instruction: slowly advancing cycles, mixed request kinds
+    rnd = random.Random(seed)
+    cycle = 0
+    reqs = []
+    for _ in range(num_reqs):
+        cycle += rnd.randint(0, 2)
+        reqs.append((rnd.randint(0, 2), cycle, rnd.randint(1, 12)))
+    return reqs
+
+
+def run(component, reqs):
+    out = []
+    for kind, cycle, lat in reqs:
+        if kind == 0: out.append(component.allocate(cycle))
+        elif kind == 1: out.append(component.get_wait_cycles(cycle))
+        else: component.allocate_timed(cycle, lat)
+    return out
+
+
+def bench(cls, size, latency, reqs):
+    component = cls('bench', latency, size)
+    begin = time.perf_counter()
+    out = run(component, reqs)
+    elapsed = time.perf_counter() - begin
+    return elapsed, out, (component.total_input_reqs, component.total_wait_cycles)
+
+
+if __name__ == '__main__':
+    num_reqs = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    reqs = make_requests(num_reqs)
+    print(f'{"size":>6} {"linear ns/req":>14} {"heap ns/req":>12} {"speedup":>8}')
+    for size in [2, 4, 16, 32, 64, 128, 256, 512, 1024]:
+        t_old, out_old, stats_old = bench(LinearPComponent, size, 4, reqs)
+        t_new, out_new, stats_new = bench(PComponent, size, 4, reqs)
+        assert out_old == out_new and stats_old == stats_new, f'allocators disagree for size={size}'
+        print(f'{size:>6} {t_old / num_reqs * 1e9:>14.1f} {t_new / num_reqs * 1e9:>12.1f} {t_old / t_new:>7.1f}x')
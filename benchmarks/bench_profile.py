@@ -0,0 +1,57 @@
+'''
+Measures the overhead of the per-pc cycle attribution profile: the same
+timing run with and without a profile, for both timing engines, checking
+identical cycles
+
+    python benchmarks/bench_profile.py [config] [--kind daxpy] [--trips N]
+
+Steady-state extrapolation is off, so that every instruction is timed in
+detail; the default config is config1.json with 100000 physical registers.
+The profile measured 5-8% on daxpy, fpchain and footprint and 8-10% on
+branchy.
+'''
+
+import argparse
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parser import Parser
+from processor import Processor, TIMING_ENGINES, load_config
+from workloads import generate
+
+
+def time_timing(cfg, parser, branch_record, engine, profile):
+    proc = Processor.from_config(cfg, parser, branch_record)
+    proc.engine = engine
+    proc.extrapolate = False
+    proc.set_profile(profile)
+    begin = time.perf_counter()
+    cycles = proc.simulate_timing(verbose=False)
+    return time.perf_counter() - begin, cycles
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description='Measure the overhead of the per-pc profile')
+    ap.add_argument('config', nargs='?', default=os.path.join(here, '..', 'config1.json'))
+    ap.add_argument('--kind', default='daxpy', help='workload of workloads.py')
+    ap.add_argument('--trips', type=int, default=5000, help='trips (footprint words) of the workload')
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    cfg = dict(load_config(args.config), num_physical_regs=100000)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'{args.kind}.txt')
+        with open(path, 'w') as f: f.write(generate(args.kind, **{'words' if args.kind == 'footprint' else 'trips': args.trips}))
+        parser = Parser(path, cache_dir=None)        # a temporary program: keep it out of the cache
+    func = Processor.from_config(None, parser)
+    func.simulate_func(verbose=False)
+
+    print(f'{func.num_committed} committed instructions')
+    print(f'{"engine":>9} {"plain s":>9} {"profiled s":>11} {"overhead":>9} {"same":>5}')
+    for engine in TIMING_ENGINES:
+        plain = min(time_timing(cfg, parser, func.branch_record, engine, False) for _ in range(args.repeat))
+        profiled = min(time_timing(cfg, parser, func.branch_record, engine, True) for _ in range(args.repeat))
+        print(f'{engine:>9} {plain[0]:9.3f} {profiled[0]:11.3f} {100 * (profiled[0] / plain[0] - 1):8.1f}% {str(plain[1] == profiled[1]):>5}')
@@ -0,0 +1,88 @@
+'''
+Validates sampled simulation against full timing on the synthetic workloads:
+estimated vs simulated total cycles, whether the confidence interval covers
+the full result, the rename backlog projected to the end of the run, and the
+speedup. Estimates flagged as unavailable (see sampling.py) are shown as n/a
+
+    python benchmarks/bench_sampling.py config1.json [--interval K] [--window W] [--warmup D] [--scale S] [--physical-regs N]
+
+With the sample configs the rename stalls compound over the whole run and
+every estimate is unavailable; with `--physical-regs 100000` only footprint,
+the longest run, still outgrows the rename pool.
+'''
+
+import argparse
+import math
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parser import Parser
+from processor import Processor, load_config
+from sampling import simulate_sampled
+from workloads import generate
+
+
+WORKLOADS = [
+    ('daxpy', {'trips': 5000}),
+    ('fpchain', {'trips': 2000, 'depth': 16}),
+    ('branchy', {'trips': 1500, 'branches': 4}),
+    ('footprint', {'words': 16384, 'passes': 2}),
+]
+
+
+def sci(v):
+    # %g of cycle counts that can exceed the float range
+    if isinstance(v, int) and v.bit_length() > 1000:
+        exponent, mantissa = divmod(math.log10(v), 1)
+        return f'{10 ** mantissa:.3f}e+{int(exponent)}'
+    return f'{v:.4g}'
+
+
+def relative_error(estimate, full):
+    if not math.isfinite(estimate) or estimate <= 0 or full <= 0: return math.nan
+    return math.exp(math.log(estimate) - math.log(full)) - 1
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Compare sampled and full timing')
+    ap.add_argument('cfg_file')
+    ap.add_argument('--interval', type=int, default=2000)
+    ap.add_argument('--window', type=int, default=100)
+    ap.add_argument('--warmup', type=int, default=200)
+    ap.add_argument('--scale', type=float, default=1.0, help='multiplies the size of every workload')
+    ap.add_argument('--physical-regs', type=int, default=None, help='overrides num_physical_regs of the config')
+    args = ap.parse_args()
+
+    cfg = load_config(args.cfg_file)
+    if args.physical_regs is not None: cfg['num_physical_regs'] = args.physical_regs
+    print(f'{"workload":>10} {"instrs":>8} {"full cycles":>12} {"estimate":>12} {"+-":>10} {"error":>8} {"covered":>8} '
+          f'{"backlog":>8} {"speedup":>8}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind, params in WORKLOADS:
+            size = 'words' if kind == 'footprint' else 'trips'
+            params = dict(params, **{size: max(1, int(params[size] * args.scale))})
+            path = os.path.join(tmp, f'{kind}.txt')
+            with open(path, 'w') as f: f.write(generate(kind, **params))
+            parser = Parser(path, cache_dir=None)        # a temporary program: keep it out of the cache
+
+            begin = time.perf_counter()
+            proc = Processor.from_config(cfg, parser)
+            full = proc.simulate(verbose=False)
+            full_time = time.perf_counter() - begin
+
+            begin = time.perf_counter()
+            result = simulate_sampled(cfg, parser, args.interval, args.window, args.warmup)
+            sampled_time = time.perf_counter() - begin
+
+            backlog = sci(result.rename_backlog)
+            if not result.available:
+                print(f'{kind:>10} {proc.num_committed:>8} {sci(full):>12} {"n/a":>12} {"n/a":>10} {"n/a":>8} {"n/a":>8} '
+                      f'{backlog:>8} {full_time / sampled_time:>7.1f}x  ({result.problem})')
+                continue
+            error = relative_error(result.total_cycles, full)
+            covered = result.total_cycles - result.total_cycles_half_width <= full <= result.total_cycles + result.total_cycles_half_width
+            print(f'{kind:>10} {proc.num_committed:>8} {sci(full):>12} {sci(result.total_cycles):>12} '
+                  f'{sci(result.total_cycles_half_width):>10} {error:>+8.1%} {str(covered):>8} {backlog:>8} '
+                  f'{full_time / sampled_time:>7.1f}x')
@@ -0,0 +1,76 @@
+'''
+Latency of simulation jobs three ways: a new `python processor.py` process
+per job, the job server with a cold result cache, and the same jobs again
+from its cache
+
+    python benchmarks/bench_server.py [config] [--jobs N] [--workers W]
+'''
+
+import argparse
+import json
+import os, sys
+import subprocess
+import tempfile
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(here, '..'))
+from server import submit
+from workloads import generate
+
+
+def wait_for_server(port, timeout=30):
+    import urllib.request
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health'): return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError('the server did not start')
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Compare per-process runs with the job server')
+    ap.add_argument('config', nargs='?', default=os.path.join(here, '..', 'config1.json'))
+    ap.add_argument('--jobs', type=int, default=16, help='distinct (program, config) jobs')
+    ap.add_argument('--workers', type=int, default=4)
+    ap.add_argument('--port', type=int, default=8766)
+    args = ap.parse_args()
+
+    with open(args.config) as f: cfg = json.load(f)
+    source = generate('daxpy', trips=100)
+    jobs = [{'id': i, 'program': source, 'config': dict(cfg, ROB_RS=4 + i)} for i in range(args.jobs)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        code = os.path.join(tmp, 'daxpy.txt')
+        with open(code, 'w') as f: f.write(source)
+        env = {k: v for k, v in os.environ.items() if k != 'OOO_ASM_CACHE'}     # keep the temporary program out of the cache
+        begin = time.perf_counter()
+        for job in jobs:
+            cfg_file = os.path.join(tmp, 'cfg.json')
+            with open(cfg_file, 'w') as f: json.dump(job['config'], f)
+            subprocess.run([sys.executable, os.path.join(here, '..', 'processor.py'), cfg_file, code],
+                           check=True, stdout=subprocess.DEVNULL, env=env)
+        per_process = time.perf_counter() - begin
+
+        server = subprocess.Popen([sys.executable, os.path.join(here, '..', 'server.py'), '--port', str(args.port),
+                                   '--workers', str(args.workers), '--cache-dir', os.path.join(tmp, 'results')],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            wait_for_server(args.port)
+            begin = time.perf_counter()
+            first = list(submit(jobs, port=args.port))
+            cold = time.perf_counter() - begin
+            begin = time.perf_counter()
+            again = list(submit(jobs, port=args.port))
+            cached = time.perf_counter() - begin
+        finally:
+            server.terminate()
+            server.wait()
+
+    assert all('result' in line for line in first + again) and all(line['cached'] for line in again)
+    print(f'{args.jobs} jobs, {args.workers} server workers')
+    print(f'process per job:   {per_process * 1e3:9.1f} ms')
+    print(f'server, cold:      {cold * 1e3:9.1f} ms ({per_process / cold:6.1f}x)')
+    print(f'server, cached:    {cached * 1e3:9.1f} ms ({per_process / cached:6.1f}x)')
@@ -0,0 +1,65 @@
+'''
+Measures steady-state extrapolation in simulate_timing: the same loop timed
+with and without jumping over repeating iterations, for growing trip counts,
+checking that cycles and metrics are identical
+
+    python benchmarks/bench_steady.py [config] [--trips 1000 10000 ...] [--param NAME=VALUE ...]
+
+The default config is config1.json with NF=1 and 256 physical registers, where
+the footprint loop settles into a steady state; with config1.json as is, the
+rename stalls keep growing and no iteration repeats.
+'''
+
+import argparse
+import json
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parser import Parser
+from processor import Processor, load_config
+from workloads import generate
+
+
+def time_timing(cfg, parser, branch_record, extrapolate):
+    proc = Processor.from_config(cfg, parser, branch_record)
+    proc.extrapolate = extrapolate
+    begin = time.perf_counter()
+    cycles = proc.simulate_timing(verbose=False)
+    return time.perf_counter() - begin, cycles, proc.metrics.report(proc), proc.steady
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description='Compare timing runs with and without steady-state extrapolation')
+    ap.add_argument('config', nargs='?', default=os.path.join(here, '..', 'config1.json'))
+    ap.add_argument('--kind', default='footprint', help='workload of workloads.py')
+    ap.add_argument('--trips', type=int, nargs='+', default=[1000, 10000, 100000])
+    ap.add_argument('--param', action='append', default=None, help='config override NAME=VALUE')
+    ap.add_argument('--full-max', type=int, default=100000, help='largest trip count also timed without extrapolation')
+    args = ap.parse_args()
+
+    cfg = load_config(args.config)
+    for p in args.param if args.param is not None else ['NF=1', 'num_physical_regs=256']:
+        name, value = p.split('=', 1)
+        cfg[name] = json.loads(value)
+
+    size = 'words' if args.kind == 'footprint' else 'trips'
+    print(f'{"trips":>9} {"instrs":>10} {"cycles":>12} {"full s":>8} {"steady s":>9} {"jumped":>9} {"speedup":>8} {"same":>5}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for trips in args.trips:
+            path = os.path.join(tmp, f'{args.kind}.txt')
+            with open(path, 'w') as f: f.write(generate(args.kind, **{size: trips}))
+            parser = Parser(path, cache_dir=None)        # a temporary program: keep it out of the cache
+            func = Processor.from_config(None, parser)
+            func.simulate_func(verbose=False)
+
+            fast, cycles, report, steady = time_timing(cfg, parser, func.branch_record, True)
+            if trips <= args.full_max:
+                full, full_cycles, full_report, _ = time_timing(cfg, parser, func.branch_record, False)
+                same, speedup = full_cycles == cycles and full_report == report, f'{full / fast:>7.1f}x'
+            else:
+                full, same, speedup = float('nan'), '-', f'{"-":>8}'
+            print(f'{trips:>9} {func.num_committed:>10} {cycles:>12.6g} {full:>8.3f} {fast:>9.3f} '
+                  f'{steady.num_jumped:>9} {speedup} {str(same):>5}')
@@ -0,0 +1,39 @@
+'''
+Measures the cost of event tracing: a full run (functional + timing) silent,
+and traced at every level into a ring buffer and into a text file
+'''
+
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from event_trace import *
+from parser import Parser
+from processor import Processor, load_config
+
+
+def time_run(cfg, parser, level, sink):
+    proc = Processor.from_config(cfg, parser)
+    proc.set_event_trace(level, sink)
+    begin = time.perf_counter()
+    proc.simulate(verbose=False)
+    if sink is not None: sink.close()
+    return time.perf_counter() - begin
+
+
+if __name__ == '__main__':
+    if len(sys.argv[1:]) != 2:
+        print(f'Usage: {sys.argv[0]} path/to/config/file path/to/input/code')
+        exit(1)
+
+    cfg = load_config(sys.argv[1])
+    parser = Parser(sys.argv[2])
+    base = time_run(cfg, parser, LEVEL_OFF, None)
+    print(f'{"silent":>16}: {base * 1e3:9.2f} ms')
+    with tempfile.TemporaryDirectory() as tmp:
+        for level in [LEVEL_INFO, LEVEL_INSTR, LEVEL_STATE]:
+            for kind in ['ring', 'text']:
+                sink = RingSink() if kind == 'ring' else TextSink(os.path.join(tmp, 'trace.txt'))
+                t = time_run(cfg, parser, level, sink)
+                print(f'{LEVEL_NAMES[level] + " " + kind:>16}: {t * 1e3:9.2f} ms ({t / base:.1f}x)')
@@ -0,0 +1,107 @@
+'''
+Measures the opcode dispatch table of the functional-unit pools against the
+if chain over opcodes it replaced, then times a program on a wide machine
+(width 8) with growing numbers of units per pool, with both timing engines
+
+    python benchmarks/bench_units.py [config] [--kind daxpy] [--trips N] [--counts 1 2 4]
+
+The wide machine has every width at 8, a ROB of 128 entries and 100000
+physical registers on top of the config. Its pools are INT (add, addi, slt),
+MEM (fld, fsd), FP (fadd, fsub, fmul), FPdiv and BU, with the latencies and
+RS sizes of INT, LD, FPmult, FPdiv and BU in the config.
+'''
+
+import argparse
+import os, sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from instruction import *
+from parser import Parser
+from processor import Processor, TIMING_ENGINES, load_config
+from workloads import generate
+
+
+def chain_unit(proc, opcode):
+    # the dispatch of run_instruction before the pools, on the same units
+    pools = {pool.get_name(): pool.units[0] for pool in proc.pools}
+    if opcode in (OP_ADD, OP_ADDI, OP_SLT): return pools['INT']
+    elif opcode == OP_FLD: return pools['LD']
+    elif opcode == OP_FSD: return pools['ST']
+    elif opcode in (OP_FADD, OP_FSUB): return pools['FPadd']
+    elif opcode == OP_FMUL: return pools['FPmult']
+    elif opcode == OP_FDIV: return pools['FPdiv']
+    elif opcode == OP_BNE: return pools['BU']
+    assert False, f'Unrecognized opcode: {opcode}'
+
+
+def time_dispatch(proc, opcodes):
+    pools = {pool.get_name(): pool.units[0] for pool in proc.pools}
+    ex_INT, ex_LD, ex_ST, ex_FPadd = pools['INT'], pools['LD'], pools['ST'], pools['FPadd']
+    ex_FPmult, ex_FPdiv, ex_BU = pools['FPmult'], pools['FPdiv'], pools['BU']
+    begin = time.perf_counter()
+    for opcode in opcodes:
+        if opcode in (OP_ADD, OP_ADDI, OP_SLT): unit = ex_INT
+        elif opcode == OP_FLD: unit = ex_LD
+        elif opcode == OP_FSD: unit = ex_ST
+        elif opcode in (OP_FADD, OP_FSUB): unit = ex_FPadd
+        elif opcode == OP_FMUL: unit = ex_FPmult
+        elif opcode == OP_FDIV: unit = ex_FPdiv
+        elif opcode == OP_BNE: unit = ex_BU
+    chain = time.perf_counter() - begin
+
+    pool_of = proc.pool_of
+    begin = time.perf_counter()
+    for opcode in opcodes:
+        unit = pool_of[opcode].pick()
+    return chain, time.perf_counter() - begin
+
+
+def wide_config(cfg, count):
+    pool = lambda name, unit, ops: {'name': name, 'count': count, 'latency': cfg[f'{unit}_latency'],
+                                    'RS': cfg[f'{unit}_RS'], 'ops': ops}
+    units = [pool('INT', 'INT', ['add', 'addi', 'slt']), pool('MEM', 'LD', ['fld', 'fsd']),
+             pool('FP', 'FPmult', ['fadd', 'fsub', 'fmul']), pool('FPdiv', 'FPdiv', ['fdiv']), pool('BU', 'BU', ['bne'])]
+    return dict(cfg, NF=8, NI=32, NW=8, NR=8, NB=8, ROB_RS=128, num_physical_regs=100000, units=units)
+
+
+if __name__ == '__main__':
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description='Measure the functional-unit dispatch table and wide machines')
+    ap.add_argument('config', nargs='?', default=os.path.join(here, '..', 'config1.json'))
+    ap.add_argument('--kind', default='daxpy', help='workload of workloads.py')
+    ap.add_argument('--trips', type=int, default=2000)
+    ap.add_argument('--counts', type=int, nargs='+', default=[1, 2, 4])
+    args = ap.parse_args()
+
+    cfg = load_config(args.config)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'{args.kind}.txt')
+        with open(path, 'w') as f: f.write(generate(args.kind, trips=args.trips))
+        parser = Parser(path, cache_dir=None)        # a temporary program: keep it out of the cache
+    func = Processor.from_config(None, parser)
+    func.simulate_func(verbose=False)
+
+    # the opcodes of the committed path, from the branch outcomes
+    code = parser.get_decoded()
+    opcodes, pc, outcomes = [], 0, iter(func.branch_record)
+    while pc // 4 < len(code):
+        d = code[pc // 4]
+        opcodes.append(d.opcode)
+        pc = d.imm if d.opcode == OP_BNE and next(outcomes) else pc + 4
+    proc = Processor.from_config(cfg, parser)
+    chain, table = min(time_dispatch(proc, opcodes) for _ in range(3))
+    print(f'{len(opcodes)} committed instructions')
+    print(f'dispatch: if chain {chain * 1e3:.2f} ms, table {table * 1e3:.2f} ms ({chain / table:.2f}x)')
+    assert all(chain_unit(proc, op) is proc.pool_of[op].pick() for op in range(len(OPCODES)))
+
+    print(f'{"units":>6} {"engine":>9} {"cycles":>10} {"ipc":>6} {"seconds":>8}')
+    for count in args.counts:
+        for engine in TIMING_ENGINES:
+            proc = Processor.from_config(wide_config(cfg, count), parser, func.branch_record)
+            proc.engine = engine
+            begin = time.perf_counter()
+            cycles = proc.simulate_timing(verbose=False)
+            seconds = time.perf_counter() - begin
+            print(f'{count:6d} {engine:>9} {cycles:10d} {func.num_committed / cycles:6.3f} {seconds:8.3f}')
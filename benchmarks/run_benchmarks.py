@@ -0,0 +1,155 @@
+'''
+Simulator throughput suite: times parsing, simulate_func and simulate_timing
+on the synthetic workloads of workloads.py and compares against a JSON
+baseline
+
+    python benchmarks/run_benchmarks.py -o base.json                # record a baseline
+    python benchmarks/run_benchmarks.py --baseline base.json        # flag regressions
+
+Every workload runs in a fresh process, so its peak RSS is its own: the RSS
+reported for a phase is the peak of the process up to the end of that phase.
+Wall times are the best of --repeat runs. A phase regresses when its wall time
+or peak RSS exceeds the baseline by more than --tolerance (wall times shorter
+than --min-wall in the baseline are too noisy to be checked); the exit status
+is then 1.
+'''
+
+import argparse
+import json
+import multiprocessing
+import os, sys
+import platform
+import resource
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parser import Parser
+from processor import Processor, load_config
+from workloads import generate
+
+
+# (name, kind, params, size parameter scaled by --scale)
+SUITE = [
+    ('daxpy', 'daxpy', {'trips': 4000}, 'trips'),
+    ('fpchain', 'fpchain', {'trips': 1500, 'depth': 16}, 'trips'),
+    ('branchy', 'branchy', {'trips': 800, 'branches': 4}, 'trips'),
+    ('footprint', 'footprint', {'words': 8192, 'stride': 1, 'passes': 2}, 'words'),
+]
+PHASES = ['parse', 'func', 'timing']
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10    # bytes on macOS, KiB elsewhere
+
+
+def run_workload(job):
+    '''
+    Runs in its own process: measures the phases of one workload
+    '''
+    path, cfg, repeat = job
+    best = {phase: float('inf') for phase in PHASES}
+    rss = {}
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        parser = Parser(path, cache_dir=None)        # time the assembler, not a cache hit
+        best['parse'] = min(best['parse'], time.perf_counter() - begin)
+        rss['parse'] = peak_rss_mb()
+
+        func = Processor.from_config(None, parser)
+        begin = time.perf_counter()
+        func.simulate_func(verbose=False)
+        best['func'] = min(best['func'], time.perf_counter() - begin)
+        rss['func'] = peak_rss_mb()
+
+        proc = Processor.from_config(cfg, parser, func.branch_record)
+        begin = time.perf_counter()
+        proc.simulate_timing(verbose=False)
+        best['timing'] = min(best['timing'], time.perf_counter() - begin)
+        rss['timing'] = peak_rss_mb()
+
+    instrs = func.num_committed
+    result = {'static_instrs': len(parser.get_instructions()), 'instrs': instrs}
+    for phase in PHASES:
+        result[phase] = {'wall_s': best[phase], 'peak_rss_mb': rss[phase]}
+        if phase != 'parse': result[phase]['instrs_per_s'] = instrs / best[phase] if best[phase] else 0
+    return result
+
+
+def run_suite(cfg_file, scale=1.0, repeat=3):
+    cfg = load_config(cfg_file)
+    results = {'config': os.path.basename(cfg_file), 'scale': scale, 'python': platform.python_version(),
+               'workloads': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs, names = [], []
+        for name, kind, params, size in SUITE:
+            params = dict(params, **{size: max(1, int(params[size] * scale))})
+            path = os.path.join(tmp, f'{name}.txt')
+            with open(path, 'w') as f: f.write(generate(kind, **params))
+            results['workloads'][name] = {'kind': kind, 'params': params}
+            jobs.append((path, cfg, repeat))
+            names.append(name)
+
+        # maxtasksperchild=1: a fresh process, and so a fresh peak RSS, per workload
+        with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+            for name, result in zip(names, pool.map(run_workload, jobs, chunksize=1)):
+                results['workloads'][name].update(result)
+    return results
+
+
+def compare(results, baseline, tolerance, min_wall=0.05):
+    '''
+    Returns a line per regressed (workload, phase, metric) with the ratio to
+    the baseline
+    '''
+    regressions = []
+    for name, result in results['workloads'].items():
+        base = baseline['workloads'].get(name)
+        if base is None or base['params'] != result['params']: continue
+        for phase in PHASES:
+            for metric in ['wall_s', 'peak_rss_mb']:
+                old, new = base[phase][metric], result[phase][metric]
+                if metric == 'wall_s' and old < min_wall: continue
+                if old and new > old * (1 + tolerance):
+                    regressions.append(f'{name}.{phase}.{metric}: {old:.4g} -> {new:.4g} ({new / old:.2f}x)')
+    return regressions
+
+
+def print_results(results, baseline=None):
+    print(f'{"workload":>10} {"phase":>7} {"wall s":>9} {"instrs/s":>11} {"peak RSS":>9} {"vs base":>8}')
+    for name, result in results['workloads'].items():
+        base = baseline['workloads'].get(name) if baseline else None
+        if base is not None and base['params'] != result['params']: base = None
+        for phase in PHASES:
+            r = result[phase]
+            ips = f'{r["instrs_per_s"]:>11.0f}' if 'instrs_per_s' in r else f'{"":>11}'
+            ratio = f'{r["wall_s"] / base[phase]["wall_s"]:>7.2f}x' if base and base[phase]['wall_s'] else ''
+            print(f'{name:>10} {phase:>7} {r["wall_s"]:>9.4f} {ips} {r["peak_rss_mb"]:>7.1f}MB {ratio}')
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Measure the simulator throughput on synthetic workloads')
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap.add_argument('--config', default=os.path.join(here, '..', 'config1.json'), help='config file of the timing runs')
+    ap.add_argument('--scale', type=float, default=1.0, help='multiplies the size of every workload')
+    ap.add_argument('--repeat', type=int, default=3, help='runs per workload; the best wall times are kept')
+    ap.add_argument('-o', '--output', default=None, help='write the results as JSON (e.g. a new baseline)')
+    ap.add_argument('--baseline', default=None, help='JSON results to compare against')
+    ap.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown/growth over the baseline')
+    ap.add_argument('--min-wall', type=float, default=0.05, help='shortest baseline wall time (s) checked for regressions')
+    args = ap.parse_args()
+
+    results = run_suite(args.config, args.scale, args.repeat)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f: json.dump(results, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_wall)
+        for line in regressions: print(f'REGRESSION {line}')
+        if regressions: exit(1)
+        print(f'no regression over {args.baseline} (tolerance {args.tolerance:.0%})')
@@ -0,0 +1,127 @@
+'''
+Synthetic workloads in the Parser input format
+
+    python benchmarks/workloads.py daxpy trips=1000 > daxpy.txt
+
+Kinds:
+    daxpy:     y[i] = a * x[i] + y[i], the loop1/loop2 kernel of test1.txt
+    fpchain:   one long fadd/fmul/fsub/fdiv dependency chain per iteration
+    branchy:   several data-dependent branches per iteration
+    footprint: strided passes over a large memory array
+
+Every bne is followed by at least PAD other instructions: the timing model
+runs the rest of a fetch group after a taken branch, which must not meet
+another branch there, so the programs stay valid for fetch widths up to
+PAD + 1.
+'''
+
+import argparse
+import random
+
+
+PAD = 8
+
+
+def pad(lines, n=PAD):
+    lines += [f'addi R{20 + i % 4}, R0, {i}' for i in range(n)]
+
+
+def memory(values, base=0):
+    return [f'{base + 8 * i}, {v}' for i, v in enumerate(values)]
+
+
+def daxpy(trips=1000, seed=0):
+    rnd = random.Random(seed)
+    x, y = 0, 8 * trips
+    lines = ['% daxpy'] + memory([rnd.randint(0, 50) for _ in range(2 * trips)] + [3]) + ['']
+    lines += [f'addi R1, R0, {x + 8 * (trips - 1)}',
+              f'addi R2, R0, {y + 8 * (trips - 1)}',
+              f'fld F2, {16 * trips}(R0)',
+              f'addi R5, R0, {x - 8}',
+              'loop:',
+              'fld F0, 0(R1)',
+              'fmul F0, F0, F2',
+              'fld F4, 0(R2)',
+              'fadd F0, F0, F4',
+              'fsd F0, 0(R2)',
+              'addi R1, R1, -8',
+              'addi R2, R2, -8',
+              'bne R1, R5, loop']
+    pad(lines)
+    return lines
+
+
+def fpchain(trips=1000, depth=16):
+    ops = ['fadd F0, F0, F2', 'fmul F0, F0, F4', 'fsub F0, F0, F2', 'fdiv F0, F0, F4']
+    lines = ['% fpchain', '0, 2', '8, 1', '',
+             'fld F2, 0(R0)',
+             'fld F4, 8(R0)',
+             f'addi R5, R0, {trips}',
+             'loop:']
+    lines += [ops[i % len(ops)] for i in range(depth)]
+    lines += ['addi R1, R1, 1', 'bne R1, R5, loop']
+    pad(lines)
+    lines.append('fsd F0, 16(R0)')
+    return lines
+
+
+def branchy(trips=1000, branches=4, taken_ratio=0.5, seed=0):
+    rnd = random.Random(seed)
+    flags = [int(rnd.random() < taken_ratio) for _ in range(trips * branches)]
+    lines = ['% branchy'] + memory(flags) + ['',
+             f'addi R5, R0, {8 * len(flags)}',
+             'loop:']
+    for b in range(branches):
+        lines += [f'fld F0, {8 * b}(R1)', f'bne F0, F9, skip{b}']     # F9 is never written: 0
+        pad(lines, PAD // 2)
+        lines += ['fadd F2, F2, F0'] * (PAD - PAD // 2)
+        lines.append(f'skip{b}:')
+        lines.append(f'add R{10 + b}, R{10 + b}, R1')
+    lines += [f'addi R1, R1, {8 * branches}', 'bne R1, R5, loop']
+    pad(lines)
+    return lines
+
+
+def footprint(words=65536, stride=1, passes=2, seed=0):
+    rnd = random.Random(seed)
+    steps = words // stride
+    lines = ['% footprint'] + memory([rnd.randint(0, 50) for _ in range(words)]) + ['',
+             f'addi R5, R0, {8 * stride * steps}',
+             f'addi R7, R0, {passes}',
+             'outer:',
+             'addi R1, R0, 0']
+    pad(lines)
+    lines += ['loop:',
+              'fld F0, 0(R1)',
+              'fadd F2, F2, F0',
+              'fsd F2, 0(R1)',
+              f'addi R1, R1, {8 * stride}',
+              'bne R1, R5, loop']
+    pad(lines)
+    lines += ['addi R7, R7, -1', 'bne R7, R0, outer']
+    pad(lines)
+    return lines
+
+
+WORKLOADS = {'daxpy': daxpy, 'fpchain': fpchain, 'branchy': branchy, 'footprint': footprint}
+
+
+def generate(kind, **params):
+    '''
+    Source of a `kind` workload; `params` are the keyword arguments of its
+    generator
+    '''
+    return '\n'.join(WORKLOADS[kind](**params)) + '\n'
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Generate a synthetic workload')
+    ap.add_argument('kind', choices=sorted(WORKLOADS))
+    ap.add_argument('params', nargs='*', metavar='NAME=VALUE', help='generator parameters, e.g. trips=1000')
+    args = ap.parse_args()
+
+    params = {}
+    for p in args.params:
+        name, value = p.split('=', 1)
+        params[name] = float(value) if '.' in value else int(value)
+    print(generate(args.kind, **params), end='')
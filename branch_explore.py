@@ -0,0 +1,297 @@
+'''
+One-pass branch predictor exploration: the mispredicts and mispredict penalty
+cycles of many BTB sizes and branch predictors from a single walk of the branch
+stream, instead of one timing run per candidate
+
+    python branch_explore.py config1.json test1.txt -p btb_entries=4,16,64,256 -p branch_predictor=bimodal,gshare,local,tage -p bp_history_bits=4,8,16 -o bp.csv
+
+Ranges are given as in sweep.py. Only the parameters the branch behaviour
+depends on can be swept: btb_entries, the branch predictor keys, the widths
+NF/NI/NW/NR/NB and BU_latency.
+
+The branches the timing model runs and the order in which it trains the branch
+unit depend on the fetch width (min of NF/NI/NW/NR/NB) and the branch outcomes
+only, not on the predictions. The fetch groups are walked once per fetch width,
+keeping the pc, outcome and taken target of every branch run by
+`Processor.run_instruction`, and whether it ends its fetch group. Then:
+
+- A direct-mapped BTB entry only changes when its own set is accessed. For
+  every btb_entries the stream is split by set (a stable sort): a branch hits
+  when the previous access to its set was the same branch, the entry holds the
+  taken target once the branch was taken since it was allocated, and its 2-bit
+  bimodal counter is a saturating-counter scan over those runs.
+- gshare, local and TAGE train on every branch, hit or not, so their direction
+  predictions don't depend on the BTB and are computed once per
+  (bp_table_bits, bp_history_bits): gshare and local as counter scans over the
+  stream split by counter index, TAGE by replaying predictors.Tage.
+- A branch is predicted taken when it hits and its direction is taken, and is
+  mispredicted as in `Processor.run_instruction`; its stall of decoder latency
+  + the latency of the pool serving bne (BU_latency by default) is paid when
+  it ends its fetch group.
+
+Counter scans are segmented doubling scans over the 4-state transition maps,
+so every configuration costs a few NumPy passes over the stream. The results
+are those of the timing model's metrics (branches, mispredicts,
+mispredict_penalty_cycles).
+'''
+
+import argparse
+import bisect
+import csv
+import itertools
+import os, sys
+import time
+import numpy as np
+
+from exec_trace import TraceReader
+from functional_units import pool_latency
+from instruction import OP_BNE
+from parser import Parser
+from predictors import CONFIG_KEYS, Tage, check_params, fold, DEFAULT_TABLE_BITS, DEFAULT_HISTORY_BITS
+from processor import Processor, load_config
+from sweep import parse_range
+
+
+WIDTH_KEYS = ('NF', 'NI', 'NW', 'NR', 'NB')
+SWEEP_KEYS = WIDTH_KEYS + ('btb_entries', 'BU_latency') + CONFIG_KEYS
+DECODER_LATENCY = 1         # of Processor.decoder
+
+# Maps of the 4 states of a 2-bit counter are packed in a byte (2 bits per
+# state); COMPOSE[a, b] is the map applying b, then a
+DEC, INC, KEEP = 0, 1, 2
+STEP_MAPS = np.array([0b10_01_00_00, 0b11_11_10_01, 0b11_10_01_00], dtype=np.uint8)
+_APPLY = (np.arange(256)[:, None] >> (2 * np.arange(4))) & 3
+COMPOSE = (_APPLY[np.arange(256)[:, None, None], _APPLY[None, :, :]] << (2 * np.arange(4))).sum(axis=2).astype(np.uint8)
+
+
+class BranchStream:
+    '''
+    The branches run by the timing model at fetch width `width`, in order:
+    arrays of their pc, taken target, outcome and whether they are the last
+    instruction of their fetch group
+    '''
+    def __init__(self, parser, branch_outcomes, width):
+        code = parser.get_decoded()
+        num_lines = len(code)
+        branch_lines = [i for i, d in enumerate(code) if d.opcode == OP_BNE]
+        # the branches of the fetch group starting at every line
+        groups = [branch_lines[bisect.bisect_left(branch_lines, l):bisect.bisect_left(branch_lines, l + width)]
+                  for l in range(num_lines)]
+
+        outcomes = iter(branch_outcomes)
+        lines, taken, last = [], [], []
+        pc = 0
+        while 0 <= pc // 4 < num_lines:
+            l_begin = pc // 4
+            l_end = min(l_begin + width, num_lines)
+            next_pc = 4 * l_end
+            for line in groups[l_begin]:
+                outcome = next(outcomes, None)
+                assert outcome is not None, 'Ran out of branch outcomes'
+                lines.append(line)
+                taken.append(outcome)
+                target = code[line].imm
+                if outcome and target != 4 * line + 4: next_pc = target
+            if groups[l_begin] and groups[l_begin][-1] == l_end - 1: last.append(len(lines) - 1)
+            pc = next_pc
+
+        lines = np.array(lines, dtype=np.int64)
+        self.pc = 4 * lines
+        self.target = np.array([d.imm for d in code], dtype=np.int64)[lines] if len(lines) else lines
+        self.taken = np.array(taken, dtype=bool)
+        self.last = np.zeros(len(lines), dtype=bool)
+        self.last[last] = True
+
+
+    def __len__(self):
+        return len(self.pc)
+
+
+def scan_counters(starts, steps, init):
+    '''
+    The state of a 2-bit saturating counter before every step, for a stream
+    sorted by counter: `starts` marks the first step of every counter, which
+    starts at `init`, and `steps` are DEC, INC or KEEP
+    '''
+    n = len(steps)
+    if n == 0: return np.zeros(0, dtype=np.int8)
+    index = np.arange(n)
+    first = np.maximum.accumulate(np.where(starts, index, 0))
+    maps = STEP_MAPS[steps]             # becomes the composition of the counter's steps so far
+    longest = int(np.max(np.diff(np.append(np.nonzero(starts)[0], n))))
+    d = 1
+    while d < longest:
+        maps[d:] = np.where(index[d:] - d >= first[d:], COMPOSE[maps[d:], maps[:-d]], maps[d:])
+        d *= 2
+    before = np.full(n, init, dtype=np.int8)
+    before[1:] = np.where(starts[1:], init, (maps[:-1] >> (2 * init)) & 3)
+    return before
+
+
+def counters_before(keys, steps, init):
+    '''
+    scan_counters of a stream in program order, whose step i applies to the
+    counter keys[i]
+    '''
+    order = np.argsort(keys, kind='stable')
+    k = keys[order]
+    starts = np.ones(len(k), dtype=bool)
+    starts[1:] = k[1:] != k[:-1]
+    before = np.empty(len(k), dtype=np.int8)
+    before[order] = scan_counters(starts, steps[order], init)
+    return before
+
+
+def history_before(taken, bits, starts=None):
+    '''
+    The last `bits` outcomes before every branch, the latest in bit 0, as
+    uint64; with `starts`, only those since the last start
+    '''
+    n = len(taken)
+    first = np.maximum.accumulate(np.where(starts, np.arange(n), 0)) if starts is not None else np.zeros(n, dtype=np.int64)
+    history = np.zeros(n, dtype=np.uint64)
+    outcomes = taken.astype(np.uint64)
+    for k in range(1, min(bits, n) + 1):
+        bit = np.zeros(n, dtype=np.uint64)
+        bit[k:] = outcomes[:-k]
+        bit[np.arange(n) - k < first] = 0
+        history |= bit << np.uint64(k - 1)
+    return history
+
+
+class BtbRuns:
+    '''
+    For every branch of a stream, in a direct-mapped BTB of `entries` entries:
+    whether it hits, whether the entry holds its taken target and its bimodal
+    counter (meaningful when it hits)
+    '''
+    def __init__(self, stream, entries):
+        sets = (stream.pc >> 4) % entries
+        order = np.argsort(sets, kind='stable')
+        s, pc, taken = sets[order], stream.pc[order], stream.taken[order]
+        hit = np.zeros(len(s), dtype=bool)
+        hit[1:] = (s[1:] == s[:-1]) & (pc[1:] == pc[:-1])
+        allocated = ~hit                # starts a run of hits of the same branch
+
+        # the allocation sets the counter to weakly taken, hits move it
+        steps = np.where(hit, taken.astype(np.int8), KEEP)
+        cnt = scan_counters(allocated, steps, 2)
+
+        # the target is the taken one once the branch was taken in its run
+        num_taken = np.cumsum(taken)
+        run_first = np.maximum.accumulate(np.where(allocated, np.arange(len(s)), 0))
+        taken_before = num_taken - taken > (num_taken - taken)[run_first]
+        target_ok = taken_before | (stream.target[order] == pc + 4)
+
+        self.hit, self.target_ok, self.cnt = (np.empty_like(a) for a in (hit, target_ok, cnt))
+        self.hit[order], self.target_ok[order], self.cnt[order] = hit, target_ok, cnt
+
+
+def directions(stream, name, table_bits, history_bits):
+    '''
+    Direction predicted for every branch of a stream by a gshare, local or
+    TAGE predictor, asked before it trains on the branch
+    '''
+    pc, taken = stream.pc, stream.taken
+    mask = (1 << table_bits) - 1
+    if name == 'gshare':
+        history = history_before(taken, history_bits)
+        index = ((pc >> 2) ^ fold(history, history_bits, table_bits).astype(np.int64)) & mask
+        return counters_before(index, taken.astype(np.int8), 1) >= 2
+    if name == 'local':
+        slot = (pc >> 2) & mask
+        order = np.argsort(slot, kind='stable')
+        starts = np.ones(len(slot), dtype=bool)
+        starts[1:] = slot[order][1:] != slot[order][:-1]
+        history = np.empty(len(slot), dtype=np.uint64)
+        history[order] = history_before(taken[order], history_bits, starts)
+        index = fold(history, history_bits, table_bits).astype(np.int64)
+        return counters_before(index, taken.astype(np.int8), 1) >= 2
+    assert name == 'tage', f'No direction of the {name} predictor outside the BTB'
+    predictor = Tage(None, table_bits, history_bits)
+    predicted = np.empty(len(pc), dtype=bool)
+    for i, (p, t) in enumerate(zip(pc.tolist(), taken.tolist())):
+        predicted[i] = predictor.predict(p, 0)
+        predictor.update(p, 0, t, True)
+    return predicted
+
+
+def explore(parser, base_cfg, ranges, branch_outcomes):
+    '''
+    Mispredicts and penalty cycles of every point of the grid described by
+    `ranges` (a list of (config key, values) pairs) on top of `base_cfg`.
+    `branch_outcomes` are those of the functional run: a list, or a function
+    returning a new iterator over them (e.g. TraceReader.branch_outcomes).
+    Returns one dict per point, in grid order
+    '''
+    for name, _ in ranges:
+        assert name in SWEEP_KEYS, f'{name} does not change the branch behaviour; one of {list(SWEEP_KEYS)}'
+    streams, btbs, predicted = {}, {}, {}
+    rows = []
+    names = [name for name, _ in ranges]
+    for values in itertools.product(*[v for _, v in ranges]):
+        cfg = dict(base_cfg, **dict(zip(names, values)))
+        width = min(cfg[k] for k in WIDTH_KEYS)
+        entries = cfg['btb_entries']
+        name = cfg.get('branch_predictor', 'bimodal')
+        table_bits = cfg.get('bp_table_bits', DEFAULT_TABLE_BITS)
+        history_bits = cfg.get('bp_history_bits', DEFAULT_HISTORY_BITS)
+        check_params(name, table_bits, history_bits)
+
+        if width not in streams:
+            streams[width] = BranchStream(parser, branch_outcomes() if callable(branch_outcomes) else branch_outcomes, width)
+        stream = streams[width]
+        if (width, entries) not in btbs: btbs[width, entries] = BtbRuns(stream, entries)
+        btb = btbs[width, entries]
+        if name == 'bimodal': direction = btb.cnt >= 2
+        else:
+            key = (width, name, table_bits, history_bits)
+            if key not in predicted: predicted[key] = directions(stream, name, table_bits, history_bits)
+            direction = predicted[key]
+
+        predicted_taken = btb.hit & direction
+        mispredict = (predicted_taken != stream.taken) | (predicted_taken & stream.taken & ~btb.target_ok)
+        num_mispredicts = int(np.count_nonzero(mispredict))
+        row = dict(zip(names, values))
+        row['branches'] = len(stream)
+        row['mispredicts'] = num_mispredicts
+        row['mispredict_rate'] = num_mispredicts / len(stream) if len(stream) else 0
+        row['mispredict_penalty_cycles'] = int(np.count_nonzero(mispredict & stream.last)) * (DECODER_LATENCY + pool_latency(cfg, OP_BNE))
+        rows.append(row)
+    return rows
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Evaluate many BTB sizes and branch predictors in one pass over the branch stream')
+    ap.add_argument('cfg_file', help='base config file')
+    ap.add_argument('input_file', help='input code')
+    ap.add_argument('-p', '--param', action='append', default=[], help='NAME=v1,v2,... or NAME=start:stop[:step]')
+    ap.add_argument('-o', '--output', default=None, help='also write the rows to this CSV file')
+    ap.add_argument('--trace', default=None, help='read the branch outcomes from a trace captured by exec_trace.py')
+    args = ap.parse_args()
+
+    assert os.path.exists(args.cfg_file)
+    assert os.path.exists(args.input_file)
+    parser = Parser(args.input_file)
+    begin = time.perf_counter()
+    if args.trace is None:
+        func = Processor.from_config(None, parser)
+        func.simulate_func(verbose=False)
+        rows = explore(parser, load_config(args.cfg_file), [parse_range(p) for p in args.param], func.branch_record)
+    else:
+        with TraceReader(args.trace) as reader:
+            reader.check_program(parser)
+            rows = explore(parser, load_config(args.cfg_file), [parse_range(p) for p in args.param], reader.branch_outcomes)
+    elapsed = time.perf_counter() - begin
+
+    names = [parse_range(p)[0] for p in args.param]
+    for row in rows:
+        values = ', '.join(f'{name}={row[name]}' for name in names)
+        print(f'{values}: mispredicts={row["mispredicts"]} ({row["mispredict_rate"]:.2%}), '
+              f'penalty_cycles={row["mispredict_penalty_cycles"]}')
+    print(f'{len(rows)} configurations, {rows[0]["branches"] if rows else 0} branches, {elapsed:.2f}s')
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=names + ['branches', 'mispredicts', 'mispredict_rate', 'mispredict_penalty_cycles'])
+            writer.writeheader()
+            writer.writerows(rows)
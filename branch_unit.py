@@ -1,51 +1,97 @@
-from btb import *
+'''
+Branch target buffer on parallel arrays (valid, tag, target, 2-bit counter),
+direct mapped on pc >> 4, with a pluggable direction predictor (see
+predictors.py)
+'''
+
+from array import array
+from predictors import make_predictor, DEFAULT_TABLE_BITS, DEFAULT_HISTORY_BITS
+
 
 class BranchUnit:
-    def __init__(self, num_entries):
+    def __init__(self, num_entries, predictor='bimodal', table_bits=DEFAULT_TABLE_BITS,
+                 history_bits=DEFAULT_HISTORY_BITS):
+        self.reset(num_entries, predictor, table_bits, history_bits)
+
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(cfg['btb_entries'], *predictor_params(cfg))
+
+
+    def reset(self, num_entries, predictor='bimodal', table_bits=DEFAULT_TABLE_BITS,
+              history_bits=DEFAULT_HISTORY_BITS):
         self.num_entries = num_entries
-        self.btb = [BtbEntry()] * self.num_entries
+        self.valid = bytearray(num_entries)
+        self.tag = array('q', bytes(8 * num_entries))
+        self.target = array('q', bytes(8 * num_entries))
+        self.cnt = bytearray(b'\x02' * num_entries)
+        self.predictor_name = predictor
+        self.predictor = make_predictor(predictor, self, table_bits, history_bits)
+        self.predict = self.predictor.predict
+        self.train = self.predictor.update
+
 
     def get_index(self, pc):
         return (pc >> 4) % self.num_entries
-        
+
+
     def is_in_btb(self, pc):
-        idx = self.get_index(pc)
-        assert idx >= 0 and idx < self.num_entries
-        return self.btb[idx].valid and self.btb[idx].pc == pc
+        idx = (pc >> 4) % self.num_entries
+        return self.valid[idx] and self.tag[idx] == pc
+
 
     def is_taken(self, pc):
-        if not self.is_in_btb(pc): return False
-        idx = self.get_index(pc)
-        assert idx >= 0 and idx < self.num_entries
-        assert self.btb[idx].valid and self.btb[idx].pc == pc
-        assert self.btb[idx].cnt >= 0 and self.btb[idx].cnt <= 3
-        return self.btb[idx].cnt >= 2
+        idx = (pc >> 4) % self.num_entries
+        if not (self.valid[idx] and self.tag[idx] == pc): return False
+        return self.predict(pc, idx)
+
 
     def get_target(self, pc):
-        assert self.is_taken(pc)
-        idx = self.get_index(pc)
-        assert idx >= 0 and idx < self.num_entries
-        assert self.btb[idx].valid and self.btb[idx].pc == pc and self.btb[idx].cnt >= 2
-        return self.btb[idx].get_target(pc)
+        # only meaningful after is_taken(pc)
+        return self.target[(pc >> 4) % self.num_entries]
+
 
     def update_btb(self, pc, target, is_taken):
-        if self.is_in_btb(pc):
-            idx = self.get_index(pc)
-            assert idx >= 0 and idx < self.num_entries
-            assert self.btb[idx].valid and self.btb[idx].pc == pc
-            if is_taken:
-                self.btb[idx].target = target
-                self.btb[idx].increment_cnt()
-            else:
-                self.btb[idx].decrement_cnt()
-
-        else:
-            idx = self.get_index(pc)
-            assert idx >= 0 and idx < self.num_entries
-            assert (not self.btb[idx].valid) or (self.btb[idx].pc != pc)
-            self.btb[idx] = BtbEntry()
-            self.btb[idx].set_entry(pc, target, cnt=2)
+        idx = (pc >> 4) % self.num_entries
+        hit = self.valid[idx] and self.tag[idx] == pc
+        if not hit:
+            self.valid[idx] = 1
+            self.tag[idx] = pc
+            self.target[idx] = target
+        elif is_taken:
+            self.target[idx] = target
+        self.train(pc, idx, is_taken, hit)
+
+
+    def entries(self):
+        '''
+        (valid, pc, target, cnt) of every entry
+        '''
+        return list(zip(map(bool, self.valid), self.tag, self.target, self.cnt))
+
+
+    def load_entries(self, entries):
+        assert len(entries) == self.num_entries
+        for idx, (valid, pc, target, cnt) in enumerate(entries):
+            self.valid[idx], self.tag[idx], self.target[idx], self.cnt[idx] = valid, pc, target, cnt
+
+
+    def state(self):
+        '''
+        The BTB and predictor state, hashable
+        '''
+        return bytes(self.valid), self.tag.tobytes(), self.target.tobytes(), bytes(self.cnt), self.predictor.state()
+
 
     def __repr__(self):
-        for e in self.btb:
-            print(e)
+        return '\n'.join(f'valid={v}, pc={pc}, target={target}, cnt={cnt}' for v, pc, target, cnt in self.entries())
+
+
+def predictor_params(cfg):
+    '''
+    (name, table bits, history bits) of the branch predictor of a config;
+    configs without them use the bimodal BTB counters
+    '''
+    return (cfg.get('branch_predictor', 'bimodal'), cfg.get('bp_table_bits', DEFAULT_TABLE_BITS),
+            cfg.get('bp_history_bits', DEFAULT_HISTORY_BITS))
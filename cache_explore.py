@@ -0,0 +1,172 @@
+'''
+One-pass data cache exploration: the hits and misses of many data cache
+geometries from the load/store address stream of one functional run, instead
+of one timing run per geometry
+
+    python cache_explore.py config1.json test1.txt -p l1d_size=1024,4096,16384,65536 -p l1d_assoc=1,2,4,8 -p dcache_line=32,64 -o dc.csv
+
+Ranges are given as in sweep.py, over the keys of data_cache.py
+(DCACHE_KEYS); every point must have a data cache (l1d_size > 0).
+
+Under LRU, a set holds the lines most recently used in it, so an access hits
+in an A-way set exactly when fewer than A other lines of its set were used
+since the last access to its own line: its stack distance in the set
+(Mattson et al.). For every line size the address stream becomes an array of
+line numbers, where an access to the line of the access just before it has
+distance 0 in every geometry. For every number of sets, one walk over the
+other accesses keeps the LRU stack of every set, only as deep as the largest
+associativity asked for, and stores the distances (capped at that depth) in
+a uint8 array; every associativity is then one comparison with it. The L2
+sees exactly the L1 misses, so the misses of every L1 geometry are walked
+again per number of L2 sets.
+
+The hits at each level give the latency the data cache adds to the committed
+loads and stores (memory_cycles, as in the timing model). The hits and
+misses are those of a timing run with the same geometry, which takes the
+same addresses in the same order.
+'''
+
+import argparse
+import csv
+import itertools
+import os, sys
+import time
+import numpy as np
+
+from data_cache import DCACHE_KEYS, access_latencies, dcache_params
+from exec_trace import TraceReader
+from parser import Parser
+from processor import Processor, load_config
+from sweep import parse_range
+
+
+FIELDS = ('accesses', 'l1d_misses', 'l1d_hit_rate', 'l2_accesses', 'l2_misses', 'l2_hit_rate',
+          'memory_accesses', 'memory_cycles', 'amat')
+
+
+def stack_distances(lines, num_sets, depth):
+    '''
+    LRU stack distance of every access of `lines` (an array of line numbers)
+    in its set, with `num_sets` sets, capped at `depth` (also the distance of
+    first accesses)
+    '''
+    dist = np.zeros(len(lines), dtype=np.uint8 if depth < 256 else np.int64)
+    walk = np.ones(len(lines), dtype=bool)
+    walk[1:] = lines[1:] != lines[:-1]
+    walked = lines[walk]
+
+    found = []
+    append = found.append
+    stacks = [[] for _ in range(num_sets)]      # most recently used last
+    for line, s in zip(walked.tolist(), (walked % num_sets).tolist()):
+        stack = stacks[s]
+        try:
+            k = stack.index(line)
+        except ValueError:
+            append(depth)
+            if len(stack) == depth: del stack[0]
+            stack.append(line)
+            continue
+        append(len(stack) - 1 - k)
+        del stack[k]
+        stack.append(line)
+    dist[walk] = found
+    return dist
+
+
+def explore(base_cfg, ranges, addresses):
+    '''
+    Hits, misses and data cache cycles of every point of the grid described
+    by `ranges` (a list of (config key, values) pairs) on top of `base_cfg`,
+    for the load/store `addresses` of the functional run (see
+    Processor.mem_record). Returns one dict per point, in grid order
+    '''
+    for name, _ in ranges:
+        assert name in DCACHE_KEYS, f'{name} is not a data cache parameter; one of {list(DCACHE_KEYS)}'
+    names = [name for name, _ in ranges]
+    points = []
+    for values in itertools.product(*[v for _, v in ranges]):
+        params = dcache_params(dict(base_cfg, **dict(zip(names, values))))
+        assert params is not None, 'Every point needs a data cache (l1d_size > 0)'
+        points.append((values, params))
+
+    # the deepest stack needed per (line size, sets) of L1 and per (line size,
+    # L1 sets, L1 assoc, sets) of L2
+    depth1, depth2 = {}, {}
+    for _, (line, levels, _) in points:
+        _, sets1, assoc1, _ = levels[0]
+        depth1[line, sets1] = max(depth1.get((line, sets1), 0), assoc1)
+        if len(levels) > 1:
+            key = (line, sets1, assoc1, levels[1][1])
+            depth2[key] = max(depth2.get(key, 0), levels[1][2])
+
+    addrs = np.asarray(addresses, dtype=np.int64)
+    lines = {line: addrs // line for line, _ in depth1}
+    dist1 = {(line, sets): stack_distances(lines[line], sets, depth) for (line, sets), depth in depth1.items()}
+    dist2 = {}
+    for (line, sets1, assoc1, sets2), depth in depth2.items():
+        missed = lines[line][dist1[line, sets1] >= assoc1]
+        dist2[line, sets1, assoc1, sets2] = stack_distances(missed, sets2, depth)
+
+    rows = []
+    n = len(addrs)
+    for values, (line, levels, mem_latency) in points:
+        _, sets1, assoc1, _ = levels[0]
+        served = [n]            # accesses reaching every level, then memory
+        served.append(int(np.count_nonzero(dist1[line, sets1] >= assoc1)))
+        if len(levels) > 1:
+            _, sets2, assoc2, _ = levels[1]
+            served.append(int(np.count_nonzero(dist2[line, sets1, assoc1, sets2] >= assoc2)))
+        hits = [a - b for a, b in zip(served, served[1:])] + [served[-1]]
+        cycles = sum(h * latency for h, latency in zip(hits, access_latencies(levels, mem_latency)))
+        row = dict(zip(names, values))
+        row['accesses'] = n
+        row['l1d_misses'] = served[1]
+        row['l1d_hit_rate'] = 1 - served[1] / n if n else 0
+        row['l2_accesses'] = served[1] if len(levels) > 1 else 0
+        row['l2_misses'] = served[2] if len(levels) > 1 else 0
+        row['l2_hit_rate'] = 1 - served[2] / served[1] if len(levels) > 1 and served[1] else 0
+        row['memory_accesses'] = served[-1]
+        row['memory_cycles'] = cycles
+        row['amat'] = cycles / n if n else 0
+        rows.append(row)
+    return rows
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Evaluate many data cache geometries in one pass over the load/store addresses')
+    ap.add_argument('cfg_file', help='base config file')
+    ap.add_argument('input_file', help='input code')
+    ap.add_argument('-p', '--param', action='append', default=[], help='NAME=v1,v2,... or NAME=start:stop[:step]')
+    ap.add_argument('-o', '--output', default=None, help='also write the rows to this CSV file')
+    ap.add_argument('--trace', default=None, help='read the addresses from a trace captured by exec_trace.py')
+    args = ap.parse_args()
+
+    assert os.path.exists(args.cfg_file)
+    assert os.path.exists(args.input_file)
+    parser = Parser(args.input_file)
+    begin = time.perf_counter()
+    if args.trace is None:
+        func = Processor.from_config(None, parser)
+        func.mem_record = []
+        func.simulate_func(verbose=False)
+        addresses = func.mem_record
+    else:
+        with TraceReader(args.trace) as reader:
+            reader.check_program(parser)
+            addresses = reader.mem_addresses()
+    rows = explore(load_config(args.cfg_file), [parse_range(p) for p in args.param], addresses)
+    elapsed = time.perf_counter() - begin
+
+    names = [parse_range(p)[0] for p in args.param]
+    for row in rows:
+        values = ', '.join(f'{name}={row[name]}' for name in names)
+        l2 = f', L2 {row["l2_misses"]} misses ({row["l2_hit_rate"]:.2%} hits)' if row['l2_accesses'] else ''
+        print(f'{values}: L1D {row["l1d_misses"]} misses ({row["l1d_hit_rate"]:.2%} hits){l2}, '
+              f'memory_cycles={row["memory_cycles"]}, amat={row["amat"]:.3f}')
+    print(f'{len(rows)} configurations, {len(addresses)} loads and stores, {elapsed:.2f}s')
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=names + list(FIELDS))
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,352 @@
+'''
+Checkpoints of the processor state, to start many runs from the same point
+deep into a program
+
+    python checkpoint.py take path/to/input/code ckpt_prefix N [N ...] [--cfg cfg.json]
+    python checkpoint.py resume path/to/input/code ckpt cfg1.json [cfg2.json ...]
+
+`take` writes `ckpt_prefix.N.ckpt` after N committed instructions. Without a
+config, it fast-forwards functionally and saves the architectural state only:
+memory, registers, pc and branch-trace position. With `--cfg`, the program is
+also timed up to every checkpoint, which then holds the timing state of that
+config as well: fetch pc and cycle, per-component `available_cycles`,
+scoreboard, BTB entries and branch predictor state. The timing model stops at
+the last fetch group boundary before the checkpoint, so the checkpoint also
+keeps the outcomes of the branches in between, and resumed runs are timed
+exactly like uninterrupted ones. `resume` runs the rest of the program from a
+checkpoint under every config; a checkpoint holding timing state only resumes
+configs with the same component sizes, btb_entries and branch predictor, and
+no data cache (its lines are not saved; cold timing resumes with an empty one).
+
+File layout (little endian):
+    header:  magic (8s), version (u32), flags (u32), program digest (16s)
+    arch:    pc, num committed, num branches (q); registers; memory pages;
+             unaligned memory words
+    timing:  (FLAG_TIMING) fetch pc (q), fetch cycle, exec cycles (value),
+             timing committed (q); pending branch outcomes (u32 count, u8
+             each); BTB entries; branch predictor name and state
+             (version 2 on); scoreboard; components
+
+Registers, scoreboard entries and unaligned memory words are (name, value)
+lists; values are tagged: 'q' i64, 'f' f64, 'Q' arbitrary size int (the
+timing model's cycle counts can outgrow 64 bits). Memory pages are stored as
+raw float64 words followed by their presence bytes.
+'''
+
+import os, sys
+import struct
+from array import array
+
+from exec_trace import program_digest
+from memory import Page, PAGE_WORDS, WORD
+from parser import Parser
+from processor import Processor, load_config
+
+
+MAGIC = b'OOOCKPT\x00'
+VERSION = 2
+HEADER = struct.Struct('<8sII16s')
+FLAG_TIMING = 0x1
+
+I64 = struct.Struct('<q')
+U32 = struct.Struct('<I')
+F64 = struct.Struct('<d')
+BTB_ENTRY = struct.Struct('<BqqB')
+PAGE_BYTES = PAGE_WORDS * WORD
+LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+class Writer:
+    def __init__(self):
+        self.buf = bytearray()
+
+
+    def u32(self, v):
+        self.buf += U32.pack(v)
+
+
+    def i64(self, v):
+        self.buf += I64.pack(v)
+
+
+    def string(self, s):
+        data = s.encode()
+        self.u32(len(data))
+        self.buf += data
+
+
+    def value(self, v):
+        if type(v) is float:
+            self.buf += b'f' + F64.pack(v)
+        elif -2**63 <= v < 2**63:
+            self.buf += b'q' + I64.pack(v)
+        else:
+            data = v.to_bytes((v.bit_length() + 8) // 8, 'little', signed=True)
+            self.buf += b'Q'
+            self.u32(len(data))
+            self.buf += data
+
+
+    def named_values(self, items):
+        items = list(items)
+        self.u32(len(items))
+        for name, v in items:
+            self.string(name)
+            self.value(v)
+
+
+class Reader:
+    def __init__(self, data, offset=0):
+        self.data = memoryview(data)
+        self.offset = offset
+
+
+    def take(self, n):
+        chunk = self.data[self.offset:self.offset + n]
+        self.offset += n
+        return chunk
+
+
+    def u32(self):
+        return U32.unpack(self.take(U32.size))[0]
+
+
+    def i64(self):
+        return I64.unpack(self.take(I64.size))[0]
+
+
+    def string(self):
+        return bytes(self.take(self.u32())).decode()
+
+
+    def value(self):
+        tag = bytes(self.take(1))
+        if tag == b'f': return F64.unpack(self.take(F64.size))[0]
+        if tag == b'q': return self.i64()
+        assert tag == b'Q', f'Bad value tag: {tag}'
+        return int.from_bytes(self.take(self.u32()), 'little', signed=True)
+
+
+    def named_values(self):
+        return [(self.string(), self.value()) for _ in range(self.u32())]
+
+
+class Checkpoint:
+    '''
+    Architectural state of a processor, and optionally the state of its
+    timing model (`timing` is None otherwise)
+    '''
+    def __init__(self, digest, pc, num_committed, num_branches, regs, pages, other, timing=None):
+        self.digest = digest
+        self.pc = pc
+        self.num_committed = num_committed
+        self.num_branches = num_branches
+        self.regs = regs            # [(name, value)]
+        self.pages = pages          # {page number: (values bytes, present bytes)}
+        self.other = other          # [(address, value)] not in pages
+        self.timing = timing        # dict, see capture
+
+
+    @classmethod
+    def capture(cls, proc, timing=False):
+        '''
+        Checkpoint of `proc` (whose functional simulation is not running);
+        with `timing`, its timing model must have been run up to the same
+        point (see Processor.advance)
+        '''
+        pages = {num: (page.values.tobytes(), bytes(page.present)) for num, page in proc.mem.pages.items()}
+        ckpt = cls(program_digest(proc.parser), proc.pc, proc.num_committed, proc.num_branches,
+                   proc.rf.items(), pages, list(proc.mem.other.items()))
+        if timing:
+            assert proc.dcache is None, 'The data cache state is not checkpointed'
+            ckpt.timing = {
+                'pc': proc.timing_pc,
+                'cycle': proc.timing_cycle,
+                'exec_cycles': proc.timing_exec_cycles,
+                'committed': proc.timing_committed,
+                'pending': list(proc.pending_outcomes),
+                'btb': proc.branch_unit.entries(),
+                'predictor': (proc.branch_unit.predictor_name, proc.branch_unit.predictor.state()),
+                'scoreboard': [(proc.rf.names[reg], cycle) for reg, cycle in proc.scoreboard.items()],
+                'components': [(c.get_name(), list(c.available_cycles)) for c in proc.get_components()],
+            }
+        return ckpt
+
+
+    def restore(self, proc, arch=True):
+        '''
+        Puts `proc` in the checkpointed state. The timing model resumes at the
+        checkpoint with the saved timing state if there is one, or cold
+        otherwise. With `arch` False, only the timing side is restored (enough
+        for simulate_timing with the branch outcomes after the checkpoint)
+        '''
+        assert self.digest == program_digest(proc.parser), 'The checkpoint was taken on another program'
+        proc.pc, proc.num_committed, proc.num_branches = self.pc, self.num_committed, self.num_branches
+        if arch:
+            proc.rf.load(self.regs)
+            proc.mem.pages = {}
+            for num, (values, present) in self.pages.items():
+                page = proc.mem.pages[num] = Page()
+                page.values = array('d', values)
+                page.present = bytearray(present)
+            proc.mem.other = dict(self.other)
+
+        t = self.timing
+        if t is None or not hasattr(proc, 'rob'):
+            proc.timing_pc, proc.timing_cycle, proc.timing_exec_cycles = self.pc, 0, 0
+            proc.timing_committed = self.num_committed
+            proc.pending_outcomes = []
+            return
+
+        assert proc.dcache is None, 'The checkpoint timing state has no data cache state'
+        proc.timing_pc, proc.timing_cycle, proc.timing_exec_cycles = t['pc'], t['cycle'], t['exec_cycles']
+        proc.timing_committed = t['committed']
+        proc.pending_outcomes = list(t['pending'])
+        components = proc.get_components()
+        assert [(c.get_name(), c.get_size()) for c in components] == [(n, len(a)) for n, a in t['components']] \
+            and proc.branch_unit.num_entries == len(t['btb']) \
+            and proc.branch_unit.predictor_name == t['predictor'][0], \
+            'The checkpoint timing state is for other component sizes or another branch predictor'
+        for c, (_, available_cycles) in zip(components, t['components']):
+            c.available_cycles = list(available_cycles)     # already a heap
+        proc.scoreboard.reset(len(proc.parser.get_register_names()))
+        for reg, cycle in t['scoreboard']:
+            proc.scoreboard.sb[proc.rf.ids[reg]] = cycle
+        proc.branch_unit.load_entries(t['btb'])
+        proc.branch_unit.predictor.load_state(t['predictor'][1])
+
+
+    def write(self, path):
+        w = Writer()
+        w.buf += HEADER.pack(MAGIC, VERSION, FLAG_TIMING if self.timing is not None else 0, self.digest)
+        for v in (self.pc, self.num_committed, self.num_branches): w.i64(v)
+        w.named_values(self.regs)
+        w.u32(len(self.pages))
+        for num in sorted(self.pages):
+            values, present = self.pages[num]
+            if not LITTLE_ENDIAN:
+                values = array('d', values)
+                values.byteswap()
+                values = values.tobytes()
+            w.i64(num)
+            w.buf += values
+            w.buf += present
+        w.u32(len(self.other))
+        for addr, v in self.other:
+            w.value(addr)
+            w.value(v)
+
+        t = self.timing
+        if t is not None:
+            w.i64(t['pc'])
+            w.value(t['cycle'])
+            w.value(t['exec_cycles'])
+            w.i64(t['committed'])
+            w.u32(len(t['pending']))
+            w.buf += bytes(t['pending'])
+            w.u32(len(t['btb']))
+            for valid, pc, target, cnt in t['btb']:
+                w.buf += BTB_ENTRY.pack(valid, pc, target, cnt)
+            name, state = t['predictor']
+            w.string(name)
+            w.u32(len(state))
+            w.buf += state
+            w.named_values(t['scoreboard'])
+            w.u32(len(t['components']))
+            for name, available_cycles in t['components']:
+                w.string(name)
+                w.u32(len(available_cycles))
+                for v in available_cycles: w.value(v)
+
+        with open(path, 'wb') as f: f.write(w.buf)
+
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as f: data = f.read()
+        magic, version, flags, digest = HEADER.unpack_from(data)
+        assert magic == MAGIC, f'{path} is not a checkpoint'
+        assert version in (1, VERSION), f'{path}: unsupported checkpoint version {version}'
+        r = Reader(data, HEADER.size)
+        pc, num_committed, num_branches = r.i64(), r.i64(), r.i64()
+        regs = r.named_values()
+        pages = {}
+        for _ in range(r.u32()):
+            num = r.i64()
+            values = bytes(r.take(PAGE_BYTES))
+            if not LITTLE_ENDIAN:
+                a = array('d', values)
+                a.byteswap()
+                values = a.tobytes()
+            pages[num] = (values, bytes(r.take(PAGE_WORDS)))
+        other = [(r.value(), r.value()) for _ in range(r.u32())]
+        ckpt = cls(digest, pc, num_committed, num_branches, regs, pages, other)
+
+        if flags & FLAG_TIMING:
+            t = ckpt.timing = {'pc': r.i64(), 'cycle': r.value(), 'exec_cycles': r.value(), 'committed': r.i64()}
+            t['pending'] = [bool(b) for b in r.take(r.u32())]
+            t['btb'] = [BTB_ENTRY.unpack(r.take(BTB_ENTRY.size)) for _ in range(r.u32())]
+            t['btb'] = [(bool(valid), pc, target, cnt) for valid, pc, target, cnt in t['btb']]
+            t['predictor'] = (r.string(), bytes(r.take(r.u32()))) if version >= 2 else ('bimodal', b'')
+            t['scoreboard'] = r.named_values()
+            t['components'] = []
+            for _ in range(r.u32()):
+                name = r.string()
+                t['components'].append((name, [r.value() for _ in range(r.u32())]))
+        return ckpt
+
+
+def take(parser, counts, prefix, cfg=None):
+    '''
+    Writes a checkpoint after each of the committed instruction `counts`
+    (stopping early if the program ends) and returns their paths. With a
+    config, the program is timed along the way and the checkpoints hold the
+    timing state too
+    '''
+    proc = Processor.from_config(cfg, parser)
+    paths = []
+    for count in sorted(counts):
+        if cfg is None: proc.fast_forward(count)
+        else: proc.advance(count)
+        path = f'{prefix}.{count}.ckpt'
+        Checkpoint.capture(proc, timing=cfg is not None).write(path)
+        paths.append(path)
+        if proc.num_committed < count: break    # the program ended
+    return paths
+
+
+def resume(parser, ckpt, cfg):
+    '''
+    Runs the rest of the program from `ckpt` under `cfg`; returns the
+    processor
+    '''
+    proc = Processor.from_config(cfg, parser)
+    ckpt.restore(proc)
+    proc.simulate(verbose=False)
+    return proc
+
+
+if __name__ == '__main__':
+    usage = (f'Usage: {sys.argv[0]} take path/to/input/code ckpt_prefix N [N ...] [--cfg cfg.json]\n'
+             f'       {sys.argv[0]} resume path/to/input/code ckpt cfg1.json [cfg2.json ...]')
+    args = sys.argv[1:]
+    if len(args) < 4 or args[0] not in ['take', 'resume']:
+        print(usage)
+        exit(1)
+
+    assert os.path.exists(args[1])
+    parser = Parser(args[1])
+    if args[0] == 'take':
+        cfg = None
+        if '--cfg' in args:
+            i = args.index('--cfg')
+            cfg = load_config(args[i + 1])
+            args = args[:i] + args[i + 2:]
+        for path in take(parser, [int(n) for n in args[3:]], args[2], cfg):
+            print(f'checkpoint written to {path}')
+    else:
+        ckpt = Checkpoint.read(args[2])
+        for cfg_file in args[3:]:
+            proc = resume(parser, ckpt, load_config(cfg_file))
+            print(f'{cfg_file}: total_exec_cycles={proc.total_exec_cycles}, '
+                  f'committed_instrs={proc.num_committed - proc.timing_committed}')
@@ -0,0 +1,143 @@
+'''
+Set-associative LRU data caches feeding the latency of fld/fsd
+
+A config turns the data cache on with a positive l1d_size, and adds an L2
+behind it with a positive l2_size:
+
+    "dcache_line": 64,
+    "l1d_size": 32768, "l1d_assoc": 8, "l1d_latency": 1,
+    "l2_size": 262144, "l2_assoc": 8, "l2_latency": 10,
+    "mem_latency": 100
+
+Sizes are in bytes. An access touches the line of its byte address, which is
+looked up in L1, then on a miss in L2, then in memory. Its latency is the sum
+of the latencies of the levels it reaches: l1d_latency on an L1 hit, +
+l2_latency on an L2 hit, + mem_latency from memory. The line is filled into
+every level it missed in, evicting the least recently used line of the set.
+Stores allocate like loads, and write-backs are not timed. A level only sees
+the accesses that miss in the levels above it. These keys may be left out of
+the config file (see DCACHE_DEFAULTS); without a data cache (l1d_size 0), fld
+and fsd take cache_latency. Instruction fetch always takes cache_latency.
+
+The timing engines take the addresses from the functional run (see
+Processor.mem_record) in program order. cache_explore.py evaluates many
+geometries in one pass over the same address stream.
+'''
+
+from itertools import accumulate
+
+
+DCACHE_DEFAULTS = {
+    'dcache_line': 64,
+    'l1d_size': 0,
+    'l1d_assoc': 8,
+    'l1d_latency': 1,
+    'l2_size': 0,
+    'l2_assoc': 8,
+    'l2_latency': 10,
+    'mem_latency': 100,
+}
+DCACHE_KEYS = tuple(DCACHE_DEFAULTS)
+
+
+def dcache_params(cfg):
+    '''
+    (line size, [(level name, sets, assoc, latency)], memory latency) of the
+    data cache of a config, or None without one
+    '''
+    p = {k: cfg.get(k, v) for k, v in DCACHE_DEFAULTS.items()}
+    if not p['l1d_size']: return None
+    line = p['dcache_line']
+    assert line > 0, 'dcache_line must be positive'
+    levels = []
+    for name, prefix in (('L1D', 'l1d'), ('L2', 'l2')):
+        size, assoc = p[f'{prefix}_size'], p[f'{prefix}_assoc']
+        if not size: continue
+        assert assoc > 0 and size % (assoc * line) == 0, f'{prefix}_size must be a multiple of {prefix}_assoc * dcache_line'
+        levels.append((name, size // (assoc * line), assoc, p[f'{prefix}_latency']))
+    return line, levels, p['mem_latency']
+
+
+def access_latencies(levels, mem_latency):
+    '''
+    Latency of an access served by each of `levels` (as in dcache_params),
+    then by memory
+    '''
+    latencies = list(accumulate(latency for _, _, _, latency in levels))
+    return latencies + [latencies[-1] + mem_latency]
+
+
+class CacheLevel:
+    def __init__(self, name, num_sets, assoc, latency):
+        self.name = name
+        self.num_sets = num_sets
+        self.assoc = assoc
+        self.latency = latency
+        self.sets = [[] for _ in range(num_sets)]      # line numbers, least recently used first
+        self.accesses = 0
+        self.misses = 0
+
+
+    def access(self, line):
+        '''
+        Whether `line` hits; either way it becomes the most recently used
+        line of its set
+        '''
+        self.accesses += 1
+        ways = self.sets[line % self.num_sets]
+        if ways and ways[-1] == line: return True
+        if line in ways:
+            ways.remove(line)
+            ways.append(line)
+            return True
+        self.misses += 1
+        if len(ways) == self.assoc: del ways[0]
+        ways.append(line)
+        return False
+
+
+class DataCache:
+    def __init__(self, line_size, levels, mem_latency):
+        '''
+        `levels` are (name, sets, assoc, latency), L1 first
+        '''
+        self.line_size = line_size
+        self.levels = [CacheLevel(*level) for level in levels]
+        self.mem_latency = mem_latency
+        # latency of an access served by levels[i] (i == len(levels): memory)
+        self.latencies = access_latencies(levels, mem_latency)
+
+
+    @classmethod
+    def from_config(cls, cfg):
+        params = dcache_params(cfg)
+        return cls(*params) if params is not None else None
+
+
+    def lookup(self, addr):
+        '''
+        Index of the level serving `addr` (len(levels) for memory), after
+        filling the levels it missed in
+        '''
+        line = int(addr) // self.line_size
+        for i, level in enumerate(self.levels):
+            if level.access(line): return i
+        return len(self.levels)
+
+
+    def access(self, addr):
+        '''
+        Latency of an access to `addr`
+        '''
+        return self.latencies[self.lookup(addr)]
+
+
+    def stats(self):
+        return {level.name: {'sets': level.num_sets, 'assoc': level.assoc, 'accesses': level.accesses,
+                             'misses': level.misses,
+                             'hit_rate': 1 - level.misses / level.accesses if level.accesses else 0}
+                for level in self.levels}
+
+
+    def __repr__(self):
+        return ', '.join(f'{name}: {s["accesses"]} accesses, {s["misses"]} misses' for name, s in self.stats().items())
@@ -0,0 +1,357 @@
+'''
+Event-driven timing engine: the out-of-order core stage by stage, visiting
+only the cycles at which something can happen
+
+    python event_engine.py path/to/input/code cfg1.json [cfg2.json ...] [--physical-regs N]
+
+Instructions flow through
+    fetch:    NF instructions per cycle along the committed path; a taken
+              branch ends the fetch group and a mispredicted one (same
+              branch unit as the analytic model) stops fetch until it
+              executes. Fetched instructions reach the decode queue
+              cache_latency cycles later
+    decode:   the decode queue holds NI instructions, each decoded after the
+              decoder latency
+    rename/dispatch: NW instructions per cycle, in order, each taking a ROB
+              entry (ROB_RS), a reservation station entry of a unit of its
+              functional-unit pool (the unit with the most free entries, see
+              functional_units.py) and one of num_physical_regs rename
+              registers per destination; dispatch stops at the first that
+              does not fit
+    issue/execute: an instruction starts the cycle after its last source is
+              broadcast (wakeup), and no earlier than its dispatch, and takes
+              the unit latency (+ cache_latency for fld/fsd, or the data cache
+              latency of its address, looked up in fetch order)
+    writeback: NB results are broadcast per cycle, oldest first; the others
+              wait for a bus. The reservation station entry is freed then
+    commit:   NR instructions per cycle, in order, ROB_latency cycles after
+              they complete; the ROB entry and rename registers are freed then
+
+Executing instructions sit in a heap keyed by their completion cycle. After a
+cycle is processed, the next one visited is the earliest of the next
+completion, the next commit, the next decode and, while fetch or writeback
+are busy, the next cycle: long fdiv/memory stalls are jumped over in one step.
+
+The analytic model (Processor.run_instruction) schedules each instruction on
+its own when it is fetched and has none of the queue, ROB, width or bus
+limits, nor the wrong-path instructions and the rename blowup of its fetch
+groups. Both see the same branches in the same order, so the branch counts and
+mispredicts agree exactly; the CLI compares the cycles of both engines on the
+same program and configs.
+'''
+
+import argparse
+import heapq
+import os, sys
+from collections import deque
+
+from event_trace import *
+from instruction import *
+from metrics import *
+from pc_profile import *
+
+
+INF = float('inf')
+
+
+class Uop:
+    '''
+    An instruction in flight, from fetch to commit
+    '''
+    __slots__ = ('d', 'seq', 'pool', 'unit', 'latency', 'fetch', 'dispatch', 'ready', 'pending',
+                 'begin', 'done', 'waiters', 'rename_stall')
+
+    def __init__(self, d, seq, pool, latency, fetch):
+        self.d = d
+        self.seq = seq
+        self.pool = pool
+        self.unit = None                # unit it is dispatched to
+        self.latency = latency
+        self.fetch = fetch              # cycle it reaches the decode queue
+        self.dispatch = None
+        self.ready = 0                  # cycle its sources are all available
+        self.pending = 0                # sources not broadcast yet
+        self.begin = None               # cycle it starts executing
+        self.done = None                # cycle its result is broadcast (or it completes)
+        self.waiters = []               # instructions waiting for its result
+        self.rename_stall = None        # cycle it first found no free rename register
+
+
+class EventEngine:
+    def __init__(self, proc):
+        '''
+        Times `proc`'s program with its components' latencies and sizes, its
+        widths and its branch unit
+        '''
+        self.proc = proc
+        self.skip_idle = True           # False: visit every cycle (to check and measure the skipping)
+        # the units of all pools, the indices of every pool's units and the
+        # pool of every opcode
+        self.units = [u for pool in proc.pools for u in pool.units]
+        self.pool_units = []
+        for pool in proc.pools:
+            self.pool_units.append([self.units.index(u) for u in pool.units])
+        self.pool_of = [proc.pools.index(pool) for pool in proc.pool_of]
+        self.latency_of = [pool.latency + proc.access_latency[op] for op, pool in enumerate(proc.pool_of)]
+        assert all(lat > 0 for lat in self.latency_of), 'Unit latencies must be positive'
+        assert all(u.input_buffer_size > 0 for u in self.units + [proc.rob]), 'Reservation stations and ROB must have entries'
+
+
+    def run(self, pc, cycle, branch_iter, stats=None, events=None, addr_iter=None):
+        '''
+        Times the program from `pc`, fetching from `cycle` on with an empty
+        pipeline, with the branch outcomes of `branch_iter` (and the load/store
+        addresses of `addr_iter`, with a data cache). Counts into
+        `stats` (Metrics counters), the components and `proc`'s profile, if
+        any, emits EV_INSTR and EV_REDIRECT to `events`, and returns the cycle
+        of the last commit
+        '''
+        proc = self.proc
+        code = proc.parser.get_decoded()
+        num_code = len(code)
+        NF, NI, NW, NR, NB = proc.NF, proc.NI, proc.NW, proc.NR, proc.NB
+        pool_of, pool_units, latency_of, units = self.pool_of, self.pool_units, self.latency_of, self.units
+        cache_latency = proc.cache_latency
+        decode_latency = proc.decoder.latency
+        rob_latency, rob_size = proc.rob.latency, proc.rob.input_buffer_size
+        decoder, rob, reg_rename = proc.decoder, proc.rob, proc.reg_rename
+        free_regs = reg_rename.input_buffer_size
+        rs_free = [u.input_buffer_size for u in units]
+        bu = proc.branch_unit
+        dcache = proc.dcache
+        prof = proc.profile.counters if proc.profile is not None else None
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        producer = [None] * len(proc.parser.get_register_names())   # in-flight writer of every register
+        queue = deque()         # fetched, not dispatched yet
+        window = deque()        # the ROB: dispatched, not committed yet
+        executing = []          # (completion cycle, seq, uop)
+        finished = []           # (seq, uop) done executing, waiting for a bus
+        fetch_idx = pc // 4
+        blocked = None          # mispredicted branch fetch waits for
+        seq = 0
+        last_commit = cycle
+        num_groups = num_fetched = num_branches = mispredicts = penalty_cycles = 0
+        rename_stall_cycles = rename_stalled = raw_stall_cycles = raw_stalled = 0
+
+        def start(u):
+            nonlocal raw_stall_cycles, raw_stalled
+            begin = u.ready if u.ready > u.dispatch else u.dispatch
+            if begin > u.dispatch:
+                raw_stall_cycles += begin - u.dispatch
+                raw_stalled += 1
+            units[u.unit].record(begin - u.dispatch)
+            u.begin = begin
+            heappush(executing, (begin + u.latency, u.seq, u))
+
+        c = cycle
+        while True:
+            # complete
+            while executing and executing[0][0] <= c:
+                _, s, u = heappop(executing)
+                if u.d.dest_ids:
+                    heappush(finished, (s, u))
+                    continue
+                u.done = c
+                rs_free[u.unit] += 1
+                if u is blocked:
+                    penalty = c - (u.fetch - cache_latency) - 1
+                    penalty_cycles += penalty
+                    if prof is not None: prof[u.d.pc >> 2][PROF_MISPREDICT] += penalty
+                    blocked = None
+
+            # writeback
+            for _ in range(min(NB, len(finished))):
+                _, u = heappop(finished)
+                u.done = c
+                rs_free[u.unit] += 1
+                for w in u.waiters:
+                    if w.ready <= c: w.ready = c + 1
+                    w.pending -= 1
+                    if not w.pending: start(w)
+                u.waiters = None
+
+            # commit
+            n = 0
+            while window and n < NR:
+                u = window[0]
+                if u.done is None or u.done + rob_latency > c: break
+                window.popleft()
+                n += 1
+                rob.record(c - u.done - rob_latency)
+                d = u.d
+                if d.dest_ids:
+                    free_regs += len(d.dest_ids)
+                    reg_rename.timed_busy_cycles += len(d.dest_ids) * (c - u.dispatch)
+                    for reg in d.dest_ids:
+                        if producer[reg] is u: producer[reg] = None
+                if prof is not None:
+                    row = prof[d.pc >> 2]
+                    rename_wait = 0 if u.rename_stall is None else u.dispatch - u.rename_stall
+                    row[PROF_COUNT] += 1
+                    row[PROF_RENAME] += rename_wait
+                    row[PROF_RAW] += u.begin - u.dispatch
+                    row[PROF_DECODE] += u.dispatch - u.fetch - rename_wait
+                    row[PROF_EXECUTE] += u.done - u.begin
+                    row[PROF_RETIRE] += c - u.done
+                if events is not None: events.emit((EV_INSTR, d.pc, u.fetch, u.dispatch, u.done, c))
+                last_commit = c
+
+            # rename & dispatch
+            n = 0
+            width_bound = False
+            while queue:
+                if n == NW:
+                    width_bound = True
+                    break
+                u = queue[0]
+                if u.fetch + decode_latency > c or len(window) == rob_size: break
+                pool = pool_units[u.pool]
+                unit = pool[0] if len(pool) == 1 else max(pool, key=rs_free.__getitem__)
+                if not rs_free[unit]: break
+                d = u.d
+                if len(d.dest_ids) > free_regs:
+                    if u.rename_stall is None: u.rename_stall = c
+                    break
+                queue.popleft()
+                n += 1
+                decoder.record(c - u.fetch - decode_latency)
+                if u.rename_stall is not None:
+                    rename_stall_cycles += c - u.rename_stall
+                    rename_stalled += 1
+                if d.dest_ids:
+                    free_regs -= len(d.dest_ids)
+                    reg_rename.record(0 if u.rename_stall is None else c - u.rename_stall)
+                u.unit = unit
+                rs_free[unit] -= 1
+                window.append(u)
+                u.dispatch = c
+                for reg in d.src_ids:
+                    p = producer[reg]
+                    if p is None: continue
+                    if p.done is None:
+                        p.waiters.append(u)
+                        u.pending += 1
+                    elif p.done >= u.ready:
+                        u.ready = p.done + 1
+                for reg in d.dest_ids: producer[reg] = u
+                if not u.pending: start(u)
+
+            # fetch
+            if blocked is None and fetch_idx < num_code and len(queue) < NI:
+                group_pc = 4 * fetch_idx
+                n = 0
+                while n < NF and len(queue) < NI and fetch_idx < num_code:
+                    d = code[fetch_idx]
+                    op = d.opcode
+                    u = Uop(d, seq, pool_of[op], latency_of[op], c + cache_latency)
+                    if dcache is not None and op in (OP_FLD, OP_FSD):
+                        addr = next(addr_iter, None)
+                        assert addr is not None, 'Ran out of memory addresses'
+                        miss_cycles = dcache.access(addr) - proc.access_latency[op]
+                        u.latency += miss_cycles
+                        if prof is not None: prof[d.pc >> 2][PROF_DCACHE] += miss_cycles
+                    seq += 1
+                    queue.append(u)
+                    n += 1
+                    if op != OP_BNE:
+                        fetch_idx += 1
+                        continue
+                    taken = next(branch_iter, None)
+                    assert taken is not None, 'Ran out of branch outcomes'
+                    num_branches += 1
+                    next_pc = d.imm if taken else d.pc + 4
+                    predicted_taken = bu.is_taken(d.pc)
+                    mispredict = predicted_taken ^ taken
+                    if taken and predicted_taken and bu.get_target(d.pc) != next_pc: mispredict = True
+                    bu.update_btb(d.pc, next_pc, taken)
+                    fetch_idx = next_pc // 4
+                    if taken and events is not None: events.emit((EV_REDIRECT, group_pc, next_pc))
+                    if mispredict:
+                        mispredicts += 1
+                        blocked = u
+                        break
+                    if taken: break
+                num_groups += 1
+                num_fetched += n
+
+            # next cycle anything can happen at
+            nxt = executing[0][0] if executing else INF
+            if finished or width_bound or (blocked is None and fetch_idx < num_code and len(queue) < NI):
+                nxt = c + 1
+            elif queue and queue[0].fetch + decode_latency > c:
+                nxt = min(nxt, queue[0].fetch + decode_latency)
+            if window and window[0].done is not None:
+                nxt = min(nxt, max(window[0].done + rob_latency, c + 1))
+            if nxt == INF:
+                assert not queue and not window and fetch_idx >= num_code, 'Timing deadlock'
+                break
+            c = nxt if self.skip_idle else c + 1
+
+        proc.branch_idx += num_branches
+        if stats is not None:
+            stats[FETCH_GROUPS] = num_groups
+            stats[FETCHED_INSTRS] = num_fetched
+            stats[BRANCHES] = num_branches
+            stats[MISPREDICTS] = mispredicts
+            stats[MISPREDICT_PENALTY_CYCLES] = penalty_cycles
+            stats[RENAME_STALL_CYCLES] = rename_stall_cycles
+            stats[RENAME_STALLED_INSTRS] = rename_stalled
+            stats[RAW_STALL_CYCLES] = raw_stall_cycles
+            stats[RAW_STALLED_INSTRS] = raw_stalled
+        return last_commit
+
+
+def cross_validate(parser, cfgs):
+    '''
+    Times `parser`'s program under every config with both engines, sharing
+    one functional run; returns a row per config. The engines consume the
+    branch unit in the same order, so `branches_match` always holds;
+    `cycles_match` holds where the two models agree exactly (e.g. on the
+    fpchain kernel of workloads.py with enough physical registers)
+    '''
+    from processor import Processor
+    func = Processor.from_config(None, parser)
+    func.simulate_func(verbose=False)
+    rows = []
+    for cfg in cfgs:
+        row = {}
+        for engine in ('analytic', 'event'):
+            proc = Processor.from_config(cfg, parser, func.branch_record)
+            proc.engine = engine
+            proc.simulate_timing(verbose=False)
+            report = proc.metrics.report(proc)
+            row[engine] = {k: report[k] for k in ('total_cycles', 'branches', 'mispredicts')}
+            row[engine]['ipc'] = func.num_committed / report['total_cycles'] if report['total_cycles'] else 0
+        row['cycles_ratio'] = row['event']['total_cycles'] / max(row['analytic']['total_cycles'], 1)
+        row['branches_match'] = all(row['event'][k] == row['analytic'][k] for k in ('branches', 'mispredicts'))
+        row['cycles_match'] = row['event']['total_cycles'] == row['analytic']['total_cycles']
+        rows.append(row)
+    return rows
+
+
+if __name__ == '__main__':
+    from parser import Parser
+    from processor import load_config
+    ap = argparse.ArgumentParser(description='Cross-validate the event-driven timing engine against the analytic one')
+    ap.add_argument('input_file', help='path/to/input/code')
+    ap.add_argument('cfg_files', nargs='+', help='path/to/config/file')
+    ap.add_argument('--physical-regs', type=int, default=None, metavar='N',
+                    help='override num_physical_regs (e.g. to keep the analytic rename stalls out of the comparison)')
+    ap.add_argument('--exact', action='store_true', help='also fail unless the cycles agree exactly (e.g. on the fpchain kernel)')
+    args = ap.parse_args()
+
+    assert os.path.exists(args.input_file)
+    cfgs = [load_config(path) for path in args.cfg_files]
+    if args.physical_regs is not None:
+        cfgs = [dict(cfg, num_physical_regs=args.physical_regs) for cfg in cfgs]
+    rows = cross_validate(Parser(args.input_file), cfgs)
+    print(f'{"config":>16} {"analytic":>12} {"event":>12} {"ratio":>7} {"ipc a/e":>13} {"mispredicts a/e":>16}')
+    for path, row in zip(args.cfg_files, rows):
+        a, e = row['analytic'], row['event']
+        print(f'{os.path.basename(path):>16} {a["total_cycles"]:12d} {e["total_cycles"]:12d} {row["cycles_ratio"]:7.3f} '
+              f'{a["ipc"]:6.3f}/{e["ipc"]:<6.3f} {a["mispredicts"]:7d}/{e["mispredicts"]:<8d}' +
+              ('' if row['branches_match'] else '  BRANCH MISMATCH') +
+              ('  CYCLE MISMATCH' if args.exact and not row['cycles_match'] else ''))
+    # the branch counts always have to agree, the cycles with --exact
+    if not all(row['branches_match'] and (row['cycles_match'] or not args.exact) for row in rows): exit(1)
@@ -0,0 +1,170 @@
+'''
+Levelled event trace of a simulation run
+
+The simulator hands typed events to an EventTrace: plain tuples whose first
+item is the event kind and whose other items are the raw numbers of the event
+(see EVENT_FIELDS). Each kind belongs to a level and the simulator only builds
+the events of the levels the trace asks for. The events are buffered in the
+sink as they are and only formatted when the sink is flushed (text and JSONL
+files) or when they are read back (ring buffer). A silent run has no
+EventTrace at all and does no formatting work.
+
+Levels:
+    LEVEL_OFF:   nothing
+    LEVEL_INFO:  warnings and the end of the run
+    LEVEL_INSTR: + fetch/decode/execute/retire cycles of every timed
+                 instruction and fetch redirects
+    LEVEL_STATE: + every functional instruction, preceded by the processor
+                 state (the only event formatted when it is built, since the
+                 state changes right after)
+'''
+
+import json
+import sys
+from collections import deque
+
+
+LEVEL_OFF, LEVEL_INFO, LEVEL_INSTR, LEVEL_STATE = range(4)
+LEVEL_NAMES = ('off', 'info', 'instr', 'state')
+
+EV_INSTR, EV_REDIRECT, EV_WARN, EV_DONE, EV_FUNC, EV_STATE = range(6)
+EVENT_NAMES = ('instr', 'redirect', 'warn', 'done', 'func', 'state')
+EVENT_FIELDS = (
+    ('pc', 'fetch', 'decode', 'execute', 'retire'),     # EV_INSTR
+    ('pc', 'npc'),                                      # EV_REDIRECT: pc of the fetch group
+    ('pc', 'code', 'value'),                            # EV_WARN: WARN_* code and its value
+    ('total_exec_cycles',),                             # EV_DONE
+    ('pc',),                                            # EV_FUNC
+    ('state',),                                         # EV_STATE
+)
+
+WARN_UNINIT_LOAD = 0    # value: the address
+WARN_MESSAGES = ('addr:{} is not in memory... using 0 as the value',)
+
+
+def format_event(event, code=None):
+    '''
+    Text form of an event; `code` is the decoded instruction table, used to
+    show the instructions behind the pcs
+    '''
+    kind = event[0]
+    if kind == EV_INSTR:
+        pc, fetch, decode, execute, retire = event[1:]
+        instr = code[pc // 4].instr if code is not None else f'pc={pc}'
+        return f'{instr}: fetch={fetch}, decode={decode}, execute={execute}, retire={retire}'
+    if kind == EV_REDIRECT:
+        return f'Branch detected: pc:{event[1]}, npc:{event[2]}'
+    if kind == EV_WARN:
+        return '[Warn] ' + WARN_MESSAGES[event[2]].format(event[3])
+    if kind == EV_DONE:
+        return f'execution done. total_exec_cycles={event[1]}'
+    if kind == EV_FUNC:
+        return (code[event[1] // 4].instr if code is not None else f'pc={event[1]}') + '\n' + '-'*10
+    if kind == EV_STATE:
+        return event[1] + '\n' + '-'*10
+    assert False, f'Unknown event kind: {kind}'
+
+
+def event_dict(event):
+    return dict(zip(('event',) + EVENT_FIELDS[event[0]], (EVENT_NAMES[event[0]],) + event[1:]))
+
+
+class RingSink:
+    '''
+    Keeps the last `capacity` events in memory
+    '''
+    def __init__(self, capacity=65536):
+        self.events = deque(maxlen=capacity)
+        self.append = self.events.append
+        self.code = None
+
+
+    def flush(self):
+        pass
+
+
+    def close(self):
+        pass
+
+
+    def lines(self):
+        return [format_event(e, self.code) for e in self.events]
+
+
+class BufferedSink:
+    '''
+    Buffers events and writes them to a stream `buffer_events` at a time; the
+    subclasses format them
+    '''
+    def __init__(self, stream, buffer_events=4096, owned=False):
+        self.stream = stream
+        self.owned = owned
+        self.buffer_events = buffer_events
+        self.buf = []
+        self.code = None
+
+
+    def append(self, event):
+        self.buf.append(event)
+        if len(self.buf) >= self.buffer_events: self.flush()
+
+
+    def flush(self):
+        if self.buf:
+            self.stream.write(''.join(self.format(e) + '\n' for e in self.buf))
+            self.buf.clear()
+        self.stream.flush()
+
+
+    def close(self):
+        self.flush()
+        if self.owned: self.stream.close()
+
+
+class TextSink(BufferedSink):
+    '''
+    Human readable lines, on stdout by default
+    '''
+    def __init__(self, path=None, buffer_events=4096):
+        if path is None: super().__init__(sys.stdout, buffer_events)
+        else: super().__init__(open(path, 'w'), buffer_events, owned=True)
+
+
+    def format(self, event):
+        return format_event(event, self.code)
+
+
+class JsonlSink(BufferedSink):
+    '''
+    One JSON object per event, with the field names of EVENT_FIELDS
+    '''
+    def __init__(self, path, buffer_events=4096):
+        super().__init__(open(path, 'w'), buffer_events, owned=True)
+
+
+    def format(self, event):
+        return json.dumps(event_dict(event))
+
+
+class EventTrace:
+    def __init__(self, level, sink, code=None):
+        self.level = level
+        self.sink = sink
+        self.sink.code = code
+        self.emit = sink.append
+
+
+    def flush(self):
+        self.sink.flush()
+
+
+    def close(self):
+        self.sink.close()
+
+
+def open_sink(path=None):
+    '''
+    Sink for a CLI path: stdout when None, JSONL for *.jsonl, text otherwise
+    '''
+    if path is not None and path.endswith('.jsonl'): return JsonlSink(path)
+    return TextSink(path)
@@ -0,0 +1,174 @@
+'''
+Committed-instruction trace of a functional run, stored as fixed-width binary
+records so that the timing model can be replayed under many configs without
+running the functional simulator again
+
+    python exec_trace.py capture path/to/input/code path/to/trace
+    python exec_trace.py replay path/to/input/code path/to/trace cfg1.json [cfg2.json ...]
+
+File layout (little endian):
+    header: magic (8s), version (u32), record size (u32), num records (u64),
+            program digest (16s)
+    record: pc (u32), flags (u8), padding (3x), memory address (i64)
+'''
+
+import hashlib
+import mmap
+import os, sys
+import struct
+
+from parser import Parser
+from processor import Processor, load_config
+
+
+MAGIC = b'OOOTRACE'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQ16s')
+RECORD = struct.Struct('<IB3xq')
+
+FLAG_BRANCH = 0x1
+FLAG_TAKEN = 0x2
+FLAG_MEM = 0x4
+
+
+def program_digest(parser):
+    return hashlib.blake2b('\n'.join(parser.get_instructions()).encode(), digest_size=16).digest()
+
+
+class TraceWriter:
+    def __init__(self, path, digest, buffer_records=4096):
+        self.f = open(path, 'wb')
+        self.digest = digest
+        self.num_records = 0
+        self.buf = bytearray()
+        self.buffer_bytes = buffer_records * RECORD.size
+        self.f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0, digest))
+
+
+    def record(self, pc, flags=0, addr=0):
+        self.buf += RECORD.pack(pc, flags, addr)
+        self.num_records += 1
+        if len(self.buf) >= self.buffer_bytes:
+            self.f.write(self.buf)
+            self.buf.clear()
+
+
+    def record_branch(self, pc, taken):
+        self.record(pc, (FLAG_BRANCH | FLAG_TAKEN) if taken else FLAG_BRANCH)
+
+
+    def record_mem(self, pc, addr):
+        self.record(pc, FLAG_MEM, int(addr))
+
+
+    def close(self):
+        self.f.write(self.buf)
+        self.buf.clear()
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.num_records, self.digest))
+        self.f.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+    def __init__(self, path):
+        self.f = open(path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, self.num_records, self.digest = HEADER.unpack_from(self.mm, 0)
+        assert magic == MAGIC, f'{path} is not a trace file'
+        assert version == VERSION and record_size == RECORD.size, f'Unsupported trace version:{version}'
+        assert len(self.mm) == HEADER.size + self.num_records * RECORD.size, f'{path} is truncated'
+
+
+    def check_program(self, parser):
+        assert self.digest == program_digest(parser), 'The trace was captured from a different program'
+
+
+    def records(self):
+        '''
+        Yields (pc, flags, addr) for every committed instruction
+        '''
+        return RECORD.iter_unpack(memoryview(self.mm)[HEADER.size:])
+
+
+    def branch_outcomes(self):
+        '''
+        Yields the outcome of every committed branch, reading the flag bytes
+        straight from the mapped file
+        '''
+        flags = memoryview(self.mm)[HEADER.size + 4::RECORD.size]
+        return ((f & FLAG_TAKEN) != 0 for f in flags if f & FLAG_BRANCH)
+
+
+    def mem_addresses(self):
+        '''
+        The addresses of the committed loads and stores, in order, as a list
+        (see Processor.mem_record)
+        '''
+        import numpy as np
+        dtype = np.dtype([('pc', '<u4'), ('flags', 'u1'), ('pad', 'V3'), ('addr', '<i8')])     # RECORD
+        records = np.frombuffer(self.mm, dtype=dtype, count=self.num_records, offset=HEADER.size)
+        return records['addr'][(records['flags'] & FLAG_MEM) != 0].tolist()
+
+
+    def close(self):
+        self.mm.close()
+        self.f.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def capture(parser, trace_file):
+    '''
+    Runs the functional simulation of `parser`'s program once and writes its
+    committed instruction stream to `trace_file`
+    '''
+    proc = Processor.from_config(None, parser)
+    with TraceWriter(trace_file, program_digest(parser)) as writer:
+        proc.simulate_func(verbose=False, trace_writer=writer)
+    return proc
+
+
+def replay(parser, trace_file, cfg):
+    '''
+    Times `parser`'s program under `cfg` with the branch outcomes of a captured
+    trace. Returns the processor, whose functional state is left untouched
+    '''
+    with TraceReader(trace_file) as reader:
+        reader.check_program(parser)
+        proc = Processor.from_config(cfg, parser)
+        proc.num_committed = reader.num_records
+        addresses = reader.mem_addresses() if proc.dcache is not None else None
+        proc.simulate_timing(verbose=False, branch_outcomes=reader.branch_outcomes(), mem_addresses=addresses)
+    return proc
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if len(args) < 3 or args[0] not in ['capture', 'replay'] or (args[0] == 'capture') != (len(args) == 3):
+        print(f'Usage: {sys.argv[0]} capture path/to/input/code path/to/trace')
+        print(f'       {sys.argv[0]} replay path/to/input/code path/to/trace cfg1.json [cfg2.json ...]')
+        exit(1)
+
+    assert os.path.exists(args[1])
+    parser = Parser(args[1])
+    if args[0] == 'capture':
+        proc = capture(parser, args[2])
+        print(f'{proc.num_committed} committed instructions written to {args[2]}')
+    else:
+        for cfg_file in args[3:]:
+            proc = replay(parser, args[2], load_config(cfg_file))
+            print(f'{cfg_file}: total_exec_cycles={proc.total_exec_cycles}, committed_instrs={proc.num_committed}')
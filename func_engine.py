@@ -0,0 +1,270 @@
+'''
+Compiled functional engine: every static instruction is turned once into a
+specialised handler with its registers and immediates already resolved, and
+the main loop just dispatches through the handler table
+
+Two modes are supported:
+    'closure': one Python closure per instruction
+    'block':   instructions start out on their closures; once control has
+               reached an instruction HOT_BLOCK times, the straight-line run
+               from it up to (and including) the next branch is generated as
+               one Python function keeping the registers in local variables.
+               A block whose branch jumps back to its own start loops inside
+               the function, up to MAX_BLOCK_ITERS iterations per call
+
+Handlers return the index of the next instruction (blocks also return how many
+instructions they executed) and branches append their outcome to the engine's
+outcome list, which the main loop hands out in order (and call `branch_hook`
+with their pc and outcome, if given). Loads and stores pass their address to
+`mem_hook`, if given. A run can stop after a given number of
+instructions; blocks that could run past it are left to the closures.
+'''
+
+import sys
+from instruction import *
+from memory import Memory, PAGE_SHIFT, SLOT_MASK, WORD
+
+
+HOT_BLOCK = 8
+MAX_BLOCK_ITERS = 1024
+
+
+class FuncEngine:
+    def __init__(self, decoded, rf, mem, mode='block', trace_writer=None, start=0, branch_hook=None, mem_hook=None):
+        '''
+        `decoded` is the decoded instruction table, `rf` the register values
+        indexed by register id (RegisterFile.values) and `mem` the Memory (or a
+        plain dict), both read and updated in place. Execution starts at
+        instruction index `start`
+        '''
+        assert mode in ['closure', 'block'], f'Unknown functional engine mode: {mode}'
+        self.decoded = decoded
+        self.rf = rf
+        self.mem = mem
+        self.mode = mode
+        self.trace_writer = trace_writer
+        self.branch_hook = branch_hook
+        self.mem_hook = mem_hook
+        self.idx = start
+        self.num_committed = 0
+        self.num_branches = 0
+        self.outcomes = []
+
+        self.closures = [self.make_closure(d) for d in decoded]
+        self.blocks = [None] * len(decoded)
+        self.spans = [0] * len(decoded)     # most instructions one call of a block runs
+        self.heat = [0] * len(decoded)
+
+
+    def make_closure(self, d):
+        rf, mem, taken = self.rf, self.mem, self.outcomes.append
+        op, rd, rs1, rs2, imm, nxt = d.opcode, d.rd_id, d.rs1_id, d.rs2_id, d.imm, d.pc // 4 + 1
+        pc, trace, mem_hook = d.pc, self.trace_writer, self.mem_hook
+
+        if op == OP_FLD:
+            if trace or mem_hook:
+                def h():
+                    a = imm + rf[rs1]
+                    rf[rd] = mem.get(a, 0)
+                    if trace: trace.record_mem(pc, a)
+                    if mem_hook: mem_hook(a)
+                    return nxt
+                return h
+            def h():
+                rf[rd] = mem.get(imm + rf[rs1], 0)
+                return nxt
+            return h
+
+        if op == OP_FSD:
+            if trace or mem_hook:
+                def h():
+                    a = imm + rf[rs1]
+                    mem[a] = rf[rs2]
+                    if trace: trace.record_mem(pc, a)
+                    if mem_hook: mem_hook(a)
+                    return nxt
+                return h
+            def h():
+                mem[imm + rf[rs1]] = rf[rs2]
+                return nxt
+            return h
+
+        if op == OP_BNE:
+            target = imm // 4
+            hook = self.branch_hook
+            if trace or hook:
+                def h():
+                    t = rf[rs1] != rf[rs2]
+                    taken(t)
+                    if trace: trace.record_branch(pc, t)
+                    if hook: hook(pc, t)
+                    return target if t else nxt
+                return h
+            def h():
+                if rf[rs1] != rf[rs2]:
+                    taken(True)
+                    return target
+                taken(False)
+                return nxt
+            return h
+
+        if op in (OP_ADD, OP_FADD):
+            def h():
+                rf[rd] = rf[rs1] + rf[rs2]
+                return nxt
+        elif op == OP_ADDI:
+            def h():
+                rf[rd] = rf[rs1] + imm
+                return nxt
+        elif op == OP_SLT:
+            def h():
+                rf[rd] = 1 if rf[rs1] < rf[rs2] else 0
+                return nxt
+        elif op == OP_FSUB:
+            def h():
+                rf[rd] = rf[rs1] - rf[rs2]
+                return nxt
+        elif op == OP_FMUL:
+            def h():
+                rf[rd] = rf[rs1] * rf[rs2]
+                return nxt
+        elif op == OP_FDIV:
+            def h():
+                rf[rd] = rf[rs1] / rf[rs2]
+                return nxt
+        else:
+            assert False, f'Unknown operator: {d.operator}'
+
+        if not trace: return h
+        def traced():
+            n = h()
+            trace.record(pc)
+            return n
+        return traced
+
+
+    def block_source(self, begin, end):
+        '''
+        Source of the function executing instructions [begin, end), where only
+        the last one may be a branch
+        '''
+        instrs = self.decoded[begin:end]
+        regs = sorted({r for d in instrs for r in (d.rd_id, d.rs1_id, d.rs2_id) if r is not None})
+        local = {r: f'r{i}' for i, r in enumerate(regs)}
+        written = sorted({local[d.rd_id] for d in instrs if d.rd_id is not None})
+        traced = self.trace_writer is not None
+
+        body = []
+        for d in instrs:
+            op, imm = d.opcode, d.imm
+            rd, rs1, rs2 = local.get(d.rd_id), local.get(d.rs1_id), local.get(d.rs2_id)
+            if op == OP_FLD: body += [f'a = {imm} + {rs1}'] + self.load_source(rd)
+            elif op == OP_FSD: body += [f'a = {imm} + {rs1}'] + self.store_source(rs2)
+            elif op in (OP_ADD, OP_FADD): body.append(f'{rd} = {rs1} + {rs2}')
+            elif op == OP_ADDI: body.append(f'{rd} = {rs1} + {imm}')
+            elif op == OP_SLT: body.append(f'{rd} = 1 if {rs1} < {rs2} else 0')
+            elif op == OP_FSUB: body.append(f'{rd} = {rs1} - {rs2}')
+            elif op == OP_FMUL: body.append(f'{rd} = {rs1} * {rs2}')
+            elif op == OP_FDIV: body.append(f'{rd} = {rs1} / {rs2}')
+            elif op == OP_BNE:
+                body.append(f't = {rs1} != {rs2}')
+                if self.branch_hook: body.append(f'branch_hook({d.pc}, t)')
+            else: assert False, f'Unknown operator: {d.operator}'
+            if self.mem_hook and op in (OP_FLD, OP_FSD): body.append('mem_hook(a)')
+            if traced:
+                if op in (OP_FLD, OP_FSD): body.append(f'record_mem({d.pc}, a)')
+                elif op == OP_BNE: body.append(f'record_branch({d.pc}, t)')
+                else: body.append(f'record({d.pc})')
+
+        writeback = [f'rf[{r}] = {local[r]}' for r in regs if local[r] in written]
+        src = ['def block():', '    ' + '; '.join(f'{local[r]} = rf[{r}]' for r in regs) if regs else '    pass']
+        length = end - begin
+        last = instrs[-1]
+        if last.opcode != OP_BNE:
+            src += [f'    {line}' for line in body + writeback] + [f'    return {end}, {length}']
+            return '\n'.join(src) + '\n'
+
+        target = last.imm // 4
+        src.append('    n = 0')
+        src.append('    while True:')
+        src += [f'        {line}' for line in body]
+        src.append('        taken(t)')
+        src.append('        n += 1')
+        if target == begin:
+            src.append(f'        if t and n < {MAX_BLOCK_ITERS}: continue')
+        src += [f'        {line}' for line in writeback]
+        src.append(f'        return ({target} if t else {end}), n * {length}')
+        return '\n'.join(src) + '\n'
+
+
+    def load_source(self, rd):
+        if not isinstance(self.mem, Memory): return [f'{rd} = mem_get(a, 0)']
+        # Memory.get, inlined for the word addresses
+        return [f'if type(a) is int and a >= 0 and not a & {WORD - 1} and (pg := pages_get(a >> {PAGE_SHIFT})) is not None:',
+                f'    s = (a >> 3) & {SLOT_MASK}',
+                f'    {rd} = pg.values[s] if pg.present[s] else 0',
+                f'else:',
+                f'    {rd} = mem_get(a, 0)']
+
+
+    def store_source(self, rs):
+        if not isinstance(self.mem, Memory): return [f'mem[a] = {rs}']
+        return [f'if type(a) is int and a >= 0 and not a & {WORD - 1} and (pg := pages_get(a >> {PAGE_SHIFT})) is not None:',
+                f'    s = (a >> 3) & {SLOT_MASK}',
+                f'    pg.values[s] = {rs}',
+                f'    pg.present[s] = 1',
+                f'else:',
+                f'    mem[a] = {rs}']
+
+
+    def compile_block(self, idx):
+        end = idx
+        while end < len(self.decoded) and self.decoded[end].opcode != OP_BNE:
+            end += 1
+        end = min(end + 1, len(self.decoded))
+        env = {'rf': self.rf, 'mem': self.mem, 'mem_get': self.mem.get, 'taken': self.outcomes.append}
+        if isinstance(self.mem, Memory): env['pages_get'] = self.mem.pages.get
+        if self.branch_hook: env['branch_hook'] = self.branch_hook
+        if self.mem_hook: env['mem_hook'] = self.mem_hook
+        if self.trace_writer:
+            env.update(record=self.trace_writer.record, record_mem=self.trace_writer.record_mem,
+                       record_branch=self.trace_writer.record_branch)
+        exec(compile(self.block_source(idx, end), f'<block {idx}:{end}>', 'exec'), env)
+        self.blocks[idx] = env['block']
+        last = self.decoded[end - 1]
+        self.spans[idx] = (end - idx) * (MAX_BLOCK_ITERS if last.opcode == OP_BNE and last.imm // 4 == idx else 1)
+        return self.blocks[idx]
+
+
+    def run(self, limit=None):
+        '''
+        Generator running the program from the current instruction, for at
+        most `limit` more instructions; yields the outcome of each branch in
+        order as soon as it executes
+        '''
+        closures, blocks, spans, heat, outcomes = self.closures, self.blocks, self.spans, self.heat, self.outcomes
+        use_blocks = self.mode == 'block'
+        num_instrs = len(closures)
+        idx = self.idx
+        count = self.num_committed
+        end = sys.maxsize if limit is None else count + limit
+        while idx < num_instrs and count < end:
+            block = blocks[idx]
+            if block is None and use_blocks:
+                heat[idx] += 1
+                if heat[idx] >= HOT_BLOCK: block = self.compile_block(idx)
+            if block is not None and count + spans[idx] > end: block = None
+
+            if block is None:
+                idx = closures[idx]()
+                count += 1
+            else:
+                idx, n = block()
+                count += n
+
+            if outcomes:
+                self.idx, self.num_committed = idx, count
+                self.num_branches += len(outcomes)
+                yield from outcomes
+                outcomes.clear()
+        self.idx, self.num_committed = idx, count
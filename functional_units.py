@@ -0,0 +1,129 @@
+'''
+Functional-unit pools of the timing model
+
+A config describes its execution units as pools. A pool has `count`
+identical units, each with its own reservation station of `RS` entries and
+the pool's `latency`, and serves the opcodes listed in `ops`:
+
+    "units": [
+        {"name": "INT", "count": 4, "latency": 1, "RS": 4, "ops": ["add", "addi", "slt"]},
+        {"name": "MEM", "count": 2, "latency": 1, "RS": 4, "ops": ["fld", "fsd"]},
+        {"name": "FP", "count": 2, "latency": 4, "RS": 3, "ops": ["fadd", "fsub", "fmul"]},
+        {"name": "FPdiv", "ops": ["fdiv"]},
+        {"name": "BU", "ops": ["bne"]}
+    ]
+
+Every opcode is served by exactly one pool. `count` defaults to 1, and a
+pool without `latency` or `RS` takes the <name>_latency and <name>_RS keys
+of the config, so sweeps over those keys keep working. A config without
+"units" has one unit per class of DEFAULT_POOLS, the machine of
+config1.json.
+
+The timing engines compile the pools into a dispatch table indexed by opcode
+(Processor.pool_of) and send an instruction to the unit of its pool whose
+reservation station frees up first. The units of a pool are the components
+<name>[0], <name>[1], ...; a pool of one unit is the component <name>.
+'''
+
+from instruction import OPCODES, OPCODE_IDS
+from pipelined_component import PComponent
+
+
+DEFAULT_POOLS = (
+    ('INT', ('add', 'addi', 'slt')),
+    ('LD', ('fld',)),
+    ('ST', ('fsd',)),
+    ('FPadd', ('fadd', 'fsub')),
+    ('FPmult', ('fmul',)),
+    ('FPdiv', ('fdiv',)),
+    ('BU', ('bne',)),
+)
+POOL_KEYS = {'name', 'count', 'latency', 'RS', 'ops'}
+
+
+def pool_specs(cfg):
+    '''
+    (name, count, latency, RS size, opcodes) of every pool of config `cfg`
+    '''
+    units = cfg.get('units') or [{'name': name, 'ops': ops} for name, ops in DEFAULT_POOLS]
+    specs = []
+    served = {}
+    for spec in units:
+        unknown = sorted(set(spec) - POOL_KEYS)
+        assert not unknown, f'Unknown functional-unit pool parameters: {unknown}'
+        name = spec['name']
+        assert name not in (s[0] for s in specs), f'Pool {name} defined twice'
+        count = spec.get('count', 1)
+        latency = spec.get('latency', cfg.get(f'{name}_latency'))
+        rs = spec.get('RS', cfg.get(f'{name}_RS'))
+        assert latency is not None and rs is not None, f'Pool {name} needs a latency and an RS size'
+        assert count >= 1, f'Pool {name} needs at least one unit'
+        opcodes = []
+        for op in spec['ops']:
+            assert op in OPCODE_IDS, f'Unknown opcode {op} in pool {name}'
+            assert op not in served, f'{op} is served by pools {served[op]} and {name}'
+            served[op] = name
+            opcodes.append(OPCODE_IDS[op])
+        specs.append((name, count, latency, rs, tuple(opcodes)))
+    missing = [op for op in OPCODES if op not in served]
+    assert not missing, f'No functional-unit pool serves {missing}'
+    return specs
+
+
+def unit_names(name, count):
+    return [name] if count == 1 else [f'{name}[{i}]' for i in range(count)]
+
+
+def pool_latency(cfg, opcode):
+    '''
+    Latency of the pool of `cfg` that serves `opcode`
+    '''
+    return next(latency for _, _, latency, _, opcodes in pool_specs(cfg) if opcode in opcodes)
+
+
+class UnitPool:
+    def __init__(self, name, units, opcodes):
+        self.name = name
+        self.units = units
+        self.opcodes = opcodes
+        self.latency = units[0].latency
+
+
+    def get_name(self):
+        return self.name
+
+
+    def get_latency(self):
+        return self.latency
+
+
+    def pick(self):
+        '''
+        The unit whose reservation station frees up first; the first such
+        unit on a tie
+        '''
+        units = self.units
+        if len(units) == 1: return units[0]
+        return min(units, key=lambda u: u.available_cycles[0])
+
+
+def build_pools(cfg, old=()):
+    '''
+    The UnitPools of `cfg` and the dispatch table (the pool of every opcode).
+    Units of the pools `old` (after a reset) are cleared and reused where
+    the names match
+    '''
+    spare = {u.get_name(): u for pool in old for u in pool.units}
+    pools = []
+    pool_of = [None] * len(OPCODES)
+    for name, count, latency, rs, opcodes in pool_specs(cfg):
+        units = []
+        for unit_name in unit_names(name, count):
+            unit = spare.pop(unit_name, None)
+            if unit is None: unit = PComponent(unit_name, latency, rs)
+            else: unit.reset(latency, rs)
+            units.append(unit)
+        pool = UnitPool(name, units, opcodes)
+        pools.append(pool)
+        for op in opcodes: pool_of[op] = pool
+    return pools, pool_of
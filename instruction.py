@@ -3,9 +3,18 @@ An individual instruction along with its status in the processor pipeline
 '''
 
 import re
+import sys
 from enum import Enum
 
 
+OPCODES = ('fld', 'fsd', 'add', 'addi', 'slt', 'fadd', 'fsub', 'fmul', 'fdiv', 'bne')
+OP_FLD, OP_FSD, OP_ADD, OP_ADDI, OP_SLT, OP_FADD, OP_FSUB, OP_FMUL, OP_FDIV, OP_BNE = range(len(OPCODES))
+OPCODE_IDS = {name: i for i, name in enumerate(OPCODES)}
+
+ZERO_REGS = ('R0', '$0')        # hard-wired to zero
+REG_SINK = 0                    # register id the writes to a zero register go to
+
+
 class Instruction:
     class OperandType(Enum):
         Register = 0
@@ -37,6 +46,29 @@ class Instruction:
         self.retire_cycle = -1
 
 
+    @classmethod
+    def from_decoded(cls, decoded):
+        '''
+        Builds an instruction from its pre-decoded static form without parsing
+        the instruction string again
+        '''
+        instr = cls.__new__(cls)
+        instr.pc = decoded.pc
+        instr.instr = decoded.instr
+        instr.operator = decoded.operator
+        instr.operands = decoded.operands
+        instr.operand_types = decoded.operand_types
+        instr.operand_flows = decoded.operand_flows
+        instr.src_regs = decoded.src_regs
+        instr.dest_regs = decoded.dest_regs
+        instr.curr_cycle = -1
+        instr.fetch_cycle = -1
+        instr.decode_cycle = -1
+        instr.execute_cycle = -1
+        instr.retire_cycle = -1
+        return instr
+
+
     def set_fetch_cycle(self, cycle):
         self.fetch_cycle = cycle
         self.curr_cycle = cycle
@@ -82,7 +114,7 @@ class Instruction:
 
     def get_operator(self):
         operator = self.instr.split()[0]
-        assert operator in ['fld', 'fsd', 'add', 'addi', 'slt', 'fadd', 'fsub', 'fmul', 'fdiv', 'bne']
+        assert operator in OPCODE_IDS
         return operator
 
 
@@ -215,6 +247,132 @@ class Instruction:
         return f'pc={self.pc}, operator={self.operator}, operands={self.operands}, operand_types={self.operand_types}, operand_flows={self.operand_flows}, src_regs={self.src_regs}, dest_regs={self.dest_regs}'
 
 
+class DecodedInstruction:
+    '''
+    Static instruction decoded once per program. `rd`, `rs1` and `rs2` are the
+    interned register names (None when unused) and `imm` holds the immediate,
+    the memory offset, or the branch target:
+
+        fld rd, imm(rs1)        fsd rs2, imm(rs1)
+        op  rd, rs1, rs2        addi rd, rs1, imm       bne rs1, rs2, imm
+
+    The `*_id` fields are the integer ids of the same registers, set by
+    number_registers when the instruction becomes part of a program; the
+    functional pass uses rd_id/rs1_id/rs2_id and the timing model
+    src_ids/dest_ids
+    '''
+    __slots__ = ('pc', 'instr', 'opcode', 'operator', 'operands', 'operand_types', 'operand_flows',
+                 'src_regs', 'dest_regs', 'rd', 'rs1', 'rs2', 'imm',
+                 'src_ids', 'dest_ids', 'rd_id', 'rs1_id', 'rs2_id')
+
+
+    def __init__(self, pc, instr):
+        parsed = Instruction(pc, instr)
+        operands = parsed.operands
+        self.pc = pc
+        self.instr = instr
+        self.opcode = OPCODE_IDS[parsed.operator]
+        self.operator = parsed.operator
+        self.operands = operands
+        self.operand_types = parsed.operand_types
+        self.operand_flows = parsed.operand_flows
+        self.src_regs = [sys.intern(r) for r in parsed.src_regs]
+        self.dest_regs = [sys.intern(r) for r in parsed.dest_regs]
+        self.rd = self.rs1 = self.rs2 = None
+        self.rd_id = self.rs1_id = self.rs2_id = self.src_ids = self.dest_ids = None
+        self.imm = 0
+
+        if self.opcode in (OP_FLD, OP_FSD):
+            m = re.search(r'(\d+)\((.*)\)', operands[1])
+            assert m
+            self.imm = int(m.group(1))
+            self.rs1 = sys.intern(m.group(2))
+            if self.opcode == OP_FLD: self.rd = sys.intern(operands[0])
+            else: self.rs2 = sys.intern(operands[0])
+
+        elif self.opcode == OP_ADDI:
+            self.rd = sys.intern(operands[0])
+            self.rs1 = sys.intern(operands[1])
+            self.imm = int(operands[2])
+
+        elif self.opcode == OP_BNE:
+            self.rs1 = sys.intern(operands[0])
+            self.rs2 = sys.intern(operands[1])
+            self.imm = int(operands[2])
+
+        else:
+            self.rd = sys.intern(operands[0])
+            self.rs1 = sys.intern(operands[1])
+            self.rs2 = sys.intern(operands[2])
+
+
+    @classmethod
+    def from_fields(cls, pc, instr, opcode, operands, src_regs, dest_regs, rd, rs1, rs2, imm):
+        '''
+        Builds a decoded instruction from fields decoded elsewhere (the
+        assembler or its cache); operand types and flows follow from the opcode
+        '''
+        decoded = cls.__new__(cls)
+        decoded.pc = pc
+        decoded.instr = instr
+        decoded.opcode = opcode
+        decoded.operator = OPCODES[opcode]
+        decoded.operands = operands
+        decoded.operand_types = OPERAND_TYPES[opcode]
+        decoded.operand_flows = OPERAND_FLOWS[opcode]
+        decoded.src_regs = src_regs
+        decoded.dest_regs = dest_regs
+        decoded.rd, decoded.rs1, decoded.rs2, decoded.imm = rd, rs1, rs2, imm
+        decoded.rd_id = decoded.rs1_id = decoded.rs2_id = decoded.src_ids = decoded.dest_ids = None
+        return decoded
+
+
+    def __repr__(self):
+        return f'pc={self.pc}, opcode={self.opcode}, operator={self.operator}, rd={self.rd}, rs1={self.rs1}, rs2={self.rs2}, imm={self.imm}, src_regs={self.src_regs}, dest_regs={self.dest_regs}'
+
+
+# operand types and flows of every opcode, as Instruction.set_operand_flows checks them
+_REG, _MEM, _IMM = Instruction.OperandType
+_SRC, _DEST, _IMM_FLOW = Instruction.OperandFlow
+_OPERANDS = {                  # types, flows
+    OP_FLD:  ([_REG, _MEM], [_DEST, _SRC]),
+    OP_FSD:  ([_REG, _MEM], [_SRC, _DEST]),
+    OP_ADDI: ([_REG, _REG, _IMM], [_DEST, _SRC, _IMM_FLOW]),
+    OP_BNE:  ([_REG, _REG, _IMM], [_SRC, _SRC, _IMM_FLOW]),
+}
+_REG3 = ([_REG, _REG, _REG], [_DEST, _SRC, _SRC])
+OPERAND_TYPES = tuple(_OPERANDS.get(op, _REG3)[0] for op in range(len(OPCODES)))
+OPERAND_FLOWS = tuple(_OPERANDS.get(op, _REG3)[1] for op in range(len(OPCODES)))
+
+
+def number_registers(decoded):
+    '''
+    Interns the registers of a decoded program to small integer ids, in order
+    of first appearance as rd, rs1 or rs2, and sets the `*_id` fields of every
+    instruction; returns the register names indexed by id. Id 0 (REG_SINK) is
+    no register: it is the rd_id of the instructions writing a zero register,
+    so that their writes are dropped without a test. The timing model still
+    sees the zero registers under their own ids in src_ids and dest_ids
+    '''
+    names = [None]
+    ids = {}
+
+    def intern(reg):
+        if reg is None: return None
+        i = ids.get(reg)
+        if i is None:
+            i = ids[reg] = len(names)
+            names.append(reg)
+        return i
+
+    for d in decoded:
+        d.rd_id, d.rs1_id, d.rs2_id = intern(d.rd), intern(d.rs1), intern(d.rs2)
+        if d.rd in ZERO_REGS: d.rd_id = REG_SINK
+        d.src_ids = [intern(r) for r in d.src_regs]
+        d.dest_ids = [intern(r) for r in d.dest_regs]
+    return names
+
+
 if __name__ == '__main__':
     code = '''\
 addi R1, R0, 24
@@ -0,0 +1,210 @@
+'''
+Simulated data memory, stored in pages of float64 words allocated on demand
+
+Memory holds one value per address like the dict it replaces. Addresses that
+are non-negative multiples of 8 (the 8-byte words fld/fsd work on) live in
+pages of PAGE_WORDS typed values with a presence byte per word; any other
+address falls back to a plain dict. Bulk images (raw little-endian float64 or
+.npy) are memory-mapped and copied a page at a time without per-word Python
+objects.
+'''
+
+import ast
+import mmap
+import struct
+from array import array
+
+
+WORD = 8
+PAGE_WORDS = 512
+PAGE_SHIFT = 12                 # log2(PAGE_WORDS * WORD)
+SLOT_MASK = PAGE_WORDS - 1
+BIG_ENDIAN = struct.pack('=d', 1.0) != struct.pack('<d', 1.0)     # images are little endian either way
+
+
+class Page:
+    __slots__ = ('values', 'present')
+
+    def __init__(self):
+        self.values = array('d', bytes(PAGE_WORDS * WORD))
+        self.present = bytearray(PAGE_WORDS)
+
+
+class Memory:
+    def __init__(self):
+        self.pages = {}
+        self.other = {}
+
+
+    def _word(self, addr):
+        # (page number, slot) of a paged address, or None for the fallback dict
+        if type(addr) is not int:
+            if addr != int(addr): return None
+            addr = int(addr)
+        if addr < 0 or addr & (WORD - 1): return None
+        return addr >> PAGE_SHIFT, (addr >> 3) & SLOT_MASK
+
+
+    def get(self, addr, default=None):
+        if type(addr) is int and addr >= 0 and not addr & (WORD - 1):     # fast path for word addresses
+            page = self.pages.get(addr >> PAGE_SHIFT)
+            if page is None: return default
+            slot = (addr >> 3) & SLOT_MASK
+            return page.values[slot] if page.present[slot] else default
+
+        word = self._word(addr)
+        if word is None: return self.other.get(addr, default)
+        page = self.pages.get(word[0])
+        if page is None or not page.present[word[1]]: return default
+        return page.values[word[1]]
+
+
+    def __getitem__(self, addr):
+        val = self.get(addr, self)
+        if val is self: raise KeyError(addr)
+        return val
+
+
+    def __setitem__(self, addr, val):
+        word = self._word(addr)
+        if word is None:
+            self.other[addr] = val
+            return
+        page = self.pages.get(word[0])
+        if page is None:
+            page = self.pages[word[0]] = Page()
+        page.values[word[1]] = val
+        page.present[word[1]] = 1
+
+
+    def __contains__(self, addr):
+        return self.get(addr, self) is not self
+
+
+    def __len__(self):
+        return sum(page.present.count(1) for page in self.pages.values()) + len(self.other)
+
+
+    def items(self):
+        '''
+        (address, value) pairs in address order
+        '''
+        items = list(self.other.items())
+        for page_num, page in self.pages.items():
+            base = page_num << PAGE_SHIFT
+            items += [(base + slot * WORD, page.values[slot]) for slot in range(PAGE_WORDS) if page.present[slot]]
+        return sorted(items)
+
+
+    def keys(self):
+        return [addr for addr, _ in self.items()]
+
+
+    def load_text(self, mem_code):
+        '''
+        Loads the (address, value) pairs of the input code
+        '''
+        for k, v in mem_code:
+            self[int(k)] = float(v)
+
+
+    def load_words(self, words, base):
+        '''
+        Copies a buffer of float64 words (e.g. a memoryview cast to 'd') to
+        consecutive words starting at address `base`
+        '''
+        assert base >= 0 and base % WORD == 0, f'Image base address {base} is not word aligned'
+        word_idx = base // WORD
+        done = 0
+        while done < len(words):
+            page_num, slot = divmod(word_idx + done, PAGE_WORDS)
+            count = min(PAGE_WORDS - slot, len(words) - done)
+            page = self.pages.get(page_num)
+            if page is None:
+                page = self.pages[page_num] = Page()
+            memoryview(page.values)[slot:slot + count] = words[done:done + count]
+            page.present[slot:slot + count] = b'\x01' * count
+            done += count
+
+
+    def load_image(self, path, base=0):
+        '''
+        Loads a raw little-endian float64 image, or a 1-D float64 .npy file,
+        to consecutive words starting at address `base`
+        '''
+        with open(path, 'rb') as f:
+            if f.seek(0, 2) == 0: return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                offset = npy_data_offset(mm) if mm[:6] == b'\x93NUMPY' else 0
+                data = memoryview(mm)[offset:]
+                assert len(data) % WORD == 0, f'{path} is not a whole number of 8-byte words'
+                if BIG_ENDIAN:
+                    words = array('d')
+                    words.frombytes(data)
+                    words.byteswap()
+                else:
+                    words = data.cast('d')
+                self.load_words(words, base)
+                del words, data
+
+
+    def save_image(self, path):
+        '''
+        Writes the paged words as a raw little-endian float64 image covering
+        the lowest to the highest present page (missing words are written as
+        0) and returns its base address. Unaligned addresses are not saved
+        '''
+        if not self.pages: return 0
+        first, last = min(self.pages), max(self.pages)
+        empty = bytes(PAGE_WORDS * WORD)
+        with open(path, 'wb') as f:
+            for page_num in range(first, last + 1):
+                page = self.pages.get(page_num)
+                if page is None:
+                    f.write(empty)
+                elif BIG_ENDIAN:
+                    values = array('d', page.values)
+                    values.byteswap()
+                    f.write(values.tobytes())
+                else:
+                    f.write(page.values.tobytes())
+        return first << PAGE_SHIFT
+
+
+    def diff(self, other):
+        '''
+        Yields (address, value here, value in `other`) for every address whose
+        value differs or that is missing from one side (as None); identical
+        pages are skipped with a single comparison
+        '''
+        for page_num in sorted(set(self.pages) | set(other.pages)):
+            mine, theirs = self.pages.get(page_num), other.pages.get(page_num)
+            if mine is not None and theirs is not None and mine.present == theirs.present \
+               and mine.values.tobytes() == theirs.values.tobytes():
+                continue
+            base = page_num << PAGE_SHIFT
+            for slot in range(PAGE_WORDS):
+                a = mine.values[slot] if mine is not None and mine.present[slot] else None
+                b = theirs.values[slot] if theirs is not None and theirs.present[slot] else None
+                if a != b: yield base + slot * WORD, a, b
+
+        for addr in sorted(set(self.other) | set(other.other)):
+            a, b = self.other.get(addr), other.other.get(addr)
+            if a != b: yield addr, a, b
+
+
+    def __repr__(self):
+        return '{' + ', '.join(f'{addr}: {val}' for addr, val in self.items()) + '}'
+
+
+def npy_data_offset(buf):
+    '''
+    Offset of the data of a .npy file holding a 1-D little-endian float64 array
+    '''
+    major = buf[6]
+    if major == 1: header_len, start = struct.unpack_from('<H', buf, 8)[0], 10
+    else: header_len, start = struct.unpack_from('<I', buf, 8)[0], 12
+    header = ast.literal_eval(bytes(buf[start:start + header_len]).decode('latin1'))
+    assert header['descr'] in ['<f8', '=f8'] and not header['fortran_order'] and len(header['shape']) == 1, \
+        f'Only 1-D float64 .npy images are supported, got {header}'
+    return start + header_len
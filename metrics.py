@@ -0,0 +1,100 @@
+'''
+Run statistics of the timing model
+
+The timing loop only bumps integers in a preallocated counter list (indexed by
+the constants below) and the PComponents keep their own request, wait and
+wait-histogram counters, as do the data cache levels with their accesses and
+misses; everything else (rates, occupancy, IPC) is derived when a report is
+requested. Reports are written as JSON or CSV.
+'''
+
+import csv
+import json
+
+
+FIELDS = ('fetch_groups', 'fetched_instrs',
+          'rename_stall_cycles', 'rename_stalled_instrs', 'raw_stall_cycles', 'raw_stalled_instrs',
+          'branches', 'mispredicts', 'mispredict_penalty_cycles')
+(FETCH_GROUPS, FETCHED_INSTRS,
+ RENAME_STALL_CYCLES, RENAME_STALLED_INSTRS, RAW_STALL_CYCLES, RAW_STALLED_INSTRS,
+ BRANCHES, MISPREDICTS, MISPREDICT_PENALTY_CYCLES) = range(len(FIELDS))
+
+# wait histogram bucket i > 0 counts waits of [2**(i-1), 2**i) cycles; the
+# last bucket takes everything longer
+NUM_WAIT_BUCKETS = 16
+
+
+def wait_bucket_labels():
+    labels = ['0']
+    for i in range(1, NUM_WAIT_BUCKETS):
+        lo, hi = 2 ** (i - 1), 2 ** i - 1
+        labels.append(f'{lo}+' if i == NUM_WAIT_BUCKETS - 1 else (f'{lo}' if lo == hi else f'{lo}-{hi}'))
+    return labels
+
+
+class Metrics:
+    def __init__(self):
+        self.counters = [0] * len(FIELDS)
+
+
+    def report(self, proc):
+        '''
+        All statistics of the last simulate_timing run of `proc`, as a dict
+        '''
+        c = self.counters
+        cycles = proc.total_exec_cycles
+        width = min(proc.NF, proc.NI, proc.NW, proc.NR, proc.NB)
+        committed = proc.num_committed - proc.timing_committed     # since timing cycle 0
+        report = {name: c[i] for i, name in enumerate(FIELDS)}
+        report.update({
+            'total_cycles': cycles,
+            'committed_instrs': committed,
+            'ipc': committed / cycles if cycles else 0,
+            'fetch_width': width,
+            'fetch_utilisation': c[FETCHED_INSTRS] / (c[FETCH_GROUPS] * width) if c[FETCH_GROUPS] else 0,
+            'mispredict_rate': c[MISPREDICTS] / c[BRANCHES] if c[BRANCHES] else 0,
+        })
+
+        labels = wait_bucket_labels()
+        components = {}
+        for comp in proc.get_components():
+            busy = comp.total_input_reqs * comp.latency + comp.timed_busy_cycles
+            hist = list(comp.wait_hist)
+            hist[0] = comp.total_input_reqs - sum(hist[1:])
+            components[comp.get_name()] = {
+                'size': comp.get_size(),
+                'latency': comp.get_latency(),
+                'requests': comp.total_input_reqs,
+                'wait_cycles': comp.total_wait_cycles,
+                'busy_cycles': busy,
+                'occupancy': busy / (comp.get_size() * cycles) if cycles else 0,
+                'wait_histogram': dict(zip(labels, hist)),
+            }
+        report['components'] = components
+        if proc.dcache is not None: report['dcache'] = proc.dcache.stats()
+        return report
+
+
+    def write(self, path, proc):
+        '''
+        Writes the report of `proc` as JSON, or as a single-row CSV with one
+        column per flattened statistic when `path` ends with .csv
+        '''
+        report = self.report(proc)
+        if not path.endswith('.csv'):
+            with open(path, 'w') as f: json.dump(report, f, indent=2)
+            return
+
+        row = {k: v for k, v in report.items() if k not in ('components', 'dcache')}
+        for name, stats in report.get('dcache', {}).items():
+            for k, v in stats.items(): row[f'{name}.{k}'] = v
+        for name, stats in report['components'].items():
+            for k, v in stats.items():
+                if k == 'wait_histogram':
+                    for label, count in v.items(): row[f'{name}.wait_{label}'] = count
+                else:
+                    row[f'{name}.{k}'] = v
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(row))
+            writer.writeheader()
+            writer.writerow(row)
@@ -0,0 +1,580 @@
+'''
+Parallel segmented timing of one long run: the timed instruction stream is
+cut into segments at fetch group boundaries and every segment is timed on its
+own worker process
+
+    python parallel_timing.py cfg.json path/to/input/code [--segments K] [--overlap N] [-j J] [--trace PATH] [--check]
+
+In the analytic model, which fetch groups run, the branch unit state and the
+fetch cycle only depend on the branch outcomes. Fetch advances by
+cache_latency per group and by the mispredict stalls. A quick walk of the
+fetch groups, with the branch unit but no components, therefore finds every
+segment boundary with its exact pc, branch outcome index and fetch cycle. It
+also saves the branch unit state `overlap` timed instructions earlier. Each
+worker starts from that earlier point, with its fetch cycle and branch unit
+state but empty components and scoreboard, times the overlap to warm them,
+then its segment, and returns the timing state at both ends of its segment,
+relative to the fetch cycle (see boundary_state).
+
+The warmed state is only a guess: the analytic model carries its backlog
+(retirement falling behind fetch, the rename pool filling up) over the whole
+run, so the real state at a boundary is often the warmed one with every live
+entry later by some lag. The segment is therefore timed with the lag left
+open (see LagCycle and lag_state), and the entries free at its start are
+opened: they stand for whatever the real state has there, as long as each
+is free by the time the run first uses it. The predecessor's end state then
+fixes the lag (see fit_lag), and with it every cycle of the segment, which
+is exact if the predecessor is (the first segment starts at cycle 0 and is
+exact). When the fetch rate bounds the run, one round is enough. When the
+backlog keeps growing past what the overlap warms, a segment's start state
+fits no lag; every further round times the first such segment again from
+its predecessor's end state, which makes it exact, and as many of the
+following ones as there are workers from their predecessors' latest end
+states, until every segment is exact. Either way the total cycles and the
+run statistics are those of the serial run. --check also times the run
+serially and fails unless the totals match.
+
+Only the analytic engine is segmented, since the event-driven one has no stop
+points. The segments do not use steady-state extrapolation, whose
+fingerprints cannot take LagCycles. Configs with a data cache are not
+segmented, since the boundary state leaves the cache out.
+'''
+
+import argparse
+import math
+import os, sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+
+from data_cache import dcache_params
+from exec_trace import TraceReader
+from instruction import OP_BNE
+from metrics import FIELDS, FETCHED_INSTRS
+from parser import Parser
+from pipelined_component import PComponent
+from processor import Processor, load_config
+
+
+class Segment:
+    '''
+    Part of the timed instruction stream, from the fetch group at `pc` after
+    `outcome` branch outcomes (fetched at `cycle`) to the one at `end_pc`
+    after `end_outcome` outcomes (None for the last segment). Its worker
+    starts at `warm_pc`, `warm_outcome`, `warm_cycle` with the branch unit
+    entries `btb` and predictor state `predictor`
+    '''
+    def __init__(self, pc, outcome, cycle):
+        self.pc, self.outcome, self.cycle = pc, outcome, cycle
+        self.end_pc = self.end_outcome = None
+        self.warm_pc, self.warm_outcome, self.warm_cycle = pc, outcome, cycle
+        self.btb = self.predictor = None
+
+
+def plan_segments(proc, outcomes, num_segments, overlap, num_instrs):
+    '''
+    Segments of about `num_instrs` / `num_segments` committed instructions
+    of `proc`'s timing run with the branch outcomes `outcomes`, each starting
+    `overlap` instructions early. Walks the fetch groups once, updating
+    `proc`'s branch unit as the timing model does. The instructions a fetch
+    group runs after a taken branch are not counted, so that the segments
+    stay even however many of them the run has
+    '''
+    code = proc.parser.get_decoded()
+    num_lines = len(code)
+    width = min(proc.NF, proc.NI, proc.NW, proc.NR, proc.NB)
+    groups = {}             # branch lines of the fetch group starting at a line, if any
+    for i, d in enumerate(code):
+        if d.opcode != OP_BNE: continue
+        for line in range(max(i - width + 1, 0), i + 1):
+            groups.setdefault(line, []).append(i)
+    stall = proc.decoder.get_latency() + proc.pool_of[OP_BNE].get_latency()
+    cache_latency = proc.cache_latency
+    bu = proc.branch_unit
+
+    size = max(math.ceil(num_instrs / num_segments), 1)
+    # (committed instructions, 0: warm start / 1: segment start, segment index), in walk order
+    marks = sorted([(max(k * size - overlap, 0), 0, k) for k in range(1, num_segments)] +
+                   [(k * size, 1, k) for k in range(1, num_segments)])
+    segments = [Segment(0, 0, 0)] + [None] * (num_segments - 1)
+    segments[0].btb, segments[0].predictor = bu.entries(), bu.predictor.state()
+    warm = {}
+
+    pc = idx = cycle = committed = 0
+    m = 0
+    while 0 <= pc // 4 < num_lines:
+        while m < len(marks) and marks[m][0] <= committed:
+            _, start, k = marks[m]
+            if start:
+                s = segments[k] = Segment(pc, idx, cycle)
+                s.warm_pc, s.warm_outcome, s.warm_cycle, s.btb, s.predictor = warm.pop(k)
+            else:
+                warm[k] = (pc, idx, cycle, bu.entries(), bu.predictor.state())
+            m += 1
+
+        cycle += cache_latency
+        l_begin = pc // 4
+        l_end = min(l_begin + width, num_lines)
+        next_pc = 4 * l_end
+        on_path = l_end - l_begin
+        last_stall = 0
+        for line in groups.get(l_begin, ()):
+            assert idx < len(outcomes), 'Ran out of branch outcomes'
+            taken = outcomes[idx]
+            idx += 1
+            branch_pc = 4 * line
+            target = code[line].imm if taken else branch_pc + 4
+            predicted_taken = bu.is_taken(branch_pc)
+            mispredict = predicted_taken ^ taken
+            if taken and predicted_taken and bu.get_target(branch_pc) != target: mispredict = True
+            bu.update_btb(branch_pc, target, taken)
+            if target != branch_pc + 4:
+                next_pc = target
+                on_path = min(on_path, line + 1 - l_begin)     # the rest of the group is off the committed path
+            last_stall = stall if mispredict and line == l_end - 1 else 0     # only the last instruction's stall applies
+        cycle += last_stall
+        committed += on_path
+        pc = next_pc
+
+    # segments the run does not reach, or that start where the previous one does, are dropped
+    kept = []
+    for s in segments:
+        if s is None or (kept and (s.pc, s.outcome) == (kept[-1].pc, kept[-1].outcome)): continue
+        if kept: kept[-1].end_pc, kept[-1].end_outcome = s.pc, s.outcome
+        kept.append(s)
+    return kept
+
+
+# the range of lags for which every comparison of the current segment's
+# timing run decides as it did at lag 0 (see LagCycle), per worker
+lag_low = lag_high = 0
+
+
+def lag_holds(d, strict):
+    '''
+    Whether `d` > 0 (`strict`) or `d` >= 0 at lag 0, narrowing lag_low and
+    lag_high to the lags at which that still holds
+    '''
+    global lag_low, lag_high
+    if type(d) is not LagCycle: return d > 0 if strict else d >= 0
+    a, b = d.value, d.slope
+    holds = a > 0 if strict else a >= 0
+    # the lags x with b * x >= t
+    b, t = (b, strict - a) if holds else (-b, a + (not strict))
+    if b > 0: lag_low = max(lag_low, -(-t // b))
+    else: lag_high = min(lag_high, t // b)
+    return holds
+
+
+class LagCycle:
+    '''
+    A cycle of a segment timed from a guessed start state when every live
+    entry, register and the latest retirement of the real one may be `lag`
+    cycles later: `value` + `slope` * lag. Those start with slope 1 and
+    everything derived from them carries it along, while fetch cycles stay
+    plain ints. Every comparison decides as at lag 0 and narrows lag_low and
+    lag_high to the lags deciding the same, so within them every cycle of
+    the run is exact at any lag. Sums with slope 0 are plain ints again, so
+    once the start state is used up, so are the LagCycles
+    '''
+    __slots__ = ('value', 'slope')
+
+    def __init__(self, value, slope):
+        self.value, self.slope = value, slope
+
+    def __add__(self, other):
+        if type(other) is not LagCycle: return LagCycle(self.value + other, self.slope)
+        slope = self.slope + other.slope
+        return LagCycle(self.value + other.value, slope) if slope else self.value + other.value
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if type(other) is not LagCycle: return LagCycle(self.value - other, self.slope)
+        slope = self.slope - other.slope
+        return LagCycle(self.value - other.value, slope) if slope else self.value - other.value
+
+    def __rsub__(self, other):
+        return LagCycle(other - self.value, -self.slope)
+
+    # cycles of the same slope differ by the same at every lag
+    def __lt__(self, other):
+        if type(other) is LagCycle and other.slope == self.slope: return self.value < other.value
+        return lag_holds(other - self, True)
+
+    def __le__(self, other):
+        if type(other) is LagCycle and other.slope == self.slope: return self.value <= other.value
+        return lag_holds(other - self, False)
+
+    def __gt__(self, other):
+        if type(other) is LagCycle and other.slope == self.slope: return self.value > other.value
+        return lag_holds(self - other, True)
+
+    def __ge__(self, other):
+        if type(other) is LagCycle and other.slope == self.slope: return self.value >= other.value
+        return lag_holds(self - other, False)
+
+    def __bool__(self):
+        return lag_holds(self, True) or not lag_holds(self, False)
+
+    def bit_length(self):
+        # for the components' wait histograms, which the segmented result leaves out
+        return self.value.bit_length()
+
+    def __repr__(self):
+        return f'LagCycle({self.value}, {self.slope})'
+
+
+def at_lag(v, lag):
+    return v.value + v.slope * lag if type(v) is LagCycle else v
+
+
+def pooled_components(proc):
+    # whether every component is a unit of a pool of several, which picks a unit by comparing their entries
+    pooled = {id(u) for pool in proc.pools if len(pool.units) > 1 for u in pool.units}
+    return [id(c) in pooled for c in proc.get_components()]
+
+
+def boundary_state(proc):
+    '''
+    The timing state of `proc` at its fetch cycle, relative to that cycle:
+    the latest retirement, when every component entry (in heap order) and
+    every register frees up, and the branch unit state. Entries and
+    registers still open (see lag_state) are None
+    '''
+    cycle = proc.timing_cycle
+    rel = lambda v: None if type(v) is int and v < open_end else v - cycle
+    return (rel(proc.timing_exec_cycles), [[rel(v) for v in c.available_cycles] for c in proc.get_components()],
+            [rel(v) for v in proc.scoreboard.sb], proc.branch_unit.entries(), proc.branch_unit.predictor.state())
+
+
+def settle_state(state, lag=0):
+    # a boundary_state without open entries, possibly of LagCycles, at `lag`, with every component's entries sorted
+    exec_cycles, components, scoreboard, btb, predictor = state
+    return (at_lag(exec_cycles, lag), [sorted(at_lag(v, lag) for v in c) for c in components],
+            [at_lag(v, lag) for v in scoreboard], btb, predictor)
+
+
+# the cycles below which entries and registers are open, from open_free up,
+# and the fetch cycle of the instruction being timed, per worker
+open_free = open_end = -math.inf
+fetch_clock = 0
+
+
+class OpenComponent(PComponent):
+    '''
+    A component of a lag_state run whose entries from open_free up to
+    open_end are open: they stand for the entries of the real start state
+    left over by the fit (see fit_lag), in order, whatever their cycles.
+    They are below every other entry, so they are used first, in order, and
+    the fetch cycle at which each one is first used is kept in `first_used`.
+    The run holds if each was free by then, since every later request comes
+    after it. Once all of them are used, it goes back to a PComponent
+    '''
+    def watch(self):
+        v = self.available_cycles[0]
+        if type(v) is int and v < open_end and v - open_free == len(self.first_used):
+            self.first_used.append(fetch_clock)
+            if len(self.first_used) == self.num_open: self.__class__ = PComponent
+
+
+    def allocate(self, curr_cycle):
+        self.watch()
+        return PComponent.allocate(self, curr_cycle)
+
+
+    def get_wait_cycles(self, curr_cycle):
+        self.watch()
+        return PComponent.get_wait_cycles(self, curr_cycle)
+
+
+    def allocate_timed(self, curr_cycle, lat):
+        self.watch()
+        PComponent.allocate_timed(self, curr_cycle, lat)
+
+
+def lag_state(proc):
+    '''
+    Readies `proc` to time from its fetch cycle with the live part of its
+    state possibly lagging further behind (see LagCycle), and returns that
+    state for fit_lag, relative to the fetch cycle. The latest retirement and
+    the registers free at the fetch cycle are free in the real state too,
+    below any cycle the run can reach, and are None in the returned state.
+    The entries free at the fetch cycle are opened (see OpenComponent) and
+    left out of it, except in pools of several units, which pick a unit by
+    comparing their entries: those stay where they are
+    '''
+    global lag_low, lag_high, open_free, open_end
+    cycle = proc.timing_cycle
+    open_free = -(1 << 64) - 2 * abs(cycle)
+    open_end = open_free + max(c.get_size() for c in proc.get_components()) + 1
+    lag_low, lag_high = -math.inf, math.inf
+    live = lambda v: v - cycle if v > cycle else None
+    lagging = lambda v: LagCycle(v, 1) if v > cycle else v
+    components = []
+    for c, pooled in zip(proc.get_components(), pooled_components(proc)):
+        entries = sorted(c.available_cycles)
+        if pooled:
+            components.append([v - cycle for v in entries])
+            c.available_cycles = [lagging(v) for v in entries]
+        else:
+            num_free = sum(v <= cycle for v in entries)
+            components.append([v - cycle for v in entries[num_free:]])
+            c.first_used, c.num_open = [], num_free
+            if num_free: c.__class__ = OpenComponent
+            c.available_cycles = [open_free + j for j in range(num_free)] + [LagCycle(v, 1) for v in entries[num_free:]]     # sorted, so a heap
+    sb = proc.scoreboard.sb
+    state = (live(proc.timing_exec_cycles), components, [live(v) for v in sb],
+             proc.branch_unit.entries(), proc.branch_unit.predictor.state())
+    sb[:] = [LagCycle(v, 1) if v > cycle else open_free for v in sb]
+    exec_cycles = proc.timing_exec_cycles
+    proc.timing_exec_cycles = LagCycle(exec_cycles, 1) if exec_cycles > cycle else open_free
+
+    run_instruction = proc.run_instruction
+    def run_clocked(decoded, fetch_cycle, events=None):
+        global fetch_clock
+        fetch_clock = fetch_cycle
+        return run_instruction(decoded, fetch_cycle, events)
+    proc.run_instruction = run_clocked
+    return state
+
+
+def fit_lag(start, end, pooled, first_used, cycle):
+    '''
+    The lag by which the settled boundary state `end` at fetch cycle `cycle`
+    goes on like the start state `start` of a lag_state run whose open
+    entries were first used at the fetch cycles `first_used`, with the
+    entries left open in every component, or None if there is none. The
+    latest retirement and the registers have to be free where `start` has
+    None and otherwise be as in `start`, that much later; the entries of
+    pools of several units have to be as in `start`, that much later except
+    those free. The other components have to have the entries of `start`,
+    that much later, and the ones left over are open: each has to be free by
+    the time it is first used. `pooled` is pooled_components of the
+    processor. Every request after a boundary comes at or after its fetch
+    cycle, so cycles before it all behave the same and are compared clamped
+    to it, except in pools, which pick a unit by comparing them
+    '''
+    if start[3:] != end[3:]: return None
+    pairs = [(s, e) for s, e in zip([start[0]] + start[2], [end[0]] + end[2])]
+    candidates = [e - s for s, e in pairs if s is not None and e > 0]
+    for c, e, p in zip(start[1], end[1], pooled):
+        if p: candidates += [b - a for a, b in zip(c, e) if a > 0]
+        elif c: candidates.append(e[-1] - c[-1])
+    lag = candidates[0] if candidates else 0
+    if not all(e <= 0 if s is None else max(e, 0) == max(s + lag, 0) for s, e in pairs): return None
+
+    opened = []
+    for c, e, p, used in zip(start[1], end[1], pooled, first_used):
+        if p:
+            if e != [v + lag if v > 0 else v for v in c]: return None
+            opened.append([])
+            continue
+        left = Counter(e)
+        free = 0
+        for v in c:
+            if v + lag <= 0: free += 1
+            elif left[v + lag]: left[v + lag] -= 1
+            else: return None
+        # the entries of `start` free at the lag take any free ones
+        rest = sorted(left.elements())
+        if free and rest[free - 1] > 0: return None
+        rest = rest[free:]
+        if any(cycle + v > f for v, f in zip(rest, used)): return None
+        opened.append(rest)
+    return lag, opened
+
+
+def settle_end(end, lag, start, opened, offset):
+    '''
+    The settled boundary state of a lag_state run ending in `end` at `lag`,
+    which started in the settled state `start`, leaving `opened` open (see
+    fit_lag). What is still open keeps its cycle from `start`, relative to
+    the end's fetch cycle, which is `offset` cycles later
+    '''
+    exec_cycles, components, scoreboard, btb, predictor = end
+    at = lambda v, s: s - offset if v is None else at_lag(v, lag)
+    # the open entries are used in order, so the ones left are the last
+    components = [sorted([at_lag(v, lag) for v in c if v is not None] +
+                         [v - offset for v in (o[len(o) - c.count(None):] if None in c else ())])
+                  for c, o in zip(components, opened)]
+    return (at(exec_cycles, start[0]), components, [at(v, s) for v, s in zip(scoreboard, start[2])], btb, predictor)
+
+
+def restore_state(proc, s, state):
+    # puts `proc` at the start of segment `s` in the settled boundary_state `state`
+    exec_cycles, components, scoreboard, btb, predictor = state
+    cycle = s.cycle
+    proc.timing_pc, proc.timing_cycle, proc.timing_exec_cycles = s.pc, cycle, cycle + exec_cycles
+    for c, available_cycles in zip(proc.get_components(), components):
+        c.available_cycles = [cycle + v for v in available_cycles]      # sorted, so already a heap
+    proc.scoreboard.sb[:] = [cycle + v for v in scoreboard]
+    proc.branch_unit.load_entries(btb)
+    proc.branch_unit.predictor.load_state(predictor)
+
+
+# per-worker state, set once by init_worker
+worker_cfg = None
+worker_parser = None
+
+
+def init_worker(cfg, parser):
+    global worker_cfg, worker_parser
+    worker_cfg = cfg
+    worker_parser = parser
+
+
+def time_segment(job):
+    '''
+    Times segment `s` given the branch outcomes from its start, or from its
+    warm start without a `state`. With a settled boundary `state`, the
+    segment starts in it; otherwise the overlap is timed first to warm the
+    cold components. The segment itself is timed with the live part of its
+    start state possibly lagging further behind (see lag_state). Returns the
+    latest retirement at the end of the segment and its run statistics
+    (either may be a LagCycle), the lag_state at its start, the
+    boundary_state at its end (None for the last segment), the range of lags
+    they hold for and the fetch cycles at which every component's open
+    entries were first used
+    '''
+    s, outcomes, state = job
+    proc = Processor.from_config(worker_cfg, worker_parser)
+    proc.extrapolate = False        # its fingerprints cannot take LagCycles
+    proc.pending_outcomes = outcomes
+    if state is not None:
+        restore_state(proc, s, state)
+    else:
+        proc.branch_unit.load_entries(s.btb)
+        proc.branch_unit.predictor.load_state(s.predictor)
+        proc.timing_pc, proc.timing_cycle = s.warm_pc, s.warm_cycle
+        if (s.warm_pc, s.warm_outcome) != (s.pc, s.outcome):
+            proc.simulate_timing(False, branch_outcomes=[], stop=(s.pc, s.outcome - s.warm_outcome))
+        assert (proc.timing_pc, proc.timing_cycle) == (s.pc, s.cycle), 'The overlap did not stop at the segment start'
+    state = lag_state(proc)
+    stop = None if s.end_pc is None else (s.end_pc, s.end_outcome - s.outcome)
+    proc.simulate_timing(False, branch_outcomes=[], stop=stop)
+    end_state = boundary_state(proc) if stop is not None else None
+    return (proc.total_exec_cycles, list(proc.metrics.counters), state, end_state, (lag_low, lag_high),
+            [getattr(c, 'first_used', []) for c in proc.get_components()])
+
+
+class SegmentedResult:
+    def __init__(self, ends, counters, rounds, retimed, seconds):
+        self.num_segments = len(ends)
+        self.segment_cycles = [b - a for a, b in zip([0] + ends, ends)]
+        self.total_cycles = ends[-1]
+        self.counters = [sum(c[i] for c in counters) for i in range(len(FIELDS))]
+        self.segment_instrs = [c[FETCHED_INSTRS] for c in counters]
+        self.rounds = rounds            # rounds of parallel timing, the first one included
+        self.retimed = retimed          # segments timed again from their predecessor's end state
+        self.seconds = seconds
+
+
+    def report(self):
+        '''
+        The run statistics as in Metrics.report, without the components
+        '''
+        report = dict(zip(FIELDS, self.counters))
+        report['total_cycles'] = self.total_cycles
+        report['rounds'] = self.rounds
+        report['retimed_segments'] = self.retimed
+        return report
+
+
+    def __repr__(self):
+        return (f'segments={self.num_segments}, timed_instrs={sum(self.segment_instrs)}, seconds={self.seconds:.3f}\n'
+                f'total_cycles={self.total_cycles}\n'
+                f'rounds={self.rounds}, retimed_segments={self.retimed}\n'
+                f'segment_cycles={self.segment_cycles}')
+
+
+def simulate_segmented(cfg, parser, outcomes, num_instrs, num_segments=None, overlap=10000, num_workers=None):
+    '''
+    Times `parser`'s program under `cfg` with the branch outcomes `outcomes`
+    (a list) in segments of about `num_instrs` / `num_segments` committed
+    instructions (by default, one per worker) on `num_workers` processes (by
+    default, all cores); returns a SegmentedResult with exactly the cycles
+    and statistics of the serial run
+    '''
+    assert dcache_params(cfg) is None, 'Segmented timing does not model the data cache'
+    num_workers = num_workers or os.cpu_count() or 1
+    num_segments = num_segments or num_workers
+    begin = time.perf_counter()
+    proc = Processor.from_config(cfg, parser)
+    pooled = pooled_components(proc)
+    cold = settle_state(boundary_state(proc))
+    segments = plan_segments(proc, outcomes, num_segments, overlap, num_instrs)
+    jobs = [(s, outcomes[s.warm_outcome:], None) for s in segments]
+    pool = None
+    if num_workers == 1 or len(jobs) == 1:
+        init_worker(cfg, parser)
+        run = lambda jobs: [time_segment(job) for job in jobs]
+    else:
+        pool = Pool(min(num_workers, len(jobs)), init_worker, (cfg, parser))
+        run = lambda jobs: pool.map(time_segment, jobs, chunksize=1)
+    try:
+        results = run(jobs)
+        rounds, retimed = 1, 0
+        while True:
+            # segment k is exact if its predecessor is and the end state of that fits its start
+            # state at a lag it holds for; the lags of the others are guesses, or 0
+            ends, lags, redo = [None] * len(segments), [0] * len(segments), []
+            for k, (_, _, start, end, (low, high), first_used) in enumerate(results):
+                prev = ends[k - 1] if k else cold
+                fit = fit_lag(start, prev, pooled, first_used, segments[k].cycle)
+                if fit is None or not low <= fit[0] <= high:
+                    if len(redo) < num_workers: redo.append(k)
+                    # a guess: the earliest entries are taken to be the open ones
+                    opened = [[] if p else e[:len(e) - len(c)] for c, e, p in zip(start[1], prev[1], pooled)]
+                    fit = 0, opened
+                lags[k], opened = fit
+                if end is not None: ends[k] = settle_end(end, lags[k], prev, opened, segments[k + 1].cycle - segments[k].cycle)
+            if not redo: break
+            # the first inexact segment is timed again from its predecessor's end state, which is
+            # exact, and the ones after it from their predecessors' guessed end states, as workers allow
+            for k, r in zip(redo, run([(segments[k], outcomes[segments[k].outcome:], ends[k - 1]) for k in redo])):
+                results[k] = r
+            rounds += 1
+            retimed += len(redo)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return SegmentedResult([at_lag(r[0], lag) for r, lag in zip(results, lags)],
+                           [[at_lag(v, lag) for v in r[1]] for r, lag in zip(results, lags)],
+                           rounds, retimed, time.perf_counter() - begin)
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Time one long run in segments on parallel workers')
+    ap.add_argument('cfg_file', help='path/to/config/file')
+    ap.add_argument('input_file', help='path/to/input/code')
+    ap.add_argument('--segments', type=int, default=None, help='segments to cut the run into (default: one per worker)')
+    ap.add_argument('--overlap', type=int, default=10000, help='timed instructions warming the components before every segment')
+    ap.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    ap.add_argument('--trace', default=None, help='replay a trace captured by exec_trace.py instead of running the functional simulation')
+    ap.add_argument('--check', action='store_true', help='also time the run serially and fail unless the totals match')
+    args = ap.parse_args()
+
+    assert os.path.exists(args.cfg_file)
+    assert os.path.exists(args.input_file)
+    cfg = load_config(args.cfg_file)
+    parser = Parser(args.input_file)
+    if args.trace is None:
+        func = Processor.from_config(None, parser)
+        func.simulate_func(verbose=False)
+        outcomes, num_instrs = func.branch_record, func.num_committed
+    else:
+        with TraceReader(args.trace) as reader:
+            reader.check_program(parser)
+            outcomes, num_instrs = list(reader.branch_outcomes()), reader.num_records
+
+    result = simulate_segmented(cfg, parser, outcomes, num_instrs, args.segments, args.overlap, args.jobs)
+    print(result)
+    if args.check:
+        begin = time.perf_counter()
+        serial = Processor.from_config(cfg, parser).simulate_timing(False, branch_outcomes=outcomes)
+        print(f'serial total_cycles={serial} in {time.perf_counter() - begin:.3f}s')
+        if serial != result.total_cycles:
+            print(f'Mismatch: the segmented total is off by {result.total_cycles - serial} cycles')
+            exit(1)
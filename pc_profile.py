@@ -0,0 +1,124 @@
+'''
+Per-PC cycle attribution of timing runs
+
+With a profile on the processor (Processor.set_profile), every timed
+instruction adds its cycles, split by stage, to preallocated counters of its
+static instruction (a row of NUM_PROFILE_FIELDS per pc, see PROFILE_FIELDS):
+    count:      timed instances (with the analytic engine, the instructions a
+                fetch group runs after a taken branch included)
+    rename:     cycles waiting for rename registers
+    raw:        cycles waiting for source operands
+    decode:     cycles from then until decoded (decoder latency + queueing)
+    execute:    cycles from decode to the result (unit latency, + cache
+                latency for fld/fsd, + queueing for the unit)
+    dcache:     the execute cycles of fld/fsd beyond the L1 hit latency,
+                with a data cache (see data_cache.py)
+    retire:     cycles from the result to retirement (ROB latency + queueing)
+    mispredict: fetch cycles lost after mispredicts of this branch
+The fetch-to-retire latency of an instance is rename + raw + decode + execute
++ retire; the structural stalls are the decode, execute (less dcache) and retire
+cycles less the latencies of the decoder, the unit and the ROB. With the
+event-driven engine, decode runs up to dispatch, execute includes the wait
+for a result bus and retire the in-order commit.
+
+A profile gives an annotated listing of the source program and collapsed
+stacks (program;label;pc instruction;cause cycles), which flamegraph.pl,
+inferno or speedscope draw as a flame graph:
+
+    python processor.py config1.json test1.txt --profile out    # out.txt, out.folded
+'''
+
+from assembler import source_lines
+
+
+PROFILE_FIELDS = ('count', 'rename', 'raw', 'decode', 'execute', 'retire', 'mispredict', 'dcache')
+(PROF_COUNT, PROF_RENAME, PROF_RAW, PROF_DECODE, PROF_EXECUTE, PROF_RETIRE,
+ PROF_MISPREDICT, PROF_DCACHE) = range(len(PROFILE_FIELDS))
+NUM_PROFILE_FIELDS = len(PROFILE_FIELDS)
+
+
+class PCProfile:
+    def __init__(self, num_instrs):
+        # counters of the instruction at pc: [pc // 4][PROF_*]
+        self.counters = [[0] * NUM_PROFILE_FIELDS for _ in range(num_instrs)]
+
+
+    def reset(self):
+        for row in self.counters: row[:] = [0] * NUM_PROFILE_FIELDS
+
+
+    def rows(self, proc):
+        '''
+        A dict per static instruction of `proc`'s program: its counters, its
+        total fetch-to-retire `cycles`, the functional-unit pool it runs on
+        (`unit`) and its `structural` stalls by component, from the latencies
+        of `proc`'s config
+        '''
+        rows = []
+        for d in proc.parser.get_decoded():
+            row = dict(zip(PROFILE_FIELDS, self.counters[d.pc // 4]), pc=d.pc, instr=d.instr)
+            unit = proc.pool_of[d.opcode]
+            n = row['count']
+            service = unit.latency + proc.access_latency[d.opcode]
+            row['cycles'] = sum(row[f] for f in ('rename', 'raw', 'decode', 'execute', 'retire'))
+            row['unit'] = unit.get_name()
+            row['structural'] = {proc.decoder.get_name(): row['decode'] - n * proc.decoder.latency,
+                                 unit.get_name(): row['execute'] - row['dcache'] - n * service,
+                                 proc.rob.get_name(): row['retire'] - n * proc.rob.latency}
+            row['service'] = n * (proc.decoder.latency + service + proc.rob.latency)
+            rows.append(row)
+        return rows
+
+
+    def listing(self, proc, source=None):
+        '''
+        The source program (`source`, the input code; by default the
+        instruction strings) with the profile of every instruction in front
+        '''
+        rows = self.rows(proc)
+        lines = source_lines(source) if source is not None else [(d.instr, d.pc, None) for d in proc.parser.get_decoded()]
+        total = sum(r['cycles'] for r in rows) or 1
+        head = f'{"count":>9} {"cycles":>11} {"%":>5} {"avg":>7} {"rename":>9} {"raw":>9} {"decoder":>9} {"unit":>9} {"dcache":>9} {"rob":>9} {"branch":>9}'
+        out = [f'% {head[2:]} | source']
+        for line, pc, _ in lines:
+            if pc is None:
+                out.append(f'{"":{len(head)}} | {line}')
+                continue
+            r = rows[pc // 4]
+            s = r['structural']
+            out.append(f'{r["count"]:9d} {r["cycles"]:11d} {100 * r["cycles"] / total:5.1f} '
+                       f'{r["cycles"] / r["count"] if r["count"] else 0:7.2f} {r["rename"]:9d} {r["raw"]:9d} '
+                       f'{s[proc.decoder.get_name()]:9d} {s[r["unit"]]:9d} {r["dcache"]:9d} {s[proc.rob.get_name()]:9d} {r["mispredict"]:9d} | {line}')
+        out.append(f'% {sum(r["count"] for r in rows)} timed instructions, {sum(r["cycles"] for r in rows)} instruction cycles, '
+                   f'{sum(r["mispredict"] for r in rows)} mispredict cycles')
+        return '\n'.join(out) + '\n'
+
+
+    def collapsed(self, proc, name='program', source=None):
+        '''
+        Collapsed stack lines "name;label;pc instruction;cause cycles"; the
+        label is the last one before the instruction in `source`, if given
+        '''
+        labels = {}
+        label = None
+        for _, pc, defined in (source_lines(source) if source is not None else []):
+            if defined is not None: label = defined
+            if pc is not None and label is not None: labels[pc] = label
+        out = []
+        for r in self.rows(proc):
+            frames = [name] + ([labels[r['pc']]] if r['pc'] in labels else []) + [f'{r["pc"]} {r["instr"]}']
+            frame = ';'.join(f.replace(';', ',') for f in frames)
+            causes = [('service', r['service']), ('rename', r['rename']), ('raw', r['raw'])]
+            causes += [(f'structural:{unit}', cycles) for unit, cycles in r['structural'].items()]
+            causes += [('dcache', r['dcache']), ('mispredict', r['mispredict'])]
+            out += [f'{frame};{cause} {cycles}' for cause, cycles in causes if cycles > 0]
+        return out
+
+
+    def write(self, prefix, proc, source=None, name='program'):
+        '''
+        Writes the listing to `prefix`.txt and the collapsed stacks to
+        `prefix`.folded
+        '''
+        with open(f'{prefix}.txt', 'w') as f: f.write(self.listing(proc, source))
+        with open(f'{prefix}.folded', 'w') as f: f.write(''.join(line + '\n' for line in self.collapsed(proc, name, source)))
@@ -2,15 +2,35 @@
 Pipeline component with a specified latency and input buffer
 '''
 
+import heapq
+from metrics import NUM_WAIT_BUCKETS
+
 
 class PComponent:
     def __init__(self, name, latency, input_buffer_size):
         self.name = name
         self.latency = latency
         self.input_buffer_size = input_buffer_size
+        # min-heap of the cycles at which each input buffer entry frees up; the
+        # entries are interchangeable, so only the multiset of cycles matters
         self.available_cycles = [0] * input_buffer_size
         self.total_input_reqs = 0
         self.total_wait_cycles = 0
+        self.timed_busy_cycles = 0                  # entry cycles taken by allocate_timed
+        self.wait_hist = [0] * NUM_WAIT_BUCKETS     # see metrics.py; bucket 0 is derived
+
+
+    def reset(self, latency, input_buffer_size):
+        '''
+        Returns to the state of a new component, keeping the allocated lists
+        '''
+        self.latency = latency
+        self.input_buffer_size = input_buffer_size
+        self.available_cycles[:] = [0] * input_buffer_size
+        self.total_input_reqs = 0
+        self.total_wait_cycles = 0
+        self.timed_busy_cycles = 0
+        self.wait_hist[:] = [0] * NUM_WAIT_BUCKETS
 
 
     def get_name(self):
@@ -32,33 +52,41 @@ class PComponent:
         '''
 
         self.total_input_reqs += 1
-        min_available_cycle = min(self.available_cycles)
-        min_available_idx = self.available_cycles.index(min_available_cycle)
+        min_available_cycle = self.available_cycles[0]
 
         if curr_cycle >= min_available_cycle:
             # it's available, use it after waiting for its latency!
-            self.available_cycles[min_available_idx] = curr_cycle + self.latency # set the availability for next users
+            heapq.heapreplace(self.available_cycles, curr_cycle + self.latency) # set the availability for next users
             return curr_cycle + self.latency
 
         # it's not available, wait until it gets ready, then wait for the lantecy
         wait_time = min_available_cycle - curr_cycle
         self.total_wait_cycles += wait_time
-        self.available_cycles[min_available_idx] += self.latency
+        self.wait_hist[min(wait_time.bit_length(), NUM_WAIT_BUCKETS - 1)] += 1
+        heapq.heapreplace(self.available_cycles, min_available_cycle + self.latency)
         return min_available_cycle + self.latency
 
 
     def get_wait_cycles(self, curr_cycle):
-        min_available_cycle = min(self.available_cycles)
+        min_available_cycle = self.available_cycles[0]
         return max(min_available_cycle - curr_cycle, 0)
 
 
     def allocate_timed(self, curr_cycle, lat):
         # return the wait time
-        min_available_cycle = min(self.available_cycles)
-        min_available_idx = self.available_cycles.index(min_available_cycle)
-        self.available_cycles[min_available_idx] = max(min_available_cycle, curr_cycle) + lat
+        min_available_cycle = self.available_cycles[0]
+        heapq.heapreplace(self.available_cycles, max(min_available_cycle, curr_cycle) + lat)
+        self.timed_busy_cycles += lat
 
 
+    def record(self, wait_time):
+        # counts a request that waited `wait_time` cycles, for engines that
+        # schedule the entries themselves (see event_engine.py)
+        self.total_input_reqs += 1
+        if wait_time:
+            self.total_wait_cycles += wait_time
+            self.wait_hist[min(wait_time.bit_length(), NUM_WAIT_BUCKETS - 1)] += 1
+
 
     def __repr__(self):
-        return f'name:{self.name}, latency:{self.latency}, input_buffer_size:{self.input_buffer_size}, available_cycles:{self.available_cycles}, total_input_reqs:{self.total_input_reqs}, total_wait_cycles:{self.total_wait_cycles}'
+        return f'name:{self.name}, latency:{self.latency}, input_buffer_size:{self.input_buffer_size}, available_cycles:{sorted(self.available_cycles)}, total_input_reqs:{self.total_input_reqs}, total_wait_cycles:{self.total_wait_cycles}'
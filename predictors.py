@@ -0,0 +1,287 @@
+'''
+Branch direction predictors of the BranchUnit
+
+The BTB decides whether a branch can be predicted taken at all: a branch
+missing from it has no target and is predicted not taken. For a branch in the
+BTB, the predictor gives the direction. Every predictor implements
+
+    predict(pc, idx)            True for taken; idx is the branch's BTB index
+    update(pc, idx, taken, hit) after the branch resolves; hit tells whether
+                                it was in the BTB (it is now)
+    state() / load_state(data)  its whole state as bytes, for checkpoints and
+                                steady-state fingerprints
+
+and is selected from the config by `branch_predictor` (PREDICTORS), with
+`bp_table_bits` (log2 of the counter table sizes) and `bp_history_bits`
+(branch history length) as parameters:
+
+    bimodal     the 2-bit counter of every BTB entry, set to weakly taken when
+                the entry is allocated (the original BTB behaviour)
+    gshare      2-bit counters indexed by the pc xor the global history
+    local       per-branch histories indexing a table of 2-bit counters
+    tage        a bimodal base table and four tagged tables indexed with
+                global histories of geometric lengths up to bp_history_bits;
+                the longest matching table predicts
+'''
+
+import struct
+import sys
+from array import array
+
+
+CONFIG_KEYS = ('branch_predictor', 'bp_table_bits', 'bp_history_bits')   # all optional
+DEFAULT_TABLE_BITS = 10
+DEFAULT_HISTORY_BITS = 16
+LITTLE_ENDIAN = sys.byteorder == 'little'     # the states are little endian
+
+
+def fold(history, length, bits):
+    # xor-folds the `length` bit history into `bits` bits; also on uint64 arrays
+    folded = 0
+    while length > 0:
+        folded = folded ^ (history & ((1 << bits) - 1))
+        history = history >> bits
+        length -= bits
+    return folded
+
+
+def counter_update(table, idx, taken):
+    c = table[idx]
+    if taken:
+        if c < 3: table[idx] = c + 1
+    elif c > 0: table[idx] = c - 1
+
+
+class Bimodal:
+    def __init__(self, btb, table_bits=DEFAULT_TABLE_BITS, history_bits=DEFAULT_HISTORY_BITS):
+        self.btb = btb
+
+
+    def predict(self, pc, idx):
+        return self.btb.cnt[idx] >= 2
+
+
+    def update(self, pc, idx, taken, hit):
+        cnt = self.btb.cnt
+        if not hit: cnt[idx] = 2
+        elif taken:
+            if cnt[idx] < 3: cnt[idx] += 1
+        elif cnt[idx] > 0: cnt[idx] -= 1
+
+
+    def state(self):
+        return b''                  # the counters are part of the BTB state
+
+
+    def load_state(self, data):
+        pass
+
+
+class Gshare:
+    def __init__(self, btb, table_bits=DEFAULT_TABLE_BITS, history_bits=DEFAULT_HISTORY_BITS):
+        self.table_bits = table_bits
+        self.history_bits = history_bits
+        self.history_mask = (1 << history_bits) - 1
+        self.mask = (1 << table_bits) - 1
+        self.counters = bytearray(b'\x01' * (1 << table_bits))      # weakly not taken
+        self.history = self.folded = 0
+
+
+    def index(self, pc):
+        return ((pc >> 2) ^ self.folded) & self.mask
+
+
+    def predict(self, pc, idx):
+        return self.counters[self.index(pc)] >= 2
+
+
+    def update(self, pc, idx, taken, hit):
+        counter_update(self.counters, self.index(pc), taken)
+        self.history = ((self.history << 1) | taken) & self.history_mask
+        self.folded = fold(self.history, self.history_bits, self.table_bits)
+
+
+    def state(self):
+        return struct.pack('<Q', self.history) + bytes(self.counters)
+
+
+    def load_state(self, data):
+        self.history = struct.unpack_from('<Q', data)[0]
+        self.folded = fold(self.history, self.history_bits, self.table_bits)
+        self.counters[:] = data[8:]
+
+
+class Local:
+    def __init__(self, btb, table_bits=DEFAULT_TABLE_BITS, history_bits=DEFAULT_HISTORY_BITS):
+        self.table_bits = table_bits
+        self.history_bits = history_bits
+        self.history_mask = (1 << history_bits) - 1
+        self.mask = (1 << table_bits) - 1
+        self.histories = array('Q', bytes(8 << table_bits))
+        self.folded = array('L', bytes(array('L').itemsize << table_bits))    # of every history
+        self.counters = bytearray(b'\x01' * (1 << table_bits))
+
+
+    def index(self, pc):
+        return self.folded[(pc >> 2) & self.mask]
+
+
+    def predict(self, pc, idx):
+        return self.counters[self.index(pc)] >= 2
+
+
+    def update(self, pc, idx, taken, hit):
+        h = (pc >> 2) & self.mask
+        counter_update(self.counters, self.folded[h], taken)
+        self.histories[h] = history = ((self.histories[h] << 1) | taken) & self.history_mask
+        self.folded[h] = fold(history, self.history_bits, self.table_bits)
+
+
+    def state(self):
+        histories = array('Q', self.histories)
+        if not LITTLE_ENDIAN: histories.byteswap()
+        return histories.tobytes() + bytes(self.counters)
+
+
+    def load_state(self, data):
+        n = 8 << self.table_bits
+        histories = array('Q', data[:n])
+        if not LITTLE_ENDIAN: histories.byteswap()
+        self.histories = histories
+        self.folded = array('L', [fold(x, self.history_bits, self.table_bits) for x in histories])
+        self.counters[:] = data[n:]
+
+
+class Tage:
+    NUM_TABLES = 4
+    TAG_BITS = 8
+
+    def __init__(self, btb, table_bits=DEFAULT_TABLE_BITS, history_bits=DEFAULT_HISTORY_BITS):
+        self.table_bits = table_bits
+        self.history_bits = history_bits
+        self.lengths = [max(1, history_bits >> (self.NUM_TABLES - 1 - i)) for i in range(self.NUM_TABLES)]
+        self.base = bytearray(b'\x01' * (1 << table_bits))
+        size = 1 << table_bits
+        self.tags = [array('H', bytes(2 * size)) for _ in range(self.NUM_TABLES)]
+        self.counters = [bytearray(b'\x03' * size) for _ in range(self.NUM_TABLES)]    # 3-bit, 3/4 is weak
+        self.useful = [bytearray(size) for _ in range(self.NUM_TABLES)]
+        self.mask = size - 1
+        self.history = self.tick = 0
+        self.folds = {}                 # history -> (index folds, tag folds), bounded
+        self.fold_history()
+
+
+    def fold_history(self):
+        # the history of every table folded for its index and for its tag
+        self.last = None                # the last lookup, reused by the update of the same branch
+        folds = self.folds.get(self.history)
+        if folds is None:
+            if len(self.folds) >= 1 << 12: self.folds.clear()
+            histories = [self.history & ((1 << length) - 1) for length in self.lengths]
+            self.folds[self.history] = folds = (
+                [fold(h, n, self.table_bits) ^ (t << 3) for t, (h, n) in enumerate(zip(histories, self.lengths))],
+                [fold(h, n, self.TAG_BITS) * 3 for h, n in zip(histories, self.lengths)])
+        self.index_folds, self.tag_folds = folds
+
+
+    def lookup(self, pc):
+        # (index, tag) of every table, and the matching tables, longest last
+        last = self.last
+        if last is not None and last[0] == pc: return last[1], last[2]
+        p = pc >> 2
+        mask = self.mask
+        tag_mask = (1 << self.TAG_BITS) - 1
+        slots, hits = [], []
+        for t in range(self.NUM_TABLES):
+            idx = (p ^ self.index_folds[t]) & mask
+            tag = ((p ^ self.tag_folds[t]) & tag_mask) | 0x100
+            slots.append((idx, tag))
+            if self.tags[t][idx] == tag: hits.append(t)
+        self.last = pc, slots, hits
+        return slots, hits
+
+
+    def predict(self, pc, idx):
+        slots, hits = self.lookup(pc)
+        if not hits: return self.base[(pc >> 2) & self.mask] >= 2
+        t = hits[-1]
+        return self.counters[t][slots[t][0]] >= 4
+
+
+    def update(self, pc, idx, taken, hit):
+        slots, hits = self.lookup(pc)
+        base_idx = (pc >> 2) & self.mask
+        if hits:
+            t = hits[-1]
+            i = slots[t][0]
+            predicted = self.counters[t][i] >= 4
+            alt = self.counters[hits[-2]][slots[hits[-2]][0]] >= 4 if len(hits) > 1 else self.base[base_idx] >= 2
+            c = self.counters[t][i]
+            self.counters[t][i] = min(c + 1, 7) if taken else max(c - 1, 0)
+            if predicted != alt:
+                u = self.useful[t][i]
+                self.useful[t][i] = min(u + 1, 3) if predicted == taken else max(u - 1, 0)
+        else:
+            t = -1
+            predicted = self.base[base_idx] >= 2
+            counter_update(self.base, base_idx, taken)
+
+        if predicted != taken and t < self.NUM_TABLES - 1:
+            # allocate in a longer table, in the first entry that is not useful
+            for longer in range(t + 1, self.NUM_TABLES):
+                i, tag = slots[longer]
+                if self.useful[longer][i] == 0:
+                    self.tags[longer][i] = tag
+                    self.counters[longer][i] = 4 if taken else 3
+                    break
+            else:
+                for longer in range(t + 1, self.NUM_TABLES):
+                    i = slots[longer][0]
+                    self.useful[longer][i] -= 1
+
+        self.tick += 1
+        if self.tick % (256 << self.table_bits) == 0:      # age the useful counters
+            for u in self.useful:
+                u[:] = bytes(x >> 1 for x in u)
+        self.history = ((self.history << 1) | taken) & ((1 << self.history_bits) - 1)
+        self.fold_history()
+
+
+    def state(self):
+        data = struct.pack('<QQ', self.history, self.tick) + bytes(self.base)
+        for t in range(self.NUM_TABLES):
+            tags = array('H', self.tags[t])
+            if not LITTLE_ENDIAN: tags.byteswap()
+            data += tags.tobytes() + bytes(self.counters[t]) + bytes(self.useful[t])
+        return data
+
+
+    def load_state(self, data):
+        self.history, self.tick = struct.unpack_from('<QQ', data)
+        size = 1 << self.table_bits
+        pos = 16
+        self.base[:] = data[pos:pos + size]
+        pos += size
+        for t in range(self.NUM_TABLES):
+            tags = array('H', data[pos:pos + 2 * size])
+            if not LITTLE_ENDIAN: tags.byteswap()
+            self.tags[t] = tags
+            pos += 2 * size
+            self.counters[t][:] = data[pos:pos + size]
+            pos += size
+            self.useful[t][:] = data[pos:pos + size]
+            pos += size
+        self.fold_history()
+
+
+PREDICTORS = {'bimodal': Bimodal, 'gshare': Gshare, 'local': Local, 'tage': Tage}
+
+
+def check_params(name, table_bits, history_bits):
+    assert name in PREDICTORS, f'Unknown branch predictor {name}; one of {sorted(PREDICTORS)}'
+    assert 0 < table_bits <= 24 and 0 < history_bits <= 64, 'bp_table_bits must be in 1..24 and bp_history_bits in 1..64'
+
+
+def make_predictor(name, btb, table_bits=DEFAULT_TABLE_BITS, history_bits=DEFAULT_HISTORY_BITS):
+    check_params(name, table_bits, history_bits)
+    return PREDICTORS[name](btb, table_bits, history_bits)
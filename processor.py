@@ -2,58 +2,261 @@
 The processor & memory
 '''
 
+import itertools
 import json
 import os, sys
 from parser import *
 from instruction import *
 from rf import *
 from pipelined_component import *
+from functional_units import *
 from scoreboard import *
 from branch_unit import *
+from data_cache import DataCache
+from func_engine import FuncEngine
+from event_engine import EventEngine
+from pc_profile import *
+from memory import Memory
+from metrics import *
+from event_trace import *
+from steady_state import SteadyState
+
+
+TIMING_ENGINES = ('analytic', 'event')     # see run_instruction and event_engine.py
+# untraced functional runs are interpreted for this many instructions before
+# switching to compiled blocks, which only pay for their compilation on
+# longer runs (see iter_func)
+INTERP_INSTRS = 1000
+
+
+def load_config(cfg_file):
+    with open(cfg_file) as f: return json.load(f)
 
 
 class Processor:
-    def __init__(self, cfg_file, input_file):
-        self.parser = Parser(input_file)
-        self.mem = {}
+    def __init__(self, cfg_file, input_file, streaming=False, mem_images=(), trace_level=LEVEL_OFF, trace_sink=None):
+        '''
+        `mem_images` lists (path, base address) memory images loaded on top of
+        the memory content of the input code (see Memory.load_image). The run
+        is traced at `trace_level` into `trace_sink` (see event_trace.py)
+        '''
+        self.setup(load_config(cfg_file), Parser(input_file))
+        for path, base in mem_images:
+            self.mem.load_image(path, base)
+        self.set_event_trace(trace_level, trace_sink)
+        self.simulate(verbose=False, streaming=streaming)
+
+
+    @classmethod
+    def from_config(cls, cfg, parser, branch_record=None, mem_record=None):
+        '''
+        Builds a processor from a config dict (the config file schema) and an
+        already parsed program without running any simulation. Passing the
+        `branch_record` (and, with a data cache, the `mem_record`) of an
+        earlier functional run allows calling `simulate_timing` directly
+        '''
+        proc = cls.__new__(cls)
+        proc.setup(cfg, parser)
+        if branch_record is not None: proc.branch_record = branch_record
+        if mem_record is not None: proc.mem_record = mem_record
+        return proc
+
+
+    def setup(self, cfg, parser):
+        self.parser = parser
+        self.cfg = cfg
+        if cfg is not None: self.initialize_components(cfg)   # None: functional simulation only
+        self.scoreboard = Scoreboard(len(parser.get_register_names()))
+        self.collect_metrics = True
+        self.events = None
+        self.extrapolate = True         # jump over repeating loop iterations (see steady_state.py)
+        self.engine = 'analytic'        # timing engine, one of TIMING_ENGINES
+        self.profile = None             # per-pc cycle attribution (see set_profile)
+        self.initialize_state()
+
+
+    def reset(self, cfg=None, parser=None):
+        '''
+        Returns to the state of a new processor for `parser`'s program under
+        `cfg` (by default, the program and config of the last run) without
+        building the components, the scoreboard and the BTB again: they are
+        cleared in place. Memory and registers start afresh from the program
+        '''
+        if parser is not None: self.parser = parser
+        if cfg is not None: self.cfg = cfg
+        if self.cfg is not None: self.initialize_components(self.cfg)
+        self.scoreboard.reset(len(self.parser.get_register_names()))
+        if self.profile is not None: self.set_profile()
+        self.initialize_state()
+
+
+    def initialize_state(self):
+        self.mem = Memory()
         self.regfile = {}
         self.initialize_memory(self.parser.get_mem_initialization())
-        self.rf = RegisterFile()
-        self.initialize_components(cfg_file)
+        self.rf = RegisterFile(self.parser.get_register_names())
         self.branch_record = []
-        self.scoreboard = Scoreboard()
-        self.simulate_func(verbose=True)
-        self.simulate_timing(verbose=True)
+        # addresses of the fld/fsd of the functional run, recorded when a list
+        # (with a data cache, or set by the caller)
+        self.mem_record = [] if getattr(self, 'dcache', None) is not None else None
+        self.num_committed = 0
+        self.pc = 0                     # where the functional simulation resumes
+        self.num_branches = 0           # branches it executed so far
+        self.timing_pc = 0              # where the timing model resumes (see simulate_timing)
+        self.timing_cycle = 0
+        self.timing_exec_cycles = 0
+        self.timing_committed = 0       # committed instructions before timing cycle 0
+        self.pending_outcomes = []
+        self.pending_addresses = []
+        self.metrics = Metrics()
+        self.steady = None
+
+
+    def set_event_trace(self, level, sink=None):
+        '''
+        Traces the following runs at `level` into `sink` (text on stdout by
+        default); LEVEL_OFF removes the trace
+        '''
+        if level == LEVEL_OFF: self.events = None
+        else: self.events = EventTrace(level, sink if sink is not None else TextSink(), self.parser.get_decoded())
+
+
+    def set_profile(self, on=True):
+        '''
+        Starts attributing the cycles of the following timing runs to the
+        static instructions, in a new PCProfile (see pc_profile.py); with `on`
+        False, stops. A reset clears the profile
+        '''
+        self.profile = PCProfile(len(self.parser.get_decoded())) if on else None
+
+
+    def event_trace(self, verbose, level):
+        # the trace if it wants the events of `level`; verbose runs without a
+        # trace get the full one on stdout
+        if self.events is None and verbose: self.set_event_trace(LEVEL_STATE)
+        if self.events is None or self.events.level < level: return None
+        return self.events
 
 
     def initialize_memory(self, mem_code):
-        for k, v in mem_code:
-            self.mem[int(k)] = float(v)
+        self.mem.load_text(mem_code)
 
 
-    def initialize_components(self, cfg_file):
-        with open(cfg_file) as f: cfg = json.load(f)
+    def initialize_components(self, cfg):
         self.NF = cfg['NF']
         self.NI = cfg['NI']
         self.NW = cfg['NW']
         self.NR = cfg['NR']
         self.NB = cfg['NB']
-        self.decoder = PComponent('Decoder', 1, self.NI)
-        self.ex_INT = PComponent('INT', cfg['INT_latency'], cfg['INT_RS'])
-        self.ex_LD = PComponent('LD', cfg['LD_latency'], cfg['LD_RS'])
-        self.ex_ST = PComponent('ST', cfg['ST_latency'], cfg['ST_RS'])
-        self.ex_FPadd = PComponent('FPadd', cfg['FPadd_latency'], cfg['FPadd_RS'])
-        self.ex_FPmult = PComponent('FPmult', cfg['FPmult_latency'], cfg['FPmult_RS'])
-        self.ex_FPdiv = PComponent('FPdiv', cfg['FPdiv_latency'], cfg['FPdiv_RS'])
-        self.ex_BU = PComponent('BU', cfg['BU_latency'], cfg['BU_RS'])
-        self.rob = PComponent('ROB', cfg['ROB_latency'], cfg['ROB_RS'])
+        self.decoder = self.component('decoder', 'Decoder', 1, self.NI)
+        self.pools, self.pool_of = build_pools(cfg, getattr(self, 'pools', ()))
+        self.rob = self.component('rob', 'ROB', cfg['ROB_latency'], cfg['ROB_RS'])
         self.cache_latency = cfg['cache_latency']
-        self.reg_rename = PComponent('RegRename', 0, cfg['num_physical_regs'])
-        self.branch_unit = BranchUnit(cfg['btb_entries'])
+        self.dcache = DataCache.from_config(cfg)
+        # latency an opcode adds to its unit's (the data cache for fld/fsd;
+        # with the cache model, that of an L1 hit, misses add to it)
+        data_latency = self.cache_latency if self.dcache is None else self.dcache.latencies[0]
+        self.access_latency = [data_latency if op in (OP_FLD, OP_FSD) else 0 for op in range(len(OPCODES))]
+        self.reg_rename = self.component('reg_rename', 'RegRename', 0, cfg['num_physical_regs'])
+        if getattr(self, 'branch_unit', None) is None: self.branch_unit = BranchUnit.from_config(cfg)
+        else: self.branch_unit.reset(cfg['btb_entries'], *predictor_params(cfg))
+
+
+    def component(self, attr, name, latency, input_buffer_size):
+        # the component already in `attr` (after a reset), cleared, or a new one
+        comp = getattr(self, attr, None)
+        if comp is None: return PComponent(name, latency, input_buffer_size)
+        comp.reset(latency, input_buffer_size)
+        return comp
+
+
+    def get_components(self):
+        return [self.decoder] + [u for pool in self.pools for u in pool.units] + [self.rob, self.reg_rename]
+
+
+    def simulate(self, verbose, streaming=False):
+        '''
+        Runs the functional simulation and then times it. With `streaming`,
+        both run together instead: the timing model pulls each branch outcome
+        from the functional engine as it needs it, so no branch record is kept
+        and timing starts right away. With a data cache, which needs the
+        address of every load and store as it times them, runs are not
+        streamed. Returns the total execution cycles
+        '''
+        if not streaming or self.dcache is not None:
+            self.simulate_func(verbose)
+            return self.simulate_timing(verbose)
+
+        outcomes = self.iter_func(verbose)
+        total_exec_cycles = self.simulate_timing(verbose, branch_outcomes=outcomes)
+        for _ in outcomes: pass     # finish the instructions after the last branch
+        return total_exec_cycles
+
+
+    def fast_forward(self, num_instrs, verbose=False, warm=False):
+        '''
+        Runs the program functionally until `num_instrs` instructions have
+        committed in total. The timing model then starts cold at that point,
+        or with `warm`, keeps its state and cycle as if the skipped
+        instructions took no time, with the BTB trained on their branches and
+        the data cache on their loads and stores
+        '''
+        hook = self.train_branch if warm else None
+        mem_hook = self.dcache.lookup if warm and self.dcache is not None else None
+        for _ in self.iter_func(verbose, limit=num_instrs - self.num_committed, branch_hook=hook, mem_hook=mem_hook): pass
+        self.timing_pc = self.pc
+        self.pending_outcomes = []
+        self.pending_addresses = []
+        if not warm:
+            self.timing_cycle, self.timing_exec_cycles = 0, 0
+            self.timing_committed = self.num_committed
+
+
+    def train_branch(self, pc, taken):
+        # the BTB update run_instruction makes for a branch
+        self.branch_unit.update_btb(pc, self.parser.get_decoded()[pc // 4].imm if taken else pc + 4, taken)
 
 
-    def simulate_timing(self, verbose):
-        code = self.parser.get_instructions()
+    def advance(self, num_instrs, verbose=False):
+        '''
+        Runs and times the program until `num_instrs` instructions have
+        committed in total. The timing model stops at the last fetch group
+        boundary before that point, so that resuming from there times the rest
+        exactly like an uninterrupted run
+        '''
+        addresses = [] if self.dcache is not None else None
+        outcomes = list(self.iter_func(verbose, limit=num_instrs - self.num_committed,
+                                       mem_hook=addresses.append if addresses is not None else None))
+        self.simulate_timing(verbose, branch_outcomes=outcomes, stop=(self.pc, len(self.pending_outcomes) + len(outcomes)),
+                             mem_addresses=addresses)
+
+
+    def simulate_timing(self, verbose, branch_outcomes=None, stop=None, mem_addresses=None):
+        '''
+        Times the program with the branch outcomes of the functional run, or
+        with `branch_outcomes`, any iterable of booleans (e.g. a replayed trace).
+        With a data cache, the loads and stores take their addresses in order
+        from `mem_addresses`, or by default from `mem_record`; those a fetch
+        group runs after a taken branch are off the committed path and take
+        the L1 hit latency without accessing the cache.
+        Timing starts at `timing_pc` and `timing_cycle` (0 unless resumed).
+        With `stop` = (pc, number of branch outcomes), timing stops before the
+        first fetch group that would run past that pc after that many outcomes;
+        `timing_*` then keep the point to resume from and `pending_outcomes`
+        (`pending_addresses`) the outcomes of the branches (the addresses of
+        the loads and stores) between there and the stop point, which the
+        next run takes first.
+
+        When the branch outcomes are a list (the functional run's record
+        included), loop iterations whose timing provably repeats are jumped
+        over analytically unless `extrapolate` is off or there is a data
+        cache; the result is the same.
+
+        With `engine` 'event', the event-driven engine times the run instead,
+        from an empty pipeline at `timing_pc` and `timing_cycle`; it has no
+        `stop`
+        '''
+        code = self.parser.get_decoded()
         num_code_lines = len(code)
 
         bottleneck_width = min(self.NF, self.NI, self.NW, self.NR, self.NB)
@@ -63,57 +266,136 @@ class Processor:
             l_end = min(l_begin + num, num_code_lines)
             return code[l_begin:l_end]
 
-        pc = 0
-        curr_cycle = 0
-        total_exec_cycles = 0
+        pc = self.timing_pc
+        curr_cycle = self.timing_cycle
+        total_exec_cycles = self.timing_exec_cycles
         self.branch_idx = 0
+        self.metrics = Metrics()
+        self.stats = stats = self.metrics.counters if self.collect_metrics else None
+        events = self.event_trace(verbose, LEVEL_INFO)
+        instr_events = events if events is not None and events.level >= LEVEL_INSTR else None
+
+        source = self.branch_record if branch_outcomes is None else branch_outcomes
+        self.branch_iter = iter(source)
+        self.steady = steady = None
+        if self.extrapolate and self.engine == 'analytic' and isinstance(source, list) and stop is None and instr_events is None \
+           and self.dcache is None:
+            self.steady = steady = SteadyState(self, self.pending_outcomes + source if self.pending_outcomes else source)
+        if self.pending_outcomes:
+            self.branch_iter = itertools.chain(self.pending_outcomes, self.branch_iter)
+            self.pending_outcomes = []
+        addresses = self.mem_record if mem_addresses is None else mem_addresses
+        self.addr_iter = iter(addresses if addresses is not None else ())
+        if self.pending_addresses:
+            self.addr_iter = itertools.chain(self.pending_addresses, self.addr_iter)
+            self.pending_addresses = []
+        if self.engine == 'event':
+            assert stop is None, 'The event-driven engine only times whole runs'
+            total_exec_cycles = max(total_exec_cycles, EventEngine(self).run(pc, curr_cycle, self.branch_iter, stats, instr_events,
+                                                                             self.addr_iter))
+            if events is not None:
+                events.emit((EV_DONE, total_exec_cycles))
+                events.flush()
+            self.branch_iter = self.addr_iter = None
+            self.total_exec_cycles = total_exec_cycles
+            return total_exec_cycles
+        num_groups = num_fetched = penalty_cycles = 0
         while True:
+            if stop is not None and pc <= stop[0] < pc + 4 * min(self.NF, bottleneck_width) \
+               and self.branch_idx + sum(d.opcode == OP_BNE for d in code[pc // 4:stop[0] // 4]) == stop[1]:
+                # this fetch group reaches past the stop point
+                self.timing_pc, self.timing_cycle, self.timing_exec_cycles = pc, curr_cycle, total_exec_cycles
+                self.pending_outcomes = list(self.branch_iter)
+                self.pending_addresses = list(self.addr_iter)
+                break
             curr_cycle += self.cache_latency    # instruction cache
-            fetched_instrs_str = fetch_instructions(pc, min(self.NF, bottleneck_width))
+            fetched_instrs = fetch_instructions(pc, min(self.NF, bottleneck_width))
 
-            if len(fetched_instrs_str) == 0:
-                if verbose: print(f'execution done. total_exec_cycles={total_exec_cycles}')
+            if len(fetched_instrs) == 0:
+                if events is not None: events.emit((EV_DONE, total_exec_cycles))
                 break
 
-            next_pc = pc + 4 * len(fetched_instrs_str)
-            for i, instr_str in enumerate(fetched_instrs_str):
-                npc, instr, branch_mispred_stall = self.run_instruction(instr_str, pc + 4*i, curr_cycle, verbose)
+            if steady is not None and pc in steady.targets:
+                jump = steady.visit(pc, curr_cycle, total_exec_cycles, self.branch_idx,
+                                    [num_groups, num_fetched, penalty_cycles] + (stats if stats is not None else []))
+                if jump is not None:
+                    shift, num_outcomes, deltas = jump
+                    if total_exec_cycles > curr_cycle: total_exec_cycles += shift
+                    curr_cycle += shift
+                    self.branch_idx += num_outcomes
+                    next(itertools.islice(self.branch_iter, num_outcomes, num_outcomes), None)
+                    num_groups += deltas[0]
+                    num_fetched += deltas[1]
+                    penalty_cycles += deltas[2]
+                    for i, d in enumerate(deltas[3:]): stats[i] += d
+
+            next_pc = pc + 4 * len(fetched_instrs)
+            self.on_path = True         # no taken branch earlier in the fetch group
+            for i, decoded in enumerate(fetched_instrs):
+                npc, instr, branch_mispred_stall = self.run_instruction(decoded, curr_cycle, instr_events)
                 total_exec_cycles = max(total_exec_cycles, instr.get_retire_cycle())
 
                 if npc != pc + 4*i + 4:
-                    if verbose: print(f'Branch detected: pc:{pc}, npc:{npc}')
+                    if instr_events is not None: instr_events.emit((EV_REDIRECT, pc, npc))
                     next_pc = npc
+                    self.on_path = False
 
             pc = next_pc
             curr_cycle += branch_mispred_stall
-
-
-    def run_instruction(self, instr_str, pc, fetch_cycle, verbose):
+            num_groups += 1
+            num_fetched += len(fetched_instrs)
+            if branch_mispred_stall:
+                penalty_cycles += branch_mispred_stall
+                if self.profile is not None:
+                    self.profile.counters[decoded.pc >> 2][PROF_MISPREDICT] += branch_mispred_stall
+
+        if stats is not None:
+            stats[FETCH_GROUPS] = num_groups
+            stats[FETCHED_INSTRS] = num_fetched
+            stats[BRANCHES] = self.branch_idx
+            stats[MISPREDICT_PENALTY_CYCLES] = penalty_cycles
+        if events is not None: events.flush()
+        self.branch_iter = self.addr_iter = None
+        self.total_exec_cycles = total_exec_cycles
+        return total_exec_cycles
+
+
+    def run_instruction(self, decoded, fetch_cycle, events=None):
         '''
         This function runs the entire pipeline from fetch to retire. It returns
         an Instruction instance whose `curr_cycle` is the cycle at which the
         instruction retires.
 
+        `decoded` is the DecodedInstruction entry of the instruction and
         `fetch_cycle` is the cycle at which the instruction is already fetched
-        into the CPU pipeline; i.e., the L1i latency is passed
+        into the CPU pipeline; i.e., the L1i latency is passed. The cycles of
+        every stage are emitted to `events`, if given
         '''
-        instr = Instruction(pc, instr_str)
+        pc = decoded.pc
+        instr = Instruction.from_decoded(decoded)
         instr.set_fetch_cycle(fetch_cycle)
 
-        if verbose: print(instr)
-
         # Decode
         ccycle = fetch_cycle
 
+        stats = self.stats
         wait_time = 0   # reg rename
-        for i in range(len(instr.get_src_regs()) + len(instr.get_dest_regs())):
+        for i in range(len(decoded.src_ids) + len(decoded.dest_ids)):
             wait_time += self.reg_rename.get_wait_cycles(ccycle)
         ccycle += wait_time
+        if wait_time and stats is not None:
+            stats[RENAME_STALL_CYCLES] += wait_time
+            stats[RENAME_STALLED_INSTRS] += 1
+        rename_wait = wait_time
 
         wait_time = 0   # dependancy
-        for reg in instr.get_src_regs():
-            wait_time = max(wait_time, self.scoreboard.get_wait_cycles(reg, ccycle))
+        sb = self.scoreboard.sb
+        for reg in decoded.src_ids:
+            if sb[reg] - ccycle > wait_time: wait_time = sb[reg] - ccycle
         ccycle += wait_time
+        if wait_time and stats is not None:
+            stats[RAW_STALL_CYCLES] += wait_time
+            stats[RAW_STALLED_INSTRS] += 1
 
         decode_cycle = self.decoder.allocate(ccycle)
         instr.set_decode_cycle(decode_cycle)
@@ -121,33 +403,21 @@ class Processor:
         branch_mispred_stall = 0
 
         # Execute & Mem
-        operator = instr.get_operator()
-        exec_cycle = None
+        opcode = decoded.opcode
         next_pc = pc + 4
-        if operator in ['add', 'addi', 'slt']:
-            exec_cycle = self.ex_INT.allocate(decode_cycle)
-
-        elif operator == 'fld':
-            exec_cycle = self.ex_LD.allocate(decode_cycle) + self.cache_latency
-
-        elif operator == 'fsd':
-            exec_cycle = self.ex_ST.allocate(decode_cycle) + self.cache_latency
-
-        elif operator in ['fadd', 'fsub']:
-            exec_cycle = self.ex_FPadd.allocate(decode_cycle)
-
-        elif operator == 'fmul':
-            exec_cycle = self.ex_FPmult.allocate(decode_cycle)
-
-        elif operator == 'fdiv':
-            exec_cycle = self.ex_FPdiv.allocate(decode_cycle)
-
-        elif operator == 'bne':
-            exec_cycle = self.ex_BU.allocate(decode_cycle)
-            assert self.branch_idx < len(self.branch_record)
-            taken = self.branch_record[self.branch_idx]
+        exec_cycle = self.pool_of[opcode].pick().allocate(decode_cycle) + self.access_latency[opcode]
+        miss_cycles = 0
+        if self.dcache is not None and opcode in (OP_FLD, OP_FSD) and self.on_path:
+            addr = next(self.addr_iter, None)
+            assert addr is not None, 'Ran out of memory addresses'
+            miss_cycles = self.dcache.access(addr) - self.access_latency[opcode]
+            exec_cycle += miss_cycles
+
+        if opcode == OP_BNE:
+            taken = next(self.branch_iter, None)
+            assert taken is not None, 'Ran out of branch outcomes'
             self.branch_idx += 1
-            if taken: next_pc = int(instr.get_operands()[-1])
+            if taken: next_pc = decoded.imm
 
             # predict the branch
             predicted_taken = self.branch_unit.is_taken(pc)
@@ -158,140 +428,181 @@ class Processor:
                     mispredict = True
 
             if mispredict:
-                branch_mispred_stall = self.decoder.get_latency() + self.ex_BU.get_latency()
+                branch_mispred_stall = self.decoder.get_latency() + self.pool_of[OP_BNE].get_latency()
+                if stats is not None: stats[MISPREDICTS] += 1
 
             # train the branch unit
             self.branch_unit.update_btb(pc, next_pc, taken)
 
-        else:
-            assert False, f'Unrecognized operator:{operator}'
-
-        assert exec_cycle != None
         assert exec_cycle > decode_cycle
 
-        for reg in instr.get_dest_regs():
-            self.scoreboard.push(reg, exec_cycle)
+        for reg in decoded.dest_ids:
+            if exec_cycle > sb[reg]: sb[reg] = exec_cycle
 
         # allocate reg rename units retrospectively
-        for i in range(len(instr.get_src_regs()) + len(instr.get_dest_regs())):
+        for i in range(len(decoded.src_ids) + len(decoded.dest_ids)):
             self.reg_rename.allocate_timed(decode_cycle, exec_cycle - decode_cycle)
 
         instr.set_execute_cycle(exec_cycle)
 
         retire_cycle = self.rob.allocate(exec_cycle)
         instr.set_retire_cycle(retire_cycle)
+        if self.profile is not None:
+            prof = self.profile.counters[pc >> 2]
+            prof[PROF_COUNT] += 1
+            prof[PROF_RENAME] += rename_wait
+            prof[PROF_RAW] += wait_time
+            prof[PROF_DECODE] += decode_cycle - ccycle
+            prof[PROF_EXECUTE] += exec_cycle - decode_cycle
+            prof[PROF_RETIRE] += retire_cycle - exec_cycle
+            prof[PROF_DCACHE] += miss_cycles
+        if events is not None: events.emit((EV_INSTR, pc, fetch_cycle, decode_cycle, exec_cycle, retire_cycle))
 
         return next_pc, instr, branch_mispred_stall
 
 
 
-    def simulate_func(self, verbose):
-        code = self.parser.get_instructions()
-        pc = 0
-        while pc / 4 < len(code):
-            if verbose: print(self)
-            if verbose: print('-'*10)
-
-            line_num = pc // 4
-            instr_str = code[line_num]
+    def simulate_func(self, verbose, trace_writer=None, mode=None):
+        '''
+        Runs the program functionally and records the branch outcomes, and the
+        load/store addresses if `mem_record` is a list. With a `trace_writer`
+        (see exec_trace.py), every committed instruction is also written to the
+        trace along with its branch outcome or memory address
+        '''
+        mem_hook = self.mem_record.append if self.mem_record is not None else None
+        self.branch_record.extend(self.iter_func(verbose, trace_writer, mode, mem_hook=mem_hook))
 
-            instr = Instruction(pc, instr_str)
-            operator = instr.get_operator()
-            operands = instr.get_operands()
-            operand_types = instr.get_operand_types()
 
-            if verbose: print(instr_str)
-            if verbose: print('-'*10)
+    def iter_func(self, verbose, trace_writer=None, mode=None, limit=None, branch_hook=None, mem_hook=None):
+        '''
+        Returns a generator running the program functionally from `pc`, for at
+        most `limit` instructions, which yields the outcome of each branch as
+        soon as it executes (and passes its pc and outcome to `branch_hook`,
+        and the address of every load and store to `mem_hook`, if given).
+        `mode` selects the
+        engine: 'interp' interprets the decoded table and is the only one that
+        emits events, 'closure' and 'block' use the compiled FuncEngine, and
+        'auto' interprets the first INTERP_INSTRS instructions and runs the
+        rest on compiled basic blocks. By default, traced runs are interpreted
+        and the others run 'auto'
+        '''
+        events = self.event_trace(verbose, LEVEL_INFO)
+        if mode is None: mode = 'interp' if events is not None else 'auto'
+        if mode == 'interp': return self.interpret_func(events, trace_writer, limit, branch_hook, mem_hook)
+        if mode == 'auto': return self.auto_func(trace_writer, limit, branch_hook, mem_hook)
+        return self.run_func_engine(mode, trace_writer, limit, branch_hook, mem_hook)
+
+
+    def auto_func(self, trace_writer, limit, branch_hook, mem_hook):
+        start = self.num_committed
+        first = INTERP_INSTRS if limit is None else min(limit, INTERP_INSTRS)
+        yield from self.interpret_func(None, trace_writer, first, branch_hook, mem_hook)
+        done = self.num_committed - start
+        if self.pc // 4 < len(self.parser.get_decoded()) and (limit is None or done < limit):
+            yield from self.run_func_engine('block', trace_writer, None if limit is None else limit - done, branch_hook,
+                                            mem_hook)
+
+
+    def run_func_engine(self, mode, trace_writer, limit, branch_hook, mem_hook):
+        engine = FuncEngine(self.parser.get_decoded(), self.rf.values, self.mem, mode, trace_writer, self.pc // 4, branch_hook,
+                            mem_hook)
+        yield from engine.run(limit)
+        self.num_committed += engine.num_committed
+        self.num_branches += engine.num_branches
+        self.pc = 4 * engine.idx
+
+
+    def interpret_func(self, events, trace_writer, limit, branch_hook, mem_hook):
+        code = self.parser.get_decoded()
+        regs = self.rf.values
+        state_events = events if events is not None and events.level >= LEVEL_STATE else None
+        pc = self.pc
+        end = sys.maxsize if limit is None else self.num_committed + limit
+        while pc // 4 < len(code) and self.num_committed < end:
+            if state_events is not None: state_events.emit((EV_STATE, repr(self)))
+
+            decoded = code[pc // 4]
+            opcode = decoded.opcode
+
+            if state_events is not None: state_events.emit((EV_FUNC, decoded.pc))
             pc += 4
+            self.num_committed += 1
 
-            if operator == 'fld':
-                assert len(operands) == 2
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Memory]
-                m = re.search(r'(\d+)\((.*)\)', operands[1])
-                assert m
-                addr = int(m.group(1)) + self.rf.read(m.group(2))
+            if opcode == OP_FLD:
+                addr = decoded.imm + regs[decoded.rs1_id]
                 val = 0
-                if addr in self.mem.keys():
+                if addr in self.mem:
                     val = self.mem[addr]
+                elif events is not None:
+                    events.emit((EV_WARN, decoded.pc, WARN_UNINIT_LOAD, addr))
+                regs[decoded.rd_id] = val
+                if trace_writer: trace_writer.record_mem(decoded.pc, addr)
+                if mem_hook: mem_hook(addr)
+
+            elif opcode == OP_FSD:
+                addr = decoded.imm + regs[decoded.rs1_id]
+                self.mem[addr] = regs[decoded.rs2_id]
+                if trace_writer: trace_writer.record_mem(decoded.pc, addr)
+                if mem_hook: mem_hook(addr)
+
+            elif opcode == OP_ADD:
+                regs[decoded.rd_id] = regs[decoded.rs1_id] + regs[decoded.rs2_id]
+
+            elif opcode == OP_ADDI:
+                regs[decoded.rd_id] = regs[decoded.rs1_id] + decoded.imm
+
+            elif opcode == OP_SLT:
+                if regs[decoded.rs1_id] < regs[decoded.rs2_id]:
+                    regs[decoded.rd_id] = 1
                 else:
-                    if verbose: print(f'[Warn] addr:{addr} is not in memory... using 0 as the value')
-                self.rf.write(operands[0], val)
-
-            elif operator == 'fsd':
-                assert len(operands) == 2
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Memory]
-                m = re.search(r'(\d+)\((.*)\)', operands[1])
-                assert m
-                addr = int(m.group(1)) + self.rf.read(m.group(2))
-                self.mem[addr] = self.rf.read(operands[0])
-
-            elif operator == 'add':
-                assert len(operands) == 3
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Register, Instruction.OperandType.Register]
-                self.rf.write(operands[0], self.rf.read(operands[1]) + self.rf.read(operands[2]))
-
-            elif operator == 'addi':
-                assert len(operands) == 3
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Register, Instruction.OperandType.Immediate]
-                self.rf.write(operands[0], self.rf.read(operands[1]) + int(operands[2]))
-
-            elif operator == 'slt':
-                assert len(operands) == 3
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Register, Instruction.OperandType.Register]
-                if self.rf.read(operands[1]) < self.rf.read(operands[2]):
-                    self.rf.write(operands[0], 1)
-                else:
-                    self.rf.write(operands[0], 0)
-
-            elif operator == 'fadd':
-                assert len(operands) == 3
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Register, Instruction.OperandType.Register]
-                self.rf.write(operands[0], self.rf.read(operands[1]) + self.rf.read(operands[2]))
-
-            elif operator == 'fsub':
-                assert len(operands) == 3
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Register, Instruction.OperandType.Register]
-                self.rf.write(operands[0], self.rf.read(operands[1]) - self.rf.read(operands[2]))
-
-            elif operator == 'fmul':
-                assert len(operands) == 3
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Register, Instruction.OperandType.Register]
-                self.rf.write(operands[0], self.rf.read(operands[1]) * self.rf.read(operands[2]))
-
-            elif operator == 'fdiv':
-                assert len(operands) == 3
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Register, Instruction.OperandType.Register]
-                self.rf.write(operands[0], self.rf.read(operands[1]) / self.rf.read(operands[2]))
-
-            elif operator == 'bne':
-                assert len(operands) == 3
-                assert operand_types == [Instruction.OperandType.Register, Instruction.OperandType.Register, Instruction.OperandType.Immediate]
+                    regs[decoded.rd_id] = 0
+
+            elif opcode == OP_FADD:
+                regs[decoded.rd_id] = regs[decoded.rs1_id] + regs[decoded.rs2_id]
+
+            elif opcode == OP_FSUB:
+                regs[decoded.rd_id] = regs[decoded.rs1_id] - regs[decoded.rs2_id]
+
+            elif opcode == OP_FMUL:
+                regs[decoded.rd_id] = regs[decoded.rs1_id] * regs[decoded.rs2_id]
+
+            elif opcode == OP_FDIV:
+                regs[decoded.rd_id] = regs[decoded.rs1_id] / regs[decoded.rs2_id]
+
+            elif opcode == OP_BNE:
                 taken = False
-                if self.rf.read(operands[0]) != self.rf.read(operands[1]):
+                if regs[decoded.rs1_id] != regs[decoded.rs2_id]:
                     taken = True
-                    pc = int(operands[2])
+                    pc = decoded.imm
 
-                self.branch_record.append(taken)
+                if trace_writer: trace_writer.record_branch(decoded.pc, taken)
+                if branch_hook: branch_hook(decoded.pc, taken)
+                self.num_branches += 1
+                self.pc = pc
+                yield taken
+                continue
 
             else:
-                assert False, f'Unknown operator: {operator}'
+                assert False, f'Unknown operator: {decoded.operator}'
+
+            if trace_writer and opcode not in (OP_FLD, OP_FSD): trace_writer.record(decoded.pc)
 
-        if verbose: print(self)
-        if verbose: print('-'*10)
+        self.pc = pc
+        if state_events is not None: state_events.emit((EV_STATE, repr(self)))
+        if events is not None: events.flush()
 
 
     def __repr__(self):
-        return f'memory:\n{self.mem}\nrf:\n{self.rf}\nNF:{self.NF}, NI:{self.NI}, NW:{self.NW}, NR:{self.NR}, NB:{self.NB}\nDecoder:{self.decoder}\nexi_INT:{self.ex_INT}\nex_LD:{self.ex_LD}\nex_ST:{self.ex_ST}\nex_FPadd:{self.ex_FPadd}\nex_FPmult:{self.ex_FPmult}\nex_FPdiv:{self.ex_FPdiv}\nex_BU:{self.ex_BU}'
+        # the baseline labels: exi_INT, ex_LD, ex_ST, ... (pools of several units: exi_INT[0], ...)
+        units = ''.join(f'\n{"exi" if pool.name == "INT" else "ex"}_{u.get_name()}:{u}' for pool in self.pools for u in pool.units)
+        return f'memory:\n{self.mem}\nrf:\n{self.rf}\nNF:{self.NF}, NI:{self.NI}, NW:{self.NW}, NR:{self.NR}, NB:{self.NB}\nDecoder:{self.decoder}{units}'
+
+
+def parse_mem_image(spec):
+    path, _, base = spec.partition('@')
+    return path, int(base, 0) if base else 0
 
 
 if __name__ == '__main__':
-    if len(sys.argv[1:]) != 2:
-        print(f'Usage: {argv[0]} path/to/config/file path/to/input/code')
-        exit(1)
-
-    cfg_file = sys.argv[1]
-    input_code_file = sys.argv[2]
-    assert os.path.exists(cfg_file)
-    assert os.path.exists(input_code_file)
-    proc = Processor(cfg_file, input_code_file)
-    print(proc)
+    from simulator import main
+    main()
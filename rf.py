@@ -1,21 +1,54 @@
 '''
-Register file
+Register file: a flat list of register values indexed by the register ids of
+the program (see number_registers). The zero registers always read 0
 '''
 
+from instruction import ZERO_REGS, REG_SINK
+
 
 class RegisterFile:
-    def __init__(self):
-        self.rf = {}
+    def __init__(self, names=(None,)):
+        '''
+        `names` are the register names indexed by id, as Program keeps them
+        '''
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names) if i != REG_SINK}
+        self.values = [0] * len(self.names)
 
 
     def read(self, reg):
-        if reg not in self.rf.keys():
-            self.rf[reg] = 0
-        return self.rf[reg]
+        # by name, outside the hot paths (which index `values` with ids)
+        i = self.ids.get(reg)
+        return 0 if i is None else self.values[i]
 
 
     def write(self, reg, val):
-        self.rf[reg] = val
+        if reg in ZERO_REGS: return
+        i = self.ids.get(reg)
+        if i is None:
+            i = self.ids[reg] = len(self.names)
+            self.names.append(reg)
+            self.values.append(0)
+        self.values[i] = val
+
+
+    def items(self):
+        return [(name, self.values[i]) for i, name in enumerate(self.names) if i != REG_SINK]
+
+
+    def load(self, items):
+        '''
+        Sets every register to the (name, value) pairs of `items`, the others
+        to 0; `values` is updated in place
+        '''
+        self.values[:] = [0] * len(self.values)
+        for reg, val in items: self.write(reg, val)
+
+
+    @property
+    def rf(self):
+        # {name: value}, as the register file was kept before register ids
+        return dict(self.items())
 
 
     def __repr__(self):
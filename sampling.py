@@ -0,0 +1,140 @@
+'''
+Sampled simulation in the spirit of SMARTS: the program is split into units
+of `interval` instructions. Most of every unit runs on the fast functional
+engine, which keeps the BTB and the data cache trained (functional warming);
+its last `warmup` + `window` instructions run through the detailed timing
+model, and the cycles per instruction of the last `window` ones are
+measured. The total cycles are estimated as the mean CPI of the windows times
+the number of committed instructions, with a confidence interval from the
+spread of the window CPIs.
+
+    python sampling.py cfg.json path/to/input/code [--interval K] [--window W] [--warmup D]
+
+The estimate assumes the CPI of the program is stationary enough for
+`warmup` instructions of detailed timing to rebuild the pipeline state. It
+is flagged as unavailable, without a confidence interval, when a window's
+cycles overflow the float range, or when the windows show the timing model
+heading out of that steady state: fetch runs ahead of retirement, so the
+backlog of instructions between them grows by a fixed amount per window.
+Extrapolated to the end of the run, a backlog whose register operands need
+more than num_physical_regs rename entries means the full simulation ends up
+bound by compounding rename stalls, which no window sees. The confidence
+interval only covers the spread of the windows, not a bias of the warm-up.
+'''
+
+import argparse
+import math
+import os, sys
+from statistics import NormalDist, fmean, stdev
+
+from parser import Parser
+from processor import Processor, load_config
+
+
+class SampledResult:
+    def __init__(self, window_cpis, num_committed, num_detailed, confidence, rename_backlog=0, num_physical_regs=math.inf):
+        self.window_cpis = window_cpis
+        self.num_committed = num_committed
+        self.num_detailed = num_detailed        # instructions timed in detail, warm-up included
+        self.confidence = confidence
+        self.rename_backlog = rename_backlog    # rename entries of the backlog extrapolated to the end of the run
+
+        n = len(window_cpis)
+        finite = all(map(math.isfinite, window_cpis))
+        self.problem = None
+        if n < 2: self.problem = 'fewer than two windows'
+        elif not finite: self.problem = 'window cycles overflow the float range'
+        elif rename_backlog > num_physical_regs:
+            self.problem = (f'the fetch-to-retire backlog grows to {rename_backlog:.3g} rename entries by the end of the run, '
+                            f'past num_physical_regs={num_physical_regs}')
+        self.available = self.problem is None
+
+        self.cpi = fmean(window_cpis) if n and finite else math.nan
+        self.cpi_stdev = stdev(window_cpis) if n > 1 and finite else math.nan
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        self.cpi_half_width = z * self.cpi_stdev / math.sqrt(n) if self.available else math.nan
+        self.total_cycles = self.cpi * num_committed
+        self.total_cycles_half_width = self.cpi_half_width * num_committed
+
+
+    def ipc_interval(self):
+        low, high = self.cpi - self.cpi_half_width, self.cpi + self.cpi_half_width
+        return 1 / high, (1 / low if low > 0 else math.inf)
+
+
+    def samples_needed(self, relative_error=0.03):
+        '''
+        Number of windows needed for a confidence interval of
+        +-`relative_error` of the CPI, given the measured spread
+        '''
+        z = NormalDist().inv_cdf((1 + self.confidence) / 2)
+        return math.ceil((z * self.cpi_stdev / self.cpi / relative_error) ** 2)
+
+
+    def __repr__(self):
+        header = f'windows={len(self.window_cpis)}, committed_instrs={self.num_committed}, detailed_instrs={self.num_detailed}\n'
+        if not self.available:
+            return header + f'estimate unavailable: {self.problem} (mean window cpi={self.cpi:.6g})'
+        ipc_low, ipc_high = self.ipc_interval()
+        return (header +
+                f'total_cycles={self.total_cycles:.6g} +- {self.total_cycles_half_width:.3g} ({self.confidence:.0%} confidence)\n'
+                f'cpi={self.cpi:.6g} +- {self.cpi_half_width:.3g}, ipc in [{ipc_low:.6g}, {ipc_high:.6g}]')
+
+
+def window_cpi(cycles, instrs):
+    try:
+        return cycles / instrs
+    except OverflowError:       # cycle counts beyond the float range
+        return math.inf
+
+
+def simulate_sampled(cfg, parser, interval=10000, window=1000, warmup=2000, confidence=0.95):
+    '''
+    Sampled timing of `parser`'s program under `cfg`; returns a SampledResult
+    '''
+    assert 0 < window and 0 <= warmup and window + warmup <= interval, 'Need window + warmup <= interval'
+    proc = Processor.from_config(cfg, parser)
+    cpis = []
+    num_detailed = 0
+    window_cycles = lag_growth = 0      # summed over the windows
+    while True:
+        unit_end = proc.num_committed + interval
+        proc.fast_forward(unit_end - window - warmup, warm=True)
+        if proc.num_committed < unit_end - window - warmup: break         # the program ended
+
+        start = proc.num_committed
+        proc.advance(start + warmup)
+        begin_cycles, begin_instrs = proc.timing_exec_cycles, proc.num_committed
+        begin_lag = proc.timing_exec_cycles - proc.timing_cycle              # last retirement ahead of fetch
+        proc.advance(begin_instrs + window)
+        num_detailed += proc.num_committed - start
+        if proc.num_committed < unit_end: break                          # no full window left
+        cpis.append(window_cpi(proc.timing_exec_cycles - begin_cycles, proc.num_committed - begin_instrs))
+        window_cycles += proc.timing_exec_cycles - begin_cycles
+        lag_growth += proc.timing_exec_cycles - proc.timing_cycle - begin_lag
+
+    for _ in proc.iter_func(False): pass                                # count the rest of the program
+    # instructions fetched but not retired at the end of the run, if the
+    # backlog keeps growing by as much per cycle as in the windows
+    backlog = lag_growth / window_cycles * proc.num_committed if lag_growth > 0 else 0
+    decoded = parser.get_decoded()
+    operands = sum(len(d.src_ids) + len(d.dest_ids) for d in decoded) / len(decoded)
+    return SampledResult(cpis, proc.num_committed, num_detailed, confidence, backlog * operands, cfg['num_physical_regs'])
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Estimate the execution cycles from sampled detailed timing windows')
+    ap.add_argument('cfg_file', help='path/to/config/file')
+    ap.add_argument('input_file', help='path/to/input/code')
+    ap.add_argument('--interval', type=int, default=10000, help='instructions per sampling unit')
+    ap.add_argument('--window', type=int, default=1000, help='measured detailed instructions per unit')
+    ap.add_argument('--warmup', type=int, default=2000, help='detailed warm-up instructions before every window')
+    ap.add_argument('--confidence', type=float, default=0.95, help='confidence level of the intervals')
+    args = ap.parse_args()
+
+    assert os.path.exists(args.cfg_file)
+    assert os.path.exists(args.input_file)
+    result = simulate_sampled(load_config(args.cfg_file), Parser(args.input_file), args.interval, args.window,
+                              args.warmup, args.confidence)
+    print(result)
+    if result.available: print(f'windows needed for +-3% CPI: {result.samples_needed()}')
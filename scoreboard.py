@@ -1,19 +1,27 @@
 '''
-Scoreboard for handling dependancies among instructions
+Scoreboard for handling dependancies among instructions: the cycle at which
+every register, by id (see number_registers), is ready
 '''
 
 class Scoreboard:
-    def __init__(self):
-        self.sb = {}
+    def __init__(self, num_regs=0):
+        self.sb = [0] * num_regs
+
+
+    def reset(self, num_regs):
+        self.sb[:] = [0] * num_regs
 
 
     def push(self, reg, cycle):
-        if reg not in self.sb.keys():
-            self.sb[reg] = cycle
-        self.sb[reg] = max(cycle, self.sb[reg])
+        if cycle > self.sb[reg]: self.sb[reg] = cycle
 
 
     def get_wait_cycles(self, reg, curr_cycle):
-        if reg not in self.sb.keys(): return 0
-        ready_cycle = self.sb[reg]
-        return max(0, ready_cycle - curr_cycle)
+        return max(0, self.sb[reg] - curr_cycle)
+
+
+    def items(self):
+        '''
+        (id, ready cycle) of the registers written so far
+        '''
+        return [(reg, cycle) for reg, cycle in enumerate(self.sb) if cycle]
@@ -0,0 +1,373 @@
+'''
+Local simulation job server: accepts (program, config) jobs over HTTP on
+localhost (or a Unix socket), runs them on a pool of warm worker processes and
+streams the results back as they complete
+
+    python server.py [--port 8765 | --unix PATH] [--workers N] [--cache-dir DIR]
+    python server.py submit cfg.json code.txt [code2.txt ...] [--port 8765 | --unix PATH]
+
+Endpoints:
+    POST /jobs      {"jobs": [{"id": ..., "program": "<input code>", "config": {...}}, ...]}
+                    answers one JSON line per job, in completion order:
+                    {"id", "key", "cached", "result"} or {"id", "error"}
+    GET /metrics    queue depth, job counts, cache hits and latency percentiles
+    GET /health
+
+Every worker imports the simulator once and keeps a Simulator (reset in place
+between jobs, see simulator.py) and its recently assembled programs. Results
+are cached on disk under a hash of the normalised job: the assembled program
+(instructions with labels resolved, memory contents) and the config with
+every CoreConfig field filled in, so the same job comes back without running
+again whatever its comments, label names or omitted default parameters. The
+hash also covers RESULT_VERSION, so that results of an older simulator are
+not served. Identical jobs in flight at the same time run once.
+'''
+
+import argparse
+import asyncio
+import collections
+import hashlib
+import ipaddress
+import json
+import os, sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from assembler import Program
+from simulator import CoreConfig, Simulator
+
+
+DEFAULT_CACHE_DIR = os.environ.get('OOO_RESULT_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'ooo-sim', 'results'))
+MAX_REQUEST_BYTES = 64 * 2**20
+LATENCY_WINDOW = 4096           # jobs kept for the latency percentiles
+# part of every result cache key: bump it whenever a change to the simulator
+# changes the results of a job (cycles, metrics or architectural state)
+RESULT_VERSION = 1
+
+# per-worker state, set by init_worker
+worker_sim = None
+worker_programs = collections.OrderedDict()     # program key -> Program, most recent last
+WORKER_PROGRAMS = 16
+
+
+def allow_big_ints():
+    # cycle counts can outgrow the default limit on int <-> str conversions of json
+    if hasattr(sys, 'set_int_max_str_digits'): sys.set_int_max_str_digits(0)
+
+
+def init_worker():
+    global worker_sim
+    allow_big_ints()
+    worker_sim = Simulator()
+
+
+def run_job(program_key, source, cfg):
+    '''
+    Runs in a worker: simulates one job and returns its result dict
+    '''
+    program = worker_programs.pop(program_key, None)
+    if program is None: program = Program.from_text(source)
+    worker_programs[program_key] = program
+    if len(worker_programs) > WORKER_PROGRAMS: worker_programs.popitem(last=False)
+
+    begin = time.perf_counter()
+    r = worker_sim.run(program, cfg)
+    return {
+        'total_cycles': r.total_cycles,
+        'committed_instrs': r.committed_instrs,
+        'num_branches': r.num_branches,
+        'ipc': r.ipc,
+        'sim_seconds': time.perf_counter() - begin,
+        'metrics': r.metrics,
+        'registers': r.registers,
+    }
+
+
+def digest(*parts):
+    return hashlib.blake2b(json.dumps(parts, separators=(',', ':')).encode(), digest_size=20).hexdigest()
+
+
+def assemble_key(source):
+    # runs on a thread of the event loop's default executor: the normalised program key of `source`
+    program = Program.from_text(source)
+    return digest(program.instrs, program.mem_code)
+
+
+class ResultCache:
+    '''
+    Results as JSON files named after the job key
+    '''
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        if cache_dir is not None: os.makedirs(cache_dir, exist_ok=True)
+
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f'{key}.json')
+
+
+    def get(self, key):
+        if self.cache_dir is None: return None
+        try:
+            with open(self.path(key)) as f: return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def put(self, key, result):
+        if self.cache_dir is None: return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f: json.dump(result, f)
+        os.replace(tmp, path)
+
+
+class LatencyStats:
+    def __init__(self):
+        self.samples = collections.deque(maxlen=LATENCY_WINDOW)
+
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+
+    def summary(self):
+        if not self.samples: return {'count': 0}
+        s = sorted(self.samples)
+        pick = lambda q: s[min(int(q * len(s)), len(s) - 1)]
+        return {'count': len(s), 'p50_ms': pick(0.5) * 1e3, 'p90_ms': pick(0.9) * 1e3, 'p99_ms': pick(0.99) * 1e3,
+                'max_ms': s[-1] * 1e3}
+
+
+class JobServer:
+    def __init__(self, num_workers=None, cache_dir=DEFAULT_CACHE_DIR):
+        self.num_workers = num_workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(self.num_workers, initializer=init_worker)
+        self.cache = ResultCache(cache_dir)
+        self.in_flight = {}                 # job key -> future of its result
+        self.assembling = {}                # source digest -> future of its program key
+        self.program_keys = collections.OrderedDict()     # source digest -> normalised program key
+        self.started = time.time()
+        self.counters = collections.Counter()
+        self.latency = {'cached': LatencyStats(), 'simulated': LatencyStats()}
+        self.queue_wait = LatencyStats()
+
+
+    def warm_up(self):
+        # start every worker now rather than on the first jobs
+        for f in [self.pool.submit(time.sleep, 0.01) for _ in range(self.num_workers)]: f.result()
+
+
+    async def normalise(self, job):
+        '''
+        (job key, program key, config dict) of a job; the program is assembled
+        once per distinct source, off the event loop. Jobs of a source being
+        assembled wait for that assembly
+        '''
+        source = job['program']
+        source_key = hashlib.blake2b(source.encode(), digest_size=20).hexdigest()
+        program_key = self.program_keys.pop(source_key, None)
+        if program_key is None:
+            future = self.assembling.get(source_key)
+            if future is None:
+                future = asyncio.get_running_loop().run_in_executor(None, assemble_key, source)
+                self.assembling[source_key] = future
+                future.add_done_callback(lambda f: self.assembling.pop(source_key, None))
+            program_key = await asyncio.shield(future)
+        self.program_keys[source_key] = program_key
+        if len(self.program_keys) > 1024: self.program_keys.popitem(last=False)
+
+        cfg = CoreConfig.from_dict(job.get('config', {})).to_dict()
+        return digest(RESULT_VERSION, program_key, sorted(cfg.items())), program_key, cfg
+
+
+    async def run(self, job):
+        '''
+        The response line of one job
+        '''
+        begin = time.perf_counter()
+        self.counters['jobs'] += 1
+        line = {'id': job.get('id')}
+        try:
+            key, program_key, cfg = await self.normalise(job)
+        except (AssertionError, KeyError, TypeError, ValueError, AttributeError) as e:
+            self.counters['errors'] += 1
+            line['error'] = f'{type(e).__name__}: {e}'
+            return line
+
+        line['key'] = key
+        result = self.cache.get(key)
+        if result is not None:
+            self.counters['cache_hits'] += 1
+            self.latency['cached'].add(time.perf_counter() - begin)
+            return dict(line, cached=True, result=result)
+
+        future = self.in_flight.get(key)
+        if future is not None:
+            self.counters['coalesced'] += 1
+        else:
+            future = asyncio.get_running_loop().run_in_executor(self.pool, run_job, program_key, job['program'], cfg)
+            self.in_flight[key] = future
+            future.add_done_callback(lambda f: self.finish(key, f))
+        try:
+            result = await asyncio.shield(future)
+        except Exception as e:
+            self.counters['errors'] += 1
+            line['error'] = f'{type(e).__name__}: {e}'
+            return line
+        elapsed = time.perf_counter() - begin
+        self.latency['simulated'].add(elapsed)
+        self.queue_wait.add(max(elapsed - result['sim_seconds'], 0))
+        return dict(line, cached=False, result=result)
+
+
+    def finish(self, key, future):
+        # cached before leaving in_flight, so that no request misses both
+        if not future.cancelled() and future.exception() is None: self.cache.put(key, future.result())
+        del self.in_flight[key]
+
+
+    def metrics(self):
+        running = min(len(self.in_flight), self.num_workers)
+        return {
+            'uptime_s': time.time() - self.started,
+            'workers': self.num_workers,
+            'in_flight': len(self.in_flight),
+            'running': running,
+            'queue_depth': len(self.in_flight) - running,
+            'counters': dict(self.counters),
+            'latency': {kind: stats.summary() for kind, stats in self.latency.items()},
+            'queue_wait': self.queue_wait.summary(),
+        }
+
+
+    async def handle(self, reader, writer):
+        try:
+            request = await reader.readline()
+            method, path, _ = request.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').strip()
+                if not line: break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length', 0))
+            if length > MAX_REQUEST_BYTES: return await self.respond(writer, 413, {'error': 'request too large'})
+            body = await reader.readexactly(length) if length else b''
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            return await self.respond(writer, 400, {'error': 'malformed request'})
+
+        self.counters['requests'] += 1
+        if path == '/health' and method == 'GET': return await self.respond(writer, 200, {'ok': True})
+        if path == '/metrics' and method == 'GET': return await self.respond(writer, 200, self.metrics())
+        if path != '/jobs': return await self.respond(writer, 404, {'error': f'no such endpoint: {path}'})
+        if method != 'POST': return await self.respond(writer, 405, {'error': 'POST jobs'})
+        try:
+            jobs = json.loads(body)['jobs']
+            assert isinstance(jobs, list) and all(isinstance(j, dict) and isinstance(j.get('program'), str) for j in jobs)
+        except (ValueError, KeyError, TypeError, AssertionError):
+            return await self.respond(writer, 400, {'error': 'expected {"jobs": [{"program": ..., "config": ...}, ...]}'})
+
+        # stream one line per job as they complete
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n')
+        tasks = [asyncio.ensure_future(self.run(dict(job, id=job.get('id', i)))) for i, job in enumerate(jobs)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                writer.write(json.dumps(await task).encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass            # the client went away; the jobs still finish and fill the cache
+        finally:
+            writer.close()
+
+
+    async def respond(self, writer, status, body):
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large'}
+        data = json.dumps(body).encode()
+        writer.write(f'HTTP/1.1 {status} {reason[status]}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode() + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+def check_localhost(host):
+    assert host == 'localhost' or ipaddress.ip_address(host).is_loopback, f'{host} is not a loopback address'
+
+
+async def serve(host='127.0.0.1', port=8765, unix=None, num_workers=None, cache_dir=DEFAULT_CACHE_DIR):
+    if unix is None: check_localhost(host)
+    allow_big_ints()
+    server = JobServer(num_workers, cache_dir)
+    server.warm_up()
+    if unix is not None:
+        listener = await asyncio.start_unix_server(server.handle, unix)
+        where = unix
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+        where = f'http://{host}:{port}'
+    print(f'serving on {where} with {server.num_workers} workers, result cache {cache_dir}', flush=True)
+    try:
+        async with listener: await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def submit(jobs, host='127.0.0.1', port=8765, unix=None):
+    '''
+    Client side: posts `jobs` and yields the response lines as they arrive
+    '''
+    import http.client, socket
+    allow_big_ints()
+    body = json.dumps({'jobs': jobs})
+    if unix is not None:
+        conn = http.client.HTTPConnection('localhost')
+        conn.sock = socket.socket(socket.AF_UNIX)
+        conn.sock.connect(unix)
+    else:
+        check_localhost(host)
+        conn = http.client.HTTPConnection(host, port)
+    conn.request('POST', '/jobs', body, {'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    assert response.status == 200, response.read().decode()
+    for line in response:
+        yield json.loads(line)
+    conn.close()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['submit']:
+        ap = argparse.ArgumentParser(description='Submit jobs to a local simulation server')
+        ap.add_argument('cfg_file', help='path/to/config/file')
+        ap.add_argument('input_files', nargs='+', help='path/to/input/code')
+        ap.add_argument('--port', type=int, default=8765)
+        ap.add_argument('--unix', default=None, help='Unix socket of the server')
+        args = ap.parse_args(sys.argv[2:])
+        with open(args.cfg_file) as f: cfg = json.load(f)
+        jobs = []
+        for path in args.input_files:
+            with open(path) as f: jobs.append({'id': path, 'program': f.read(), 'config': cfg})
+        for line in submit(jobs, port=args.port, unix=args.unix):
+            if 'error' in line: print(f'{line["id"]}: {line["error"]}')
+            else: print(f'{line["id"]}: total_cycles={line["result"]["total_cycles"]} ipc={line["result"]["ipc"]:.6g} cached={line["cached"]}')
+        exit(0)
+
+    ap = argparse.ArgumentParser(description='Serve simulation jobs on localhost')
+    ap.add_argument('--host', default='127.0.0.1', help='loopback address to listen on')
+    ap.add_argument('--port', type=int, default=8765)
+    ap.add_argument('--unix', default=None, help='listen on this Unix socket instead')
+    ap.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    ap.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='directory of the result cache')
+    ap.add_argument('--no-cache', action='store_true', help='always simulate, without the result cache')
+    args = ap.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers, None if args.no_cache else args.cache_dir))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,199 @@
+'''
+Library API of the simulator, with every step separate: a Program is
+assembled once, a CoreConfig is built in memory, and a Simulator runs any
+program under any config and returns a SimResult. The processor behind a
+Simulator is reset in place between runs instead of being built again
+
+    from simulator import CoreConfig, Program, Simulator
+
+    program = Program.from_file('test1.txt')        # or Program.from_text(code)
+    base = CoreConfig.from_file('config1.json')     # or CoreConfig(NF=2, ...)
+    sim = Simulator()
+    for nf in [1, 2, 4]:
+        result = sim.run(program, base.replace(NF=nf))
+        print(nf, result.total_cycles, result.ipc)
+
+`python processor.py` is a thin command line wrapper around it (see main).
+'''
+
+import argparse
+import dataclasses
+import json
+import os, sys
+
+from assembler import Program
+from event_trace import *
+from processor import Processor, TIMING_ENGINES, parse_mem_image
+
+
+@dataclasses.dataclass(frozen=True)
+class CoreConfig:
+    '''
+    The parameters of the config files; defaults are those of config1.json,
+    the bimodal branch predictor and no data cache
+    '''
+    NF: int = 4
+    NI: int = 16
+    NW: int = 4
+    NR: int = 32
+    NB: int = 4
+    INT_latency: int = 1
+    INT_RS: int = 4
+    LD_latency: int = 1
+    LD_RS: int = 2
+    ST_latency: int = 1
+    ST_RS: int = 2
+    FPadd_latency: int = 3
+    FPadd_RS: int = 3
+    FPmult_latency: int = 4
+    FPmult_RS: int = 3
+    FPdiv_latency: int = 8
+    FPdiv_RS: int = 2
+    BU_latency: int = 1
+    BU_RS: int = 2
+    ROB_latency: int = 1
+    ROB_RS: int = 16
+    btb_entries: int = 16
+    num_physical_regs: int = 32
+    cache_latency: int = 1
+    branch_predictor: str = 'bimodal'       # see predictors.py
+    bp_table_bits: int = 10
+    bp_history_bits: int = 16
+    units: list = None                      # functional-unit pools (see functional_units.py); None: one unit per class
+    dcache_line: int = 64                   # data cache (see data_cache.py); l1d_size 0: fld/fsd take cache_latency
+    l1d_size: int = 0
+    l1d_assoc: int = 8
+    l1d_latency: int = 1
+    l2_size: int = 0
+    l2_assoc: int = 8
+    l2_latency: int = 10
+    mem_latency: int = 100
+
+
+    @classmethod
+    def from_dict(cls, cfg):
+        names = {f.name for f in dataclasses.fields(cls)}
+        unknown = sorted(set(cfg) - names)
+        assert not unknown, f'Unknown config parameters: {unknown}'
+        return cls(**cfg)
+
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f: return cls.from_dict(json.load(f))
+
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+
+class SimResult:
+    '''
+    Outcome of one run: cycles, instruction counts, the metrics report (see
+    metrics.py) and the final architectural state. It stays valid after the
+    simulator runs again
+    '''
+    def __init__(self, proc, config):
+        self.config = config
+        self.total_cycles = proc.total_exec_cycles
+        self.committed_instrs = proc.num_committed
+        self.num_branches = proc.num_branches
+        self.ipc = self.committed_instrs / self.total_cycles if self.total_cycles else 0
+        self.metrics = proc.metrics.report(proc) if proc.collect_metrics else None
+        self.profile = proc.profile.rows(proc) if proc.profile is not None else None     # see PCProfile.rows
+        self.registers = dict(proc.rf.items())
+        self.memory = proc.mem          # a reset gives the processor a new Memory
+
+
+    def __repr__(self):
+        return f'total_cycles={self.total_cycles}, committed_instrs={self.committed_instrs}, ipc={self.ipc:.6g}'
+
+
+class Simulator:
+    def __init__(self, trace_level=LEVEL_OFF, trace_sink=None, collect_metrics=True, extrapolate=True, engine='analytic',
+                 profile=False):
+        '''
+        Runs are traced at `trace_level` into `trace_sink` (see
+        event_trace.py); `extrapolate` is Processor.extrapolate and `engine`
+        the timing engine, one of TIMING_ENGINES. With `profile`, results
+        carry the per-pc cycle attribution of the run (see pc_profile.py)
+        '''
+        assert engine in TIMING_ENGINES, f'Unknown timing engine: {engine}'
+        self.trace_level = trace_level
+        self.trace_sink = trace_sink
+        self.collect_metrics = collect_metrics
+        self.extrapolate = extrapolate
+        self.engine = engine
+        self.profile = profile
+        self.processor = None           # of the last run, until the next one
+
+
+    def run(self, program, config, streaming=False, mem_images=()):
+        '''
+        Simulates `program` (a Program, or a Parser) under `config` (a
+        CoreConfig or a config dict) and returns a SimResult. `mem_images` lists
+        (path, base address) memory images loaded on top of the program's
+        memory content; `streaming` is as in Processor.simulate
+        '''
+        if not isinstance(config, CoreConfig): config = CoreConfig.from_dict(config)
+        cfg = config.to_dict()
+        if self.processor is None: self.processor = Processor.from_config(cfg, program)
+        else: self.processor.reset(cfg, program)
+        proc = self.processor
+        for path, base in mem_images:
+            proc.mem.load_image(path, base)
+        proc.collect_metrics = self.collect_metrics
+        proc.extrapolate = self.extrapolate
+        proc.engine = self.engine
+        proc.set_profile(self.profile)
+        proc.set_event_trace(self.trace_level, self.trace_sink)
+        proc.simulate(verbose=False, streaming=streaming)
+        return SimResult(proc, config)
+
+
+    def reset(self):
+        '''
+        Clears the processor of the last run in place, ready for the next one
+        '''
+        if self.processor is not None: self.processor.reset()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Simulate the input code on the configured out-of-order CPU')
+    ap.add_argument('cfg_file', help='path/to/config/file')
+    ap.add_argument('input_file', help='path/to/input/code')
+    ap.add_argument('--stream', action='store_true', help='run the functional and timing simulations together')
+    ap.add_argument('--engine', choices=TIMING_ENGINES, default='analytic',
+                    help='timing engine: per-instruction analytic schedule, or event-driven pipeline (see event_engine.py)')
+    ap.add_argument('--mem-image', action='append', default=[], type=parse_mem_image, metavar='PATH[@BASE]',
+                    help='load a raw float64 or .npy memory image at address BASE (default 0)')
+    ap.add_argument('--metrics', default=None, metavar='PATH', help='write the run statistics as JSON (or CSV if PATH ends with .csv)')
+    ap.add_argument('--profile', default=None, metavar='PREFIX',
+                    help='write the per-pc cycle attribution as an annotated listing (PREFIX.txt) and collapsed stacks (PREFIX.folded)')
+    ap.add_argument('-v', '--verbose', action='count', default=0,
+                    help='trace level: -v warnings, -vv timed instructions and fetch redirects, -vvv processor state before every functional instruction')
+    ap.add_argument('--trace-out', default=None, metavar='PATH',
+                    help='write the trace to PATH (JSONL if PATH ends with .jsonl) instead of stdout; implies -vv without -v')
+    args = ap.parse_args(argv)
+
+    assert os.path.exists(args.cfg_file)
+    assert os.path.exists(args.input_file)
+    level = min(args.verbose, LEVEL_STATE) if args.verbose or args.trace_out is None else LEVEL_INSTR
+    sink = open_sink(args.trace_out) if level != LEVEL_OFF else None
+    sim = Simulator(trace_level=level, trace_sink=sink, engine=args.engine, profile=args.profile is not None)
+    result = sim.run(Program.from_file(args.input_file), CoreConfig.from_file(args.cfg_file), args.stream, args.mem_image)
+    if sink is not None: sink.close()
+    print(f'execution done. total_exec_cycles={result.total_cycles}, ipc={result.ipc:.6g}')
+    print(sim.processor)
+    if args.metrics: sim.processor.metrics.write(args.metrics, sim.processor)
+    if args.profile:
+        with open(args.input_file) as f: source = f.read()
+        sim.processor.profile.write(args.profile, sim.processor, source, os.path.basename(args.input_file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+'''
+Steady-state detection for the timing model: jumps over loop iterations that
+provably repeat
+
+At the start of every fetch group at a backward branch target, the timing
+state is fingerprinted relative to the current fetch cycle: the
+`available_cycles` of every component, the scoreboard ready cycles and the
+total execution cycles (values at or below the fetch cycle all behave like
+"free now", since every later request comes at or after it, so they are
+dropped), plus the BTB and branch predictor state and the pc. When a
+fingerprint comes back after P branch outcomes and D cycles and the branch
+record keeps repeating those P outcomes for k more periods, the next k
+periods would replay the same groups D cycles later each time: the state is
+shifted by k * D cycles and the counters advanced by k times their growth over
+one period, and simulation goes on in detail from there. The result is identical to simulating every
+iteration.
+
+Fingerprints cost a pass over all the component entries, so a target that
+keeps missing is fingerprinted on every 2nd, then 4th, ... visit only (the
+stride doubles after `history` misses). A period of up to `history` sampled
+visits is still found, since the fingerprints kept span that many strides.
+'''
+
+from instruction import OP_BNE
+
+
+class SteadyState:
+    def __init__(self, proc, outcomes, history=64):
+        '''
+        `outcomes` is the list of branch outcomes the timing run consumes,
+        from its first one; `history` bounds the fingerprints kept
+        '''
+        self.proc = proc
+        self.outcomes = outcomes
+        self.history = history
+        self.components = proc.get_components()
+        self.targets = {d.imm for d in proc.parser.get_decoded() if d.opcode == OP_BNE and d.imm <= d.pc}
+        self.seen = {}
+        self.visits = dict.fromkeys(self.targets, 0)
+        self.strides = dict.fromkeys(self.targets, 1)
+        self.misses = dict.fromkeys(self.targets, 0)
+        self.num_jumped = 0     # branch outcomes jumped over
+
+
+    def fingerprint(self, pc, curr_cycle, total_exec_cycles):
+        comps = tuple(tuple(sorted(v - curr_cycle for v in c.available_cycles if v > curr_cycle))
+                      for c in self.components)
+        sb = tuple((reg, v - curr_cycle) for reg, v in enumerate(self.proc.scoreboard.sb) if v > curr_cycle)
+        btb = self.proc.branch_unit.state()
+        return pc, max(total_exec_cycles - curr_cycle, 0), comps, sb, btb
+
+
+    def component_counters(self):
+        counters = []
+        for c in self.components:
+            counters += [c.total_input_reqs, c.total_wait_cycles, c.timed_busy_cycles]
+            counters += c.wait_hist
+        return counters
+
+
+    def profile_counters(self):
+        profile = self.proc.profile
+        return [list(row) for row in profile.counters] if profile is not None else None
+
+
+    def periodic_end(self, begin, period):
+        '''
+        Largest `end` such that outcomes[i] == outcomes[i - period] for all
+        begin + period <= i < end; galloping, so the cost is proportional to
+        the length found
+        '''
+        o = self.outcomes
+        good, step = begin + period, period
+        while True:
+            bad = min(good + step, len(o))
+            if bad == good: return good
+            if o[good:bad] != o[good - period:bad - period]: break
+            good, step = bad, 2 * step
+        while bad - good > 1:
+            mid = (good + bad) // 2
+            if o[good:mid] == o[good - period:mid - period]: good = mid
+            else: bad = mid
+        return good
+
+
+    def visit(self, pc, curr_cycle, total_exec_cycles, branch_idx, counters):
+        '''
+        Called before the fetch group at backward branch target `pc` runs,
+        with the fetch cycle of the group, the timing loop's total execution
+        cycles, branch outcomes consumed and accumulating counters. Returns
+        None, or (cycles, outcomes, counters) to add to the timing loop's
+        after jumping ahead; the components and the scoreboard are already
+        shifted
+        '''
+        self.visits[pc] += 1
+        if self.visits[pc] % self.strides[pc]: return None
+
+        key = self.fingerprint(pc, curr_cycle, total_exec_cycles)
+        prev = self.seen.get(key)
+        if prev is None:
+            self.seen[key] = (curr_cycle, branch_idx, counters, self.component_counters(), self.profile_counters())
+            if len(self.seen) > self.history: del self.seen[next(iter(self.seen))]
+            self.misses[pc] += 1
+            if self.misses[pc] % self.history == 0: self.strides[pc] *= 2
+            return None
+
+        cycle0, branch0, counters0, comp_counters0, prof_counters0 = prev
+        period = branch_idx - branch0
+        k = (self.periodic_end(branch0, period) - branch_idx) // period
+        self.seen.clear()
+        self.seen[key] = (curr_cycle, branch_idx, counters, self.component_counters(), self.profile_counters())
+        if k <= 0: return None
+
+        shift = k * (curr_cycle - cycle0)
+        comp_counters = self.component_counters()
+        i = 0
+        for c in self.components:
+            # entries at or below curr_cycle stay below the shifted ones: still a heap
+            c.available_cycles = [v + shift if v > curr_cycle else v for v in c.available_cycles]
+            c.total_input_reqs += k * (comp_counters[i] - comp_counters0[i])
+            c.total_wait_cycles += k * (comp_counters[i + 1] - comp_counters0[i + 1])
+            c.timed_busy_cycles += k * (comp_counters[i + 2] - comp_counters0[i + 2])
+            for b in range(len(c.wait_hist)):
+                c.wait_hist[b] += k * (comp_counters[i + 3 + b] - comp_counters0[i + 3 + b])
+            i += 3 + len(c.wait_hist)
+        sb = self.proc.scoreboard.sb
+        for reg, v in enumerate(sb):
+            if v > curr_cycle: sb[reg] = v + shift
+        if prof_counters0 is not None:
+            for row, row0 in zip(self.proc.profile.counters, prof_counters0):
+                for i, v in enumerate(row): row[i] = v + k * (v - row0[i])
+
+        self.seen.clear()
+        self.strides[pc], self.misses[pc] = 1, 0
+        self.num_jumped += k * period
+        return shift, k * period, [k * (a - b) for a, b in zip(counters, counters0)]
@@ -0,0 +1,203 @@
+'''
+Design-space sweep: times one program under the cartesian product of
+parameter ranges applied on top of a base config, using a process pool
+
+    python sweep.py config1.json test1.txt -p NF=1,2,4,8 -p ROB_RS=16:256:16 -o sweep.csv
+
+A range is either a comma separated list of values or `start:stop[:step]`
+(stop included); values that are not integers are strings, as in
+`-p branch_predictor=bimodal,gshare,tage`. The functional simulation runs once in the parent process;
+every worker receives its result when the pool starts and only runs
+`simulate_timing` per point. With `--trace`, the functional simulation is
+skipped altogether and every worker memory-maps the captured trace (see
+exec_trace.py) instead; the load/store addresses are only read from it, once
+per worker, when a point has a data cache. With `--lockstep N`, each worker times N points at a
+time with the NumPy lockstep engine (batch_timing.py), falling back to scalar
+runs if the cycle counts overflow it. With `--checkpoint`, every point starts
+from a checkpoint taken by checkpoint.py instead of the start of the program.
+Rows are appended to the CSV as points finish, so their order is not the
+order of the grid.
+'''
+
+import argparse
+import csv
+import itertools
+import os, sys
+import time
+from multiprocessing import Pool
+
+from checkpoint import Checkpoint
+from data_cache import DCACHE_KEYS, dcache_params
+from exec_trace import TraceReader
+from functional_units import pool_specs, unit_names
+from parser import Parser
+from predictors import CONFIG_KEYS
+from processor import Processor, load_config
+
+
+
+# per-worker state, set once by init_worker
+worker_base_cfg = None
+worker_parser = None
+worker_branch_record = None
+worker_mem_record = None
+worker_num_committed = None
+worker_trace = None
+worker_checkpoint = None
+worker_proc = None               # reset in place for every point
+
+
+def component_names(cfg):
+    # of Processor.get_components; the grid cannot change the pools' layout
+    units = [unit for name, count, _, _, _ in pool_specs(cfg) for unit in unit_names(name, count)]
+    return ['Decoder'] + units + ['ROB', 'RegRename']
+
+
+def parse_range(spec):
+    name, values = spec.split('=', 1)
+    if ':' in values:
+        bounds = [int(x) for x in values.split(':')]
+        assert len(bounds) in [2, 3], f'Bad range: {spec}'
+        step = bounds[2] if len(bounds) == 3 else 1
+        return name.strip(), list(range(bounds[0], bounds[1] + 1, step))
+    return name.strip(), [int(x) if x.strip().lstrip('-').isdigit() else x.strip() for x in values.split(',')]
+
+
+def uses_dcache(base_cfg, ranges):
+    # whether any point of the grid has a data cache; only the data cache
+    # keys can add or remove it
+    dranges = [(name, values) for name, values in ranges if name in DCACHE_KEYS]
+    names = [name for name, _ in dranges]
+    return any(dcache_params(dict(base_cfg, **dict(zip(names, values))))
+               for values in itertools.product(*[v for _, v in dranges]))
+
+
+def init_worker(base_cfg, parser, branch_record, num_committed, trace_file, checkpoint=None, mem_record=None):
+    global worker_base_cfg, worker_parser, worker_branch_record, worker_num_committed, worker_trace, worker_checkpoint
+    global worker_mem_record
+    worker_base_cfg = base_cfg
+    worker_parser = parser
+    worker_branch_record = branch_record
+    worker_mem_record = mem_record
+    worker_num_committed = num_committed
+    if trace_file is not None:
+        worker_trace = TraceReader(trace_file)
+    worker_checkpoint = checkpoint
+
+
+def worker_mem_addresses():
+    # the load/store addresses; read from the trace by the first point with
+    # a data cache
+    global worker_mem_record
+    if worker_mem_record is None and worker_trace is not None:
+        worker_mem_record = worker_trace.mem_addresses()
+    return worker_mem_record
+
+
+def make_row(overrides, total_cycles, wait_cycles):
+    row = dict(overrides)
+    row['total_cycles'] = total_cycles
+    row['committed_instrs'] = worker_num_committed
+    row['ipc'] = worker_num_committed / total_cycles if total_cycles else 0
+    for name, cycles in wait_cycles:
+        row[f'{name}_wait_cycles'] = cycles
+    return row
+
+
+def run_point(overrides):
+    global worker_proc
+    cfg = dict(worker_base_cfg)
+    cfg.update(overrides)
+    if worker_proc is None: worker_proc = Processor.from_config(cfg, worker_parser)
+    else: worker_proc.reset(cfg)
+    proc = worker_proc
+    proc.branch_record = worker_branch_record
+    proc.mem_record = worker_mem_addresses() if proc.dcache is not None else None
+    if worker_checkpoint is not None: worker_checkpoint.restore(proc, arch=False)
+    if worker_trace is None: total_cycles = proc.simulate_timing(verbose=False)
+    else: total_cycles = proc.simulate_timing(verbose=False, branch_outcomes=worker_trace.branch_outcomes())
+    return make_row(overrides, total_cycles, [(c.get_name(), c.total_wait_cycles) for c in proc.get_components()])
+
+
+def run_points_lockstep(points):
+    from batch_timing import simulate_batch
+    cfgs = [dict(worker_base_cfg, **overrides) for overrides in points]
+    outcomes = worker_branch_record if worker_trace is None else worker_trace.branch_outcomes
+    try:
+        results = simulate_batch(worker_parser, cfgs, outcomes, worker_mem_addresses)
+    except OverflowError:
+        return [run_point(overrides) for overrides in points]
+    return [make_row(overrides, r['total_exec_cycles'], [(c, r[f'{c}_wait_cycles']) for c in component_names(worker_base_cfg)])
+            for overrides, r in zip(points, results)]
+
+
+def sweep(base_cfg, parser, ranges, out_file, num_workers=None, chunksize=4, trace_file=None, lockstep=None,
+          checkpoint=None):
+    '''
+    Runs every point of the grid described by `ranges` (a list of
+    (config key, values) pairs) and writes one CSV row per point to `out_file`.
+    `lockstep` is the number of points timed together by the lockstep engine.
+    Every point starts from `checkpoint` (a Checkpoint), if given. Returns the
+    number of points
+    '''
+    for name, _ in ranges:
+        assert name in base_cfg or name in CONFIG_KEYS or name in DCACHE_KEYS, f'{name} is not a config parameter'
+    assert checkpoint is None or (trace_file is None and not lockstep), \
+        'Checkpoints cannot be combined with traces or the lockstep engine'
+
+    if trace_file is None:
+        func = Processor.from_config(None, parser)
+        if checkpoint is not None: checkpoint.restore(func)
+        if uses_dcache(base_cfg, ranges): func.mem_record = []     # for the points with a data cache
+        func.simulate_func(verbose=False)
+        branch_record, num_committed = func.branch_record, func.num_committed - func.timing_committed
+        mem_record = func.mem_record
+    else:
+        with TraceReader(trace_file) as reader:
+            reader.check_program(parser)
+            branch_record, num_committed, mem_record = None, reader.num_records, None
+
+    names = [name for name, _ in ranges]
+    points = (dict(zip(names, values)) for values in itertools.product(*[v for _, v in ranges]))
+    fields = names + ['total_cycles', 'committed_instrs', 'ipc'] + [f'{c}_wait_cycles' for c in component_names(base_cfg)]
+
+    num_points = 0
+    with open(out_file, 'w', newline='') as f, \
+         Pool(num_workers, init_worker, (base_cfg, parser, branch_record, num_committed, trace_file, checkpoint,
+                                         mem_record)) as pool:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        if lockstep:
+            batches = iter(lambda: list(itertools.islice(points, lockstep)), [])
+            rows = itertools.chain.from_iterable(pool.imap_unordered(run_points_lockstep, batches))
+        else:
+            rows = pool.imap_unordered(run_point, points, chunksize)
+        for row in rows:
+            writer.writerow(row)
+            num_points += 1
+            if num_points % 64 == 0: f.flush()
+    return num_points
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser(description='Sweep architectural parameters over a base config')
+    ap.add_argument('cfg_file', help='base config file')
+    ap.add_argument('input_file', help='input code')
+    ap.add_argument('-p', '--param', action='append', default=[], help='NAME=v1,v2,... or NAME=start:stop[:step]')
+    ap.add_argument('-o', '--output', default='sweep.csv', help='output CSV file')
+    ap.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    ap.add_argument('--chunksize', type=int, default=4, help='points handed to a worker at a time')
+    ap.add_argument('--trace', default=None, help='replay a trace captured by exec_trace.py instead of running the functional simulation')
+    ap.add_argument('--lockstep', type=int, default=None, help='time this many points at once with the NumPy lockstep engine')
+    ap.add_argument('--checkpoint', default=None, help='start every point from a checkpoint written by checkpoint.py')
+    args = ap.parse_args()
+
+    assert os.path.exists(args.cfg_file)
+    assert os.path.exists(args.input_file)
+    ranges = [parse_range(p) for p in args.param]
+
+    begin = time.perf_counter()
+    checkpoint = Checkpoint.read(args.checkpoint) if args.checkpoint else None
+    num_points = sweep(load_config(args.cfg_file), Parser(args.input_file), ranges, args.output, args.jobs, args.chunksize,
+                       args.trace, args.lockstep, checkpoint)
+    print(f'{num_points} points written to {args.output} in {time.perf_counter() - begin:.2f}s')